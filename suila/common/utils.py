@@ -8,7 +8,6 @@ from decimal import Decimal
 from typing import Any, Collection, Dict, Iterable, TypeVar
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 
-import holidays
 import numpy as np
 import pandas as pd
 from django.conf import settings
@@ -16,6 +15,7 @@ from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Model, QuerySet
 from pandas import DataFrame
 
+from suila.dates import add_working_days
 from suila.models import (
     IncomeEstimate,
     IncomeType,
@@ -473,5 +473,4 @@ class SuilaJSONEncoder(DjangoJSONEncoder):
 
 
 def add_or_subtract_working_days(original_date: date, days_to_add: int) -> date:
-    holiday_calendar = holidays.GL()  # type: ignore
-    return holiday_calendar.get_nth_working_day(original_date, days_to_add)
+    return add_working_days(original_date, days_to_add)
@@ -9,9 +9,10 @@ from django.conf import settings
 from django.db import connection
 from django.http import HttpResponse
 from requests.exceptions import RequestException
-from tenQ.client import ClientException, list_prisme_folder
+from tenQ.client import ClientException
 
 from suila.integrations.eskat.client import EskatClient
+from suila.integrations.prisme.sftp import list_prisme_folder
 
 logger = logging.getLogger(__name__)
 
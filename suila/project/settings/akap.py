@@ -6,3 +6,9 @@ import os
 
 AKAP_HOST = os.environ.get("AKAP_HOST", "https://akap.sullissivik.gl")
 AKAP_API_SECRET = os.environ.get("AKAP_API_SECRET", "supersecret")
+
+# Number of items fetched per page from the AKAP API
+AKAP_PAGE_SIZE = int(os.environ.get("AKAP_PAGE_SIZE") or 50)
+
+# Number of pages of U1A items to fetch concurrently from AKAP
+AKAP_MAX_WORKERS = int(os.environ.get("AKAP_MAX_WORKERS") or 4)
@@ -96,6 +96,8 @@ PITU = {
     "person_info_service": os.environ.get("PITU_SERVICE"),
     "company_info_service": os.environ.get("PITU_CVR_SERVICE"),
     "person_subscription_service": os.environ.get("PITU_CPR_SUBSCRIPTION_SERVICE"),
+    # Max. number of requests per second to Pitu (0 means no limit)
+    "rate_limit": float(os.environ.get("PITU_RATE_LIMIT") or 20),
 }
 
 if TESTING:
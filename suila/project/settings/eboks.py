@@ -12,6 +12,11 @@ EBOKS = {
     "host": os.environ["EBOKS_HOST"],
     "timeout": int(os.environ.get("EBOKS_TIMEOUT") or 60),
     "content_type_id": os.environ["EBOKS_CONTENT_TYPE_ID"],
+    # Dispatch queue: number of attempts per message, and the delay (in seconds)
+    # before the first retry, which is doubled for each subsequent retry.
+    "dispatch_max_attempts": int(os.environ.get("EBOKS_DISPATCH_MAX_ATTEMPTS") or 6),
+    "dispatch_backoff": float(os.environ.get("EBOKS_DISPATCH_BACKOFF") or 10),
+    "dispatch_max_backoff": float(os.environ.get("EBOKS_DISPATCH_MAX_BACKOFF") or 600),
 }
 
 # Relative to settings.MEDIA_ROOT
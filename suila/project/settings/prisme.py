@@ -14,6 +14,9 @@ PRISME = {
     "port": int(os.environ.get("PRISME_PORT") or 22),
     "username": os.environ["PRISME_USER"],
     "password": os.environ["PRISME_PASSWORD"],
+    # JSON list of OpenSSH known hosts lines. If set, the host key of the SFTP server
+    # must be listed here or in the system known hosts, and unknown host keys are
+    # rejected. If not set, the host key is not verified. Set this in production.
     "known_hosts": json.loads(os.environ.get("PRISME_KNOWN_HOSTS") or "[]"),
     # Configuration for G68/G69 export
     "user_number": int(os.environ.get("PRISME_USER_NUMBER", "0900")),
@@ -38,6 +41,16 @@ PRISME_RETRY_WAIT_SECONDS = (
     0.0 if TESTING else float(os.environ.get("PRISME_RETRY_WAIT_SECONDS", "1"))
 )
 
+# Number of concurrent SFTP transfers to/from Prisme. The default of 1 transfers
+# one file at a time.
+PRISME_SFTP_MAX_WORKERS = int(os.environ.get("PRISME_SFTP_MAX_WORKERS") or 1)
+
+# Seconds an SFTP session to Prisme may be reused before it is closed and a new
+# session is opened.
+PRISME_SFTP_MAX_AGE_SECONDS = float(
+    os.environ.get("PRISME_SFTP_MAX_AGE_SECONDS") or 300
+)
+
 # Relative to settings.MEDIA_ROOT
 LOCAL_PRISME_CSV_STORAGE = "prisme"
 
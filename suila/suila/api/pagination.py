@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: 2025 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+# mypy: disable-error-code="call-arg, attr-defined"
+import base64
+import json
+from operator import attrgetter
+from typing import Any, Generic, List, Optional, Sequence, TypeVar
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Model, Q, QuerySet
+from ninja import Field, Schema
+from ninja.errors import HttpError
+from ninja_extra.pagination import LimitOffsetPagination
+
+T = TypeVar("T")
+
+
+class KeysetPaginationResponseSchema(Schema, Generic[T]):
+    count: int
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+
+class KeysetPagination(LimitOffsetPagination):
+    """Limit/offset pagination, which also supports keyset (cursor) pagination.
+
+    The queryset is ordered by the `ordering` fields, which must identify each item
+    uniquely. A full page includes a `next_cursor`, encoding the position of its
+    last item. Passing the cursor in the next request returns the items following
+    that position, which the database can seek to directly, rather than reading and
+    discarding all the preceding items as it does for an offset. Clients walking
+    through an entire dataset should do so using the cursor. A cursor cannot be
+    combined with an offset.
+    """
+
+    class Input(LimitOffsetPagination.Input):
+        cursor: Optional[str] = Field(
+            None, description="Return the items following this `next_cursor`"
+        )
+
+    Output = KeysetPaginationResponseSchema[Any]
+
+    def __init__(self, *, ordering: Sequence[str], **kwargs: Any):
+        super().__init__(**kwargs)
+        self.ordering = tuple(ordering)
+
+    def paginate_queryset(
+        self, queryset: QuerySet, pagination: Input, **params: Any
+    ) -> Any:
+        queryset = queryset.order_by(*self.ordering)
+        # The count is the total number of items, also when using a cursor
+        count: int = queryset.count()
+        offset: int = pagination.offset
+        if pagination.cursor:
+            if offset:
+                raise HttpError(400, "A cursor cannot be combined with an offset")
+            queryset = queryset.filter(self.after(self.decode(pagination.cursor)))
+        items: List[Model] = list(queryset[offset : offset + pagination.limit])
+        return {
+            "count": count,
+            "items": items,
+            "next_cursor": (
+                self.encode(items[-1]) if len(items) == pagination.limit else None
+            ),
+        }
+
+    def after(self, values: List[Any]) -> Q:
+        # (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+        q = Q()
+        for i, name in enumerate(self.ordering):
+            q |= Q(
+                **dict(zip(self.ordering[:i], values[:i])), **{f"{name}__gt": values[i]}
+            )
+        return q
+
+    def encode(self, item: Model) -> str:
+        values = [attrgetter(name.replace("__", "."))(item) for name in self.ordering]
+        return base64.urlsafe_b64encode(
+            json.dumps(values, cls=DjangoJSONEncoder).encode("utf-8")
+        ).decode("ascii")
+
+    def decode(self, cursor: str) -> List[Any]:
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        except ValueError:
+            raise HttpError(400, "Invalid cursor")
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise HttpError(400, "Invalid cursor")
+        return values
@@ -5,13 +5,14 @@
 
 from typing import Optional
 
+from django.db.models import QuerySet
 from django.shortcuts import get_object_or_404
 from ninja import Field, FilterSchema, ModelSchema, Query
 from ninja_extra import ControllerBase, api_controller, permissions, route
 from ninja_extra.pagination import paginate
-from ninja_extra.schemas import NinjaPaginationResponseSchema
 
 from suila.api.auth import RestPermission, get_auth_methods
+from suila.api.pagination import KeysetPagination, KeysetPaginationResponseSchema
 from suila.models import Person
 
 
@@ -44,6 +45,11 @@ class PersonFilterSchema(FilterSchema):
     location_code: Optional[str] = None
 
 
+def get_queryset() -> QuerySet[Person]:
+    # Load only the fields in the output
+    return Person.objects.only(*PersonOut.Meta.fields)
+
+
 class PersonPermission(RestPermission):
     appname = "suila"
     modelname = "person"
@@ -63,14 +69,14 @@ class PersonAPI(ControllerBase):
         url_name="person_get",
     )
     def get(self, cpr: str):
-        return get_object_or_404(Person, cpr=cpr)
+        return get_object_or_404(get_queryset(), cpr=cpr)
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[PersonOut],
+        response=KeysetPaginationResponseSchema[PersonOut],
         auth=get_auth_methods(),
         url_name="person_list",
     )
-    @paginate()
+    @paginate(KeysetPagination, ordering=("cpr",))
     def list(self, filters: PersonFilterSchema = Query(...)):
-        return list(filters.filter(Person.objects.all()).order_by("cpr"))
+        return filters.filter(get_queryset())
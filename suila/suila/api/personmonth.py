@@ -6,17 +6,17 @@ from datetime import date
 from decimal import Decimal
 from typing import Optional
 
-from django.db.models import Sum
+from django.db.models import F, Func, OuterRef, QuerySet, Subquery
 from django.shortcuts import get_object_or_404
 from ninja import Field, ModelSchema
 from ninja.filter_schema import FilterSchema
 from ninja.params import Query
 from ninja_extra import ControllerBase, api_controller, paginate, permissions, route
-from ninja_extra.schemas import NinjaPaginationResponseSchema
 
 from suila.api.auth import RestPermission, get_auth_methods
-from suila.benefit import get_payout_date
-from suila.models import PersonMonth
+from suila.api.pagination import KeysetPagination, KeysetPaginationResponseSchema
+from suila.dates import get_payout_date
+from suila.models import MonthlyIncomeReport, PersonMonth
 
 
 class PersonMonthOut(ModelSchema):
@@ -45,7 +45,7 @@ class PersonMonthOut(ModelSchema):
 
     @staticmethod
     def resolve_a_income(obj) -> Decimal | None:
-        return obj.monthlyincomereport_set.aggregate(Sum("a_income"))["a_income__sum"]
+        return obj.sum_a_income
 
     # @staticmethod
     # def resolve_b_income(obj) -> Decimal | None:
@@ -66,6 +66,29 @@ class PersonMonthFilterSchema(FilterSchema):
     month: Optional[int] = Field(None, q="month")  # type: ignore[call-overload]
 
 
+def get_queryset() -> QuerySet[PersonMonth]:
+    # Load only the fields in the output, and sum the A income along with each
+    # person month
+    return (
+        PersonMonth.objects.select_related("person_year__person", "person_year__year")
+        .only(
+            *PersonMonthOut.Meta.fields,
+            "amount_sum",
+            "person_year__person__cpr",
+            "person_year__year__year",
+        )
+        .annotate(
+            sum_a_income=Subquery(
+                MonthlyIncomeReport.objects.filter(person_month=OuterRef("pk"))
+                .order_by()
+                .values("person_month")
+                .annotate(sum=Func(F("a_income"), function="SUM"))
+                .values("sum")
+            )
+        )
+    )
+
+
 class PersonMonthPermission(RestPermission):
     appname = "suila"
     modelname = "personmonth"
@@ -86,7 +109,7 @@ class PersonMonthAPI(ControllerBase):
     )
     def get(self, cpr: str, year: int, month: int):
         return get_object_or_404(
-            PersonMonth,
+            get_queryset(),
             person_year__person__cpr=cpr,
             person_year__year__year=year,
             month=month,
@@ -94,16 +117,13 @@ class PersonMonthAPI(ControllerBase):
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[PersonMonthOut],
+        response=KeysetPaginationResponseSchema[PersonMonthOut],
         auth=get_auth_methods(),
         url_name="personmonth_list",
     )
-    @paginate()
+    @paginate(
+        KeysetPagination,
+        ordering=("person_year__person__cpr", "person_year__year_id", "month"),
+    )
     def list(self, filters: PersonMonthFilterSchema = Query(...)):
-        return list(
-            filters.filter(
-                PersonMonth.objects.all().order_by(
-                    "person_year__person__cpr", "person_year__year", "month"
-                )
-            )
-        )
+        return filters.filter(get_queryset())
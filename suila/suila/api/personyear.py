@@ -2,16 +2,18 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 # mypy: disable-error-code="call-arg, attr-defined"
-from typing import Optional
+from typing import Any, Optional
 
+from django.conf import settings
+from django.db.models import OuterRef, QuerySet, Subquery
 from django.shortcuts import get_object_or_404
 from ninja import Field, ModelSchema
 from ninja.filter_schema import FilterSchema
 from ninja.params import Query
 from ninja_extra import ControllerBase, api_controller, paginate, permissions, route
-from ninja_extra.schemas import NinjaPaginationResponseSchema
 
 from suila.api.auth import RestPermission, get_auth_methods
+from suila.api.pagination import KeysetPagination, KeysetPaginationResponseSchema
 from suila.models import PersonYear, TaxInformationPeriod
 
 
@@ -33,7 +35,7 @@ class PersonYearOut(ModelSchema):
 
     @staticmethod
     def resolve_in_quarantine(obj: PersonYear) -> bool:
-        return obj.in_quarantine
+        return bool(obj.in_quarantine)
 
     @staticmethod
     def resolve_quarantine_reason(obj: PersonYear) -> str:
@@ -41,14 +43,35 @@ class PersonYearOut(ModelSchema):
 
     @staticmethod
     def resolve_tax_scope(obj: PersonYear) -> str:
-
-        latest_tax_scope = (
-            TaxInformationPeriod.objects.filter(person_year=obj)
-            .order_by("-end_date")
-            .values_list("tax_scope", flat=True)
-            .first()
+        return obj.latest_tax_scope or "INGEN_MANDTAL"
+
+
+def get_queryset() -> QuerySet[PersonYear]:
+    # Load only the fields in the output, and fetch the latest tax scope along with
+    # each person year
+    return (
+        PersonYear.objects.select_related("person", "year")
+        .only(*PersonYearOut.Meta.fields, "person__cpr", "year__year")
+        .annotate(
+            latest_tax_scope=Subquery(
+                TaxInformationPeriod.objects.filter(person_year=OuterRef("pk"))
+                .order_by("-end_date")
+                .values("tax_scope")[:1]
+            )
         )
-        return latest_tax_scope or "INGEN_MANDTAL"
+    )
+
+
+class PersonYearPagination(KeysetPagination):
+
+    def paginate_queryset(
+        self, queryset: QuerySet, pagination: KeysetPagination.Input, **params: Any
+    ) -> Any:
+        page = super().paginate_queryset(queryset, pagination, **params)
+        if settings.ENFORCE_QUARANTINE:  # type: ignore[misc]
+            # Compute quarantine for the whole page at once, rather than per item
+            PersonYear.load_quarantine(page["items"])
+        return page
 
 
 class PersonYearFilterSchema(FilterSchema):
@@ -75,14 +98,14 @@ class PersonYearAPI(ControllerBase):
         url_name="personyear_get",
     )
     def get(self, cpr: str, year: int):
-        return get_object_or_404(PersonYear, person__cpr=cpr, year__year=year)
+        return get_object_or_404(get_queryset(), person__cpr=cpr, year__year=year)
 
     @route.get(
         "",
-        response=NinjaPaginationResponseSchema[PersonYearOut],
+        response=KeysetPaginationResponseSchema[PersonYearOut],
         auth=get_auth_methods(),
         url_name="personyear_list",
     )
-    @paginate()
+    @paginate(PersonYearPagination, ordering=("person__cpr", "year_id"))
     def list(self, filters: PersonYearFilterSchema = Query(...)):
-        return list(filters.filter(PersonYear.objects.all()))
+        return filters.filter(get_queryset())
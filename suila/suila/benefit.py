@@ -1,7 +1,6 @@
 # SPDX-FileCopyrightText: 2025 Magenta ApS <info@magenta.dk>
 #
 # SPDX-License-Identifier: MPL-2.0
-from datetime import date, timedelta
 from fractions import Fraction
 
 import numpy as np
@@ -293,36 +292,3 @@ def get_payout_df(month: int, year: int, cpr: str | None = None) -> pd.DataFrame
         columns=["benefit_transferred_month_0"]
         + [f"benefit_transferred_month_{m}" for m in range(1, month)]
     )
-
-
-def get_payout_date(year: int, month: int) -> date:
-    """
-    Returns the date of a given month's third tuesday.
-    """
-    weekday_of_first_day = date(year, month, 1).weekday()
-    first_tuesday = 9 - weekday_of_first_day
-    if first_tuesday > 7:
-        first_tuesday -= 7
-    return date(year, month, first_tuesday + 14)
-
-
-def get_calculation_date(year: int, month: int) -> date:
-    """Get date for when to do calculations in a month
-
-    The day before the 2nd tuesday in a month - Can be changed by modifying
-    `settings.CALCULATION_DATE_PAYOUT_DATE_OFFSET_DAYS`.
-    """
-    return get_payout_date(year, month) - timedelta(
-        days=settings.CALCULATION_DATE_PAYOUT_DATE_OFFSET_DAYS  # type: ignore
-    )
-
-
-def get_eboks_date(year: int, month: int):
-    """Get date for when to send EBOKS messages to citizens.
-
-    The day before the 3rd tuesday in the month
-    """
-
-    return get_payout_date(year, month) - timedelta(
-        days=settings.EBOKS_DATE_PAYOUT_DATE_OFFSET_DAYS  # type: ignore
-    )
@@ -2,30 +2,81 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 import calendar
-from datetime import date
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from functools import cache
 
 import holidays
 from dateutil.relativedelta import TU, relativedelta
+from django.conf import settings
 
 from suila.models import PersonMonth
 
 
-def get_last_working_day(year: int, month: int) -> date:
+@cache
+def get_holiday_calendar(year: int) -> holidays.HolidayBase:
     """
-    Returns the last working day for a given month
+    Returns the Greenlandic holiday calendar for a given year
+    """
+    return holidays.GL(years=year)  # type: ignore
+
+
+@cache
+def get_working_days(year: int) -> tuple[date, ...]:
+    """
+    Returns all working days in a given year, in ascending order
     """
-    holiday_calendar = holidays.GL()  # type: ignore
+    holiday_calendar = get_holiday_calendar(year)
+    return tuple(
+        day
+        for day in (
+            date(year, 1, 1) + timedelta(days=offset)
+            for offset in range(366 if calendar.isleap(year) else 365)
+        )
+        if holiday_calendar.is_working_day(day)
+    )
 
-    # Start from the last day of the month
-    day_to_return = date(year, month, calendar.monthrange(year, month)[1])
 
-    # Go backwards until we find a working day
-    while not holiday_calendar.is_working_day(day_to_return):
-        day_to_return -= relativedelta(days=1)
+def is_working_day(day: date) -> bool:
+    working_days = get_working_days(day.year)
+    index = bisect_left(working_days, day)
+    return index < len(working_days) and working_days[index] == day
 
-    return day_to_return
 
+def add_working_days(original_date: date, days_to_add: int) -> date:
+    """
+    Returns the n'th working day after `original_date` (or before it, if
+    `days_to_add` is negative.) Equivalent to `holidays.GL().get_nth_working_day`.
+    """
+    if days_to_add == 0:
+        return original_date
+    year = original_date.year
+    working_days = get_working_days(year)
+    if days_to_add > 0:
+        index = bisect_right(working_days, original_date) + days_to_add - 1
+        while index >= len(working_days):
+            index -= len(working_days)
+            year += 1
+            working_days = get_working_days(year)
+    else:
+        index = bisect_left(working_days, original_date) + days_to_add
+        while index < 0:
+            year -= 1
+            working_days = get_working_days(year)
+            index += len(working_days)
+    return working_days[index]
+
+
+def get_last_working_day(year: int, month: int) -> date:
+    """
+    Returns the last working day for a given month
+    """
+    working_days = get_working_days(year)
+    last_day = date(year, month, calendar.monthrange(year, month)[1])
+    return working_days[bisect_right(working_days, last_day) - 1]
 
+
+@cache
 def get_payment_date(year: int, month: int) -> date:
     # The "official" payment date is the third Tuesday two months after the month
     # specified via the `year` and `month` arguments.
@@ -39,6 +90,40 @@ def get_payment_date(year: int, month: int) -> date:
     #     return get_last_working_day(year + 1, month - 12 + 2)
 
 
+@cache
+def get_payout_date(year: int, month: int) -> date:
+    """
+    Returns the date of a given month's third tuesday.
+    """
+    weekday_of_first_day = date(year, month, 1).weekday()
+    first_tuesday = 9 - weekday_of_first_day
+    if first_tuesday > 7:
+        first_tuesday -= 7
+    return date(year, month, first_tuesday + 14)
+
+
+def get_calculation_date(year: int, month: int) -> date:
+    """Get date for when to do calculations in a month
+
+    The day before the 2nd tuesday in a month - Can be changed by modifying
+    `settings.CALCULATION_DATE_PAYOUT_DATE_OFFSET_DAYS`.
+    """
+    return get_payout_date(year, month) - timedelta(
+        days=settings.CALCULATION_DATE_PAYOUT_DATE_OFFSET_DAYS  # type: ignore
+    )
+
+
+def get_eboks_date(year: int, month: int):
+    """Get date for when to send EBOKS messages to citizens.
+
+    The day before the 3rd tuesday in the month
+    """
+
+    return get_payout_date(year, month) - timedelta(
+        days=settings.EBOKS_DATE_PAYOUT_DATE_OFFSET_DAYS  # type: ignore
+    )
+
+
 def get_pause_effect_date(person_month: PersonMonth):
     """
     Returns the date on which a pause becomes effective
@@ -3,13 +3,13 @@
 # SPDX-License-Identifier: MPL-2.0
 import datetime
 import logging
-from typing import Dict, Optional
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
 
 from django.core import management
-from django.db.models import Q
 from django.utils import timezone
 
-from suila.benefit import get_calculation_date, get_eboks_date
+from suila.dates import get_calculation_date, get_eboks_date
 from suila.exceptions import ConfigurationError, DependenciesNotMet
 from suila.models import JobLog, ManagementCommands, StatusChoices
 from suila.types import JOB_NAME, JOB_TYPE
@@ -106,6 +106,11 @@ class JobDispatcher:
         self.reraise = reraise
         self.stdout = stdout
 
+        # Successful JobLogs, keyed by (local) runtime year and job name.
+        # Loaded lazily one year at a time and cleared whenever a job has been
+        # called, since the called job may have added new JobLogs.
+        self._job_log_snapshot: Dict[int, Dict[JOB_NAME, List[Dict[str, Any]]]] = {}
+
         self.dependencies: dict[JOB_NAME : list[JOB_NAME]] = {
             ManagementCommands.CALCULATE_STABILITY_SCORE: [],
             ManagementCommands.AUTOSELECT_ESTIMATION_ENGINE: [],
@@ -154,6 +159,60 @@ class JobDispatcher:
 
         return filters_kwargs
 
+    @staticmethod
+    def get_runtime_range(year: int) -> Tuple[datetime.datetime, datetime.datetime]:
+        """
+        Return the [start, end) runtime range covering the given year, in the
+        current timezone. Used instead of `runtime__year` so the lookup can use the
+        (name, status, runtime) index on JobLog.
+        """
+        start = datetime.datetime(year, 1, 1)
+        end = datetime.datetime(year + 1, 1, 1)
+        return timezone.make_aware(start), timezone.make_aware(end)
+
+    def get_job_log_snapshot(self, year: int) -> Dict[JOB_NAME, List[Dict[str, Any]]]:
+        if year not in self._job_log_snapshot:
+            start, end = self.get_runtime_range(year)
+            snapshot: Dict[JOB_NAME, List[Dict[str, Any]]] = defaultdict(list)
+            param_fields = [
+                f.name for f in JobLog._meta.fields if f.name.endswith("_param")
+            ]
+            for job_log in JobLog.objects.filter(
+                status=StatusChoices.SUCCEEDED, runtime__gte=start, runtime__lt=end
+            ).values("name", "runtime", *param_fields):
+                job_log["runtime"] = timezone.localtime(job_log["runtime"])
+                snapshot[job_log["name"]].append(job_log)
+            self._job_log_snapshot[year] = snapshot
+        return self._job_log_snapshot[year]
+
+    def clear_job_log_snapshot(self):
+        self._job_log_snapshot.clear()
+
+    def job_ran(
+        self,
+        name: str,
+        year: int,
+        month: Optional[int] = None,
+        day: Optional[int] = None,
+        job_params: Optional[Dict[str, str]] = None,
+    ) -> bool:
+        filters_kwargs = self.get_job_ran_filters(name, job_params)
+        filters_kwargs.pop("status")  # The snapshot only contains succeeded jobs
+        params = {
+            key: JobLog._meta.get_field(key).to_python(value)
+            for key, value in filters_kwargs.items()
+            if key != "name"
+        }
+        for job_log in self.get_job_log_snapshot(year).get(name, []):
+            runtime = job_log["runtime"]
+            if month is not None and runtime.month != month:
+                continue
+            if day is not None and runtime.day != day:
+                continue
+            if all(job_log[key] == value for key, value in params.items()):
+                return True
+        return False
+
     def job_ran_month(
         self,
         name: str,
@@ -161,16 +220,12 @@ class JobDispatcher:
         month: int,
         job_params: Optional[Dict[str, str]] = None,
     ):
-        filters_kwargs = self.get_job_ran_filters(name, job_params)
-        return JobLog.objects.filter(
-            Q(runtime__year=year), Q(runtime__month=month), **filters_kwargs
-        ).exists()
+        return self.job_ran(name, year, month, job_params=job_params)
 
     def job_ran_year(
         self, name: str, year: int, job_params: Optional[Dict[str, str]] = None
     ):
-        filters_kwargs = self.get_job_ran_filters(name, job_params)
-        return JobLog.objects.filter(Q(runtime__year=year), **filters_kwargs).exists()
+        return self.job_ran(name, year, job_params=job_params)
 
     def job_ran_day(
         self,
@@ -180,13 +235,7 @@ class JobDispatcher:
         day: int,
         job_params: Optional[Dict[str, str]] = None,
     ):
-        filters_kwargs = self.get_job_ran_filters(name, job_params)
-        return JobLog.objects.filter(
-            Q(runtime__year=year),
-            Q(runtime__month=month),
-            Q(runtime__day=day),
-            **filters_kwargs,
-        ).exists()
+        return self.job_ran(name, year, month, day, job_params=job_params)
 
     def check_dependencies(self, job_name: JOB_NAME):
         if job_name not in self.dependencies:
@@ -298,3 +347,7 @@ class JobDispatcher:
             logger.exception(f"CommandError exception for job: {name}")
             # NOTE: We just log these errors, since jobs shouldn't prevent us from
             #       running other jobs through the JobDispatcher afterwards
+        finally:
+            # The job may have logged a successful run, which later jobs in this
+            # dispatcher run depend on
+            self.clear_job_log_snapshot()
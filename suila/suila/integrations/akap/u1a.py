@@ -3,9 +3,10 @@
 # SPDX-License-Identifier: MPL-2.0
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
 from decimal import Decimal
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 import requests
 from pydantic import BaseModel
@@ -16,6 +17,11 @@ URL_U1A_LIST = "/udbytte/api/u1a"
 URL_U1A_ITEMS = "/udbytte/api/u1a-items"
 URL_U1A_ITEMS_UNIQUE_CPRS = "/udbytte/api/u1a-items/unique/cprs"
 
+DEFAULT_PAGE_SIZE = 50
+
+# Shared by all requests to AKAP, so that connections are kept alive and reused
+session = requests.Session()
+
 
 class AKAPU1AItem(BaseModel):
     id: int
@@ -65,54 +71,106 @@ class AKAPAPIPaginatedResponse(BaseModel):
     items: List[Any]
 
 
-def get_akap_u1a_entries(
+def iter_akap_pages(
     host: str,
     auth_token: str,
-    year: Optional[int] = None,
-    cpr: Optional[str] = None,
+    url: str,
+    query_params: Dict[str, str | int],
     limit: Optional[int] = None,
     offset: Optional[int] = None,
     fetch_all: Optional[bool] = None,
-) -> List[AKAPU1A]:
-    limit = limit if limit else 50
+    max_workers: int = 1,
+) -> Iterator[AKAPAPIPaginatedResponse]:
+    """Yield the pages of a paginated AKAP API endpoint.
+
+    The first page is fetched from `offset`. If `fetch_all` is set, the following
+    pages are then fetched, either one at a time or using `max_workers` threads.
+    Pages are always yielded in order. All requests use the module-level `session`,
+    so connections are reused across pages and calls.
+    """
+    limit = limit if limit else DEFAULT_PAGE_SIZE
     offset = offset if offset else 0
 
-    query_params: Dict[str, str | int] = {"limit": limit, "offset": offset}
+    def get_page(page_offset: int) -> AKAPAPIPaginatedResponse:
+        resp = session.get(
+            host + url,
+            headers={"Authorization": f"Bearer {auth_token}"},
+            params={"limit": limit, "offset": page_offset, **query_params},
+        )
+        if resp.status_code != 200:
+            logger.error(resp.text)
+            raise Exception("AKAP udbytte API did not respond with HTTP 200")
+        return AKAPAPIPaginatedResponse.model_validate(resp.json())
+
+    first_page = get_page(offset)
+    yield first_page
+    if not fetch_all:
+        return
+
+    offsets = range(offset + limit, first_page.count, limit)
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # `executor.map` returns the pages in the order of their offsets
+            yield from executor.map(get_page, offsets)
+    else:
+        for page_offset in offsets:
+            yield get_page(page_offset)
+
+
+def iter_akap_u1a_entries(
+    host: str,
+    auth_token: str,
+    year: Optional[int] = None,
+    cpr: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    fetch_all: Optional[bool] = None,
+    max_workers: int = 1,
+) -> Iterator[AKAPU1A]:
+    query_params: Dict[str, str | int] = {}
     if year:
         query_params["regnskabsår"] = year
 
     if cpr:
         query_params["cpr"] = cpr
 
-    resp = requests.get(
-        host + URL_U1A_LIST,
-        headers={"Authorization": f"Bearer {auth_token}"},
-        params=query_params,
-    )
-
-    if resp.status_code != 200:
-        logger.error(resp.text)
-        raise Exception("AKAP udbytte API did not respond with HTTP 200")
+    for page in iter_akap_pages(
+        host,
+        auth_token,
+        URL_U1A_LIST,
+        query_params,
+        limit=limit,
+        offset=offset,
+        fetch_all=fetch_all,
+        max_workers=max_workers,
+    ):
+        for entry in page.items:
+            yield AKAPU1A.model_validate(entry)
 
-    response = AKAPAPIPaginatedResponse.model_validate(resp.json())
 
-    # Recursive call to fetch the next batch of entries
-    entries = [AKAPU1A.model_validate(e) for e in response.items]
-    if fetch_all and offset + limit < response.count:
-        entries += get_akap_u1a_entries(
+def get_akap_u1a_entries(
+    host: str,
+    auth_token: str,
+    year: Optional[int] = None,
+    cpr: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    fetch_all: Optional[bool] = None,
+) -> List[AKAPU1A]:
+    return list(
+        iter_akap_u1a_entries(
             host,
             auth_token,
             year=year,
             cpr=cpr,
             limit=limit,
-            offset=offset + limit,
+            offset=offset,
             fetch_all=fetch_all,
         )
-
-    return entries
+    )
 
 
-def get_akap_u1a_items(
+def iter_akap_u1a_items(
     host: str,
     auth_token: str,
     u1a_id: Optional[int] = None,
@@ -121,11 +179,9 @@ def get_akap_u1a_items(
     limit: Optional[int] = None,
     offset: Optional[int] = None,
     fetch_all: Optional[bool] = None,
-) -> List[AKAPU1AItem]:
-    limit = limit if limit else 50
-    offset = offset if offset else 0
-
-    query_params: Dict[str, str | int] = {"limit": limit, "offset": offset}
+    max_workers: int = 1,
+) -> Iterator[AKAPU1AItem]:
+    query_params: Dict[str, str | int] = {}
     if u1a_id:
         query_params["u1a"] = u1a_id
 
@@ -135,33 +191,68 @@ def get_akap_u1a_items(
     if cpr:
         query_params["cpr_cvr_tin"] = cpr
 
-    resp = requests.get(
-        host + URL_U1A_ITEMS,
-        headers={"Authorization": f"Bearer {auth_token}"},
-        params=query_params,
-    )
-
-    if resp.status_code != 200:
-        logger.error(resp.text)
-        raise Exception("AKAP udbytte API did not respond with HTTP 200")
+    for page in iter_akap_pages(
+        host,
+        auth_token,
+        URL_U1A_ITEMS,
+        query_params,
+        limit=limit,
+        offset=offset,
+        fetch_all=fetch_all,
+        max_workers=max_workers,
+    ):
+        for item in page.items:
+            yield AKAPU1AItem.model_validate(item)
 
-    response = AKAPAPIPaginatedResponse.model_validate(resp.json())
 
-    # Recursive call to fetch the next batch of entries
-    items = [AKAPU1AItem.model_validate(i) for i in response.items]
-    if fetch_all and offset + limit < response.count:
-        items += get_akap_u1a_items(
+def get_akap_u1a_items(
+    host: str,
+    auth_token: str,
+    u1a_id: Optional[int] = None,
+    year: Optional[int] = None,
+    cpr: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: Optional[int] = None,
+    fetch_all: Optional[bool] = None,
+) -> List[AKAPU1AItem]:
+    return list(
+        iter_akap_u1a_items(
             host,
             auth_token,
             u1a_id=u1a_id,
             year=year,
             cpr=cpr,
             limit=limit,
-            offset=offset + limit,
+            offset=offset,
             fetch_all=fetch_all,
         )
+    )
 
-    return items
+
+def get_all_akap_u1a_items(
+    host: str,
+    auth_token: str,
+    year: Optional[int] = None,
+    cpr: Optional[str] = None,
+    limit: Optional[int] = None,
+    max_workers: int = 1,
+) -> List[AKAPU1AItem]:
+    """Fetch all U1A items, optionally filtered by year and CPR.
+
+    The first page is fetched to learn the total number of items, after which the
+    remaining pages are fetched concurrently using `max_workers` threads.
+    """
+    return list(
+        iter_akap_u1a_items(
+            host,
+            auth_token,
+            year=year,
+            cpr=cpr,
+            limit=limit,
+            fetch_all=True,
+            max_workers=max_workers,
+        )
+    )
 
 
 def get_akap_u1a_items_unique_cprs(
@@ -172,30 +263,20 @@ def get_akap_u1a_items_unique_cprs(
     offset: Optional[int] = None,
     fetch_all: Optional[bool] = None,
 ) -> List[str]:
-    limit = limit if limit else 50
-    offset = offset if offset else 0
-    query_params = {"limit": limit, "offset": offset}
-
+    query_params: Dict[str, str | int] = {}
     if year:
         query_params["year"] = year
 
-    resp = requests.get(
-        host + URL_U1A_ITEMS_UNIQUE_CPRS,
-        headers={"Authorization": f"Bearer {auth_token}"},
-        params=query_params,
-    )
-
-    if resp.status_code != 200:
-        logger.error(resp.text)
-        raise Exception("AKAP udbytte API did not respond with HTTP 200")
-
-    response = AKAPAPIPaginatedResponse.model_validate(resp.json())
-
-    # Recursive call to fetch the next batch of entries
-    cprs = response.items
-    if fetch_all and offset + limit < response.count:
-        cprs += get_akap_u1a_items_unique_cprs(
-            host, auth_token, year, limit, offset + limit, fetch_all=fetch_all
+    return [
+        cpr
+        for page in iter_akap_pages(
+            host,
+            auth_token,
+            URL_U1A_ITEMS_UNIQUE_CPRS,
+            query_params,
+            limit=limit,
+            offset=offset,
+            fetch_all=fetch_all,
         )
-
-    return cprs
+        for cpr in page.items
+    ]
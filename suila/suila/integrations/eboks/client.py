@@ -31,6 +31,10 @@ class MessageCollisionException(MessageFailureException):
     pass
 
 
+class MessageRejectedException(MessageFailureException):
+    pass
+
+
 class EboksClient(ContextDecorator):
     def __init__(
         self,
@@ -105,13 +109,13 @@ class EboksClient(ContextDecorator):
             ),
         )
         try:
-            return self._make_request(url=url, method="PUT", data=message.xml)
+            return self._make_request(url=url, method="PUT", data=message.envelope)
         except RequestException as e:
             if e.response is not None:
                 if e.response.status_code == 419:
                     raise MessageCollisionException(message_id, message, e)
                 if e.response.status_code == 400:
-                    raise MessageFailureException(message_id, message, e)
+                    raise MessageRejectedException(message_id, message, e)
             if retries > 0:
                 time.sleep(10)
                 message_id = self.get_message_id()
@@ -0,0 +1,259 @@
+# SPDX-FileCopyrightText: 2025 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+import heapq
+import logging
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+from requests import Response
+
+from suila.integrations.eboks.client import (
+    EboksClient,
+    MessageCollisionException,
+    MessageFailureException,
+    MessageRejectedException,
+)
+from suila.models import EboksMessage
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchQueue:
+    """Sends e-Boks messages using a pool of worker threads, retrying failed
+    attempts with exponential backoff.
+
+    Messages put in the queue are persisted with the status "queued", so the queue
+    can be resumed by `load` if it is interrupted. The worker threads only perform
+    the HTTP requests; the messages are updated in the database by the thread
+    using the queue.
+
+    If an attempt fails with a transient error (a connection error, a timeout or
+    an unexpected HTTP status), the next attempt is scheduled by setting the
+    `next_attempt_at` timestamp of the message, and the workers carry on sending
+    the other messages in the meantime. The delay is doubled for each attempt.
+    A message which collides with an existing message ID (HTTP 419), is rejected
+    by e-Boks (HTTP 400), or has used up its attempts, is marked as failed. Any
+    other error is also counted as a failure, rather than stopping the queue.
+    """
+
+    queue_statuses = ("queued",)
+    update_fields = (
+        "status",
+        "message_id",
+        "sent",
+        "recipient_status",
+        "is_postprocessing",
+        "attempts",
+        "next_attempt_at",
+        "failure_reason",
+    )
+
+    def __init__(
+        self,
+        client: EboksClient,
+        workers: int = 4,
+        max_attempts: int = 6,
+        backoff: float = 10.0,
+        max_backoff: float = 600.0,
+        on_sent: Callable[[EboksMessage], None] | None = None,
+        on_progress: Callable[[str], None] | None = None,
+        report_interval: float = 60.0,
+    ):
+        self.client = client
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.on_sent = on_sent
+        self.on_progress = on_progress
+        self.report_interval = report_interval
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # Messages being sent by the workers
+        self.in_flight: Dict[Future, EboksMessage] = {}
+        # Messages waiting for their next attempt, ordered by `next_attempt_at`
+        self.scheduled: List[Tuple[datetime, int, EboksMessage]] = []
+        self.counts: Counter = Counter()
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    @classmethod
+    def from_settings(cls, client: EboksClient, **kwargs) -> "DispatchQueue":
+        eboks_settings = settings.EBOKS  # type: ignore[misc]
+        return cls(
+            client,
+            max_attempts=eboks_settings["dispatch_max_attempts"],
+            backoff=eboks_settings["dispatch_backoff"],
+            max_backoff=eboks_settings["dispatch_max_backoff"],
+            **kwargs,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        return False
+
+    def put(self, message: EboksMessage) -> None:
+        """Persist `message` as queued, and send it as soon as a worker is free"""
+        message.status = "queued"
+        message.attempts = 0
+        message.next_attempt_at = timezone.now()
+        message.failure_reason = ""
+        if message.pk is None:
+            message.save()
+        else:
+            message.save(update_fields=self.update_fields)
+        self._schedule(message)
+        self.poll()
+        # Block while all workers are busy, so the caller does not get ahead of them
+        while self._due():
+            self._wait(None)
+            self.poll()
+
+    def load(self) -> int:
+        """Schedule the messages persisted as queued (e.g. by an interrupted run)
+        and return the number of messages loaded."""
+        loaded: int = 0
+        known = {pk for _, pk, _ in self.scheduled} | {
+            message.pk for message in self.in_flight.values()
+        }
+        for message in EboksMessage.objects.filter(
+            status__in=self.queue_statuses
+        ).order_by("next_attempt_at"):
+            if message.pk not in known:
+                self._schedule(message)
+                loaded += 1
+        return loaded
+
+    def poll(self) -> None:
+        """Handle the attempts which have completed, and start the attempts which
+        are due, without blocking."""
+        for future in [future for future in self.in_flight if future.done()]:
+            self._handle(future, self.in_flight.pop(future))
+        # Keep at most two messages per worker in flight
+        while self._due() and len(self.in_flight) < 2 * self.workers:
+            _, _, message = heapq.heappop(self.scheduled)
+            self.in_flight[self.executor.submit(self._attempt, message)] = message
+        if self.on_progress and (
+            time.monotonic() - self.last_report >= self.report_interval
+        ):
+            self.last_report = time.monotonic()
+            self.on_progress(self.progress)
+
+    def drain(self) -> None:
+        """Send all messages in the queue, including the ones waiting to be
+        retried, and return when each of them has been sent or has failed."""
+        self.poll()
+        while self.in_flight or self.scheduled:
+            timeout: float | None = None
+            if self.scheduled:
+                timeout = max(
+                    (self.scheduled[0][0] - timezone.now()).total_seconds(), 0
+                )
+            self._wait(timeout)
+            self.poll()
+
+    @property
+    def throughput(self) -> float:
+        """Number of messages sent per minute"""
+        elapsed: float = time.monotonic() - self.started
+        return self.counts["sent"] * 60 / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def progress(self) -> str:
+        return (
+            f"{self.counts['sent']} letters sent, {self.counts['failed']} failed, "
+            f"{len(self.scheduled)} awaiting retry "
+            f"({self.throughput:.1f} letters/min)"
+        )
+
+    def _schedule(self, message: EboksMessage) -> None:
+        heapq.heappush(self.scheduled, (message.next_attempt_at, message.pk, message))
+
+    def _due(self) -> bool:
+        return bool(self.scheduled) and self.scheduled[0][0] <= timezone.now()
+
+    def _wait(self, timeout: float | None) -> None:
+        # Wait for an attempt to complete, or for the next attempt to be due
+        if self.in_flight:
+            wait(self.in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        elif timeout:
+            # Nothing can be done until the next attempt is due
+            time.sleep(timeout)
+
+    def _attempt(self, message: EboksMessage) -> Tuple[str, Response]:
+        # Runs in a worker thread, so this must not access the database
+        message_id: str = self.client.get_message_id()
+        return message_id, self.client.send_message(message, message_id)
+
+    def _handle(self, future: Future, message: EboksMessage) -> None:
+        message.attempts += 1
+        try:
+            message_id, response = future.result()
+        except MessageCollisionException as e:
+            self._fail(message, "collision", e.cause, e.message_id)
+        except MessageRejectedException as e:
+            self._fail(message, "rejected", e.cause, e.message_id)
+        except MessageFailureException as e:
+            self._retry(message, e.cause, e.message_id)
+        except Exception as e:
+            self._fail(message, "error", e)
+        else:
+            try:
+                message.message_id = message_id
+                message.set_dispatched(response.json())
+            except Exception as e:
+                # e.g. an unexpected response body
+                self._fail(message, "error", e, message_id)
+                return
+            message.next_attempt_at = None
+            message.save(update_fields=self.update_fields)
+            self.counts["sent"] += 1
+            if self.on_sent is not None:
+                self.on_sent(message)
+
+    def _retry(
+        self, message: EboksMessage, cause: Exception, message_id: str | None = None
+    ) -> None:
+        if message.attempts >= self.max_attempts:
+            self._fail(message, "unavailable", cause, message_id)
+            return
+        delay: float = min(self.backoff * 2 ** (message.attempts - 1), self.max_backoff)
+        if message_id is not None:
+            message.message_id = message_id
+        message.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        message.save(update_fields=self.update_fields)
+        self._schedule(message)
+        self.counts["retried"] += 1
+        logger.info(
+            "Attempt %d to send e-Boks message %d failed (%s), retrying in %.0fs",
+            message.attempts,
+            message.pk,
+            cause,
+            delay,
+        )
+
+    def _fail(
+        self,
+        message: EboksMessage,
+        reason: str,
+        cause: Exception,
+        message_id: str | None = None,
+    ) -> None:
+        message.status = "failed"
+        if message_id is not None:
+            message.message_id = message_id
+        message.failure_reason = reason
+        message.next_attempt_at = None
+        message.save(update_fields=self.update_fields)
+        self.counts["failed"] += 1
+        logger.warning(
+            "Could not send e-Boks message %d (%s): %s", message.pk, reason, cause
+        )
@@ -0,0 +1,72 @@
+# SPDX-FileCopyrightText: 2025 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+import base64
+from typing import Iterator
+from xml.sax.saxutils import escape
+
+from django.core.files import File
+
+
+class DispatchEnvelope:
+    """The XML body of an e-Boks dispatch, streamed from a PDF file.
+
+    The PDF is read and base64-encoded in chunks while the body is sent, so the
+    document is never held in memory in its entirety. The envelope can be iterated
+    more than once (e.g. when a request is retried), and its length is known in
+    advance, so it is sent with a `Content-Length` header rather than chunked.
+
+    The output is identical to `EboksMessage.generate_xml`.
+    """
+
+    # Must be a multiple of 3, so each chunk encodes without base64 padding
+    chunk_size = 3 * 16 * 1024
+
+    def __init__(self, cpr_cvr: str, title: str, content_type_id: int, pdf: File):
+        if not cpr_cvr.isdigit():
+            raise ValueError("cpr/cvr must be all digits")
+        if len(cpr_cvr) == 10:
+            recipient_type = "P"
+        elif len(cpr_cvr) == 8:
+            recipient_type = "V"
+        else:
+            raise ValueError(f"unknown recipient type for: {cpr_cvr}")
+        self.header: bytes = (
+            "<?xml version='1.0' encoding='UTF-8'?>\n"
+            '<Dispatch xmlns="urn:eboks:en:3.0.0">'
+            "<DispatchRecipient>"
+            f"<Id>{cpr_cvr}</Id>"
+            f"<Type>{recipient_type}</Type>"
+            "<Nationality>DK</Nationality>"
+            "</DispatchRecipient>"
+            f"<ContentTypeId>{content_type_id}</ContentTypeId>"
+            f"<Title>{escape(title)}</Title>"
+            "<Content><Data>"
+        ).encode("utf-8")
+        self.footer: bytes = (
+            b"</Data><FileExtension>pdf</FileExtension></Content></Dispatch>"
+        )
+        self.pdf = pdf
+        self.pdf_size: int = pdf.size
+
+    def __len__(self) -> int:
+        encoded_size = (self.pdf_size + 2) // 3 * 4
+        return len(self.header) + encoded_size + len(self.footer)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self.header
+        with self.pdf.open("rb") as pdf:
+            rest = b""
+            for chunk in pdf.chunks(self.chunk_size):
+                data = rest + chunk
+                # Reads may come up short; carry over bytes that would need padding
+                end = len(data) - len(data) % 3
+                rest = data[end:]
+                if end:
+                    yield base64.b64encode(data[:end])
+            if rest:
+                yield base64.b64encode(rest)
+        yield self.footer
+
+    def __bytes__(self) -> bytes:
+        return b"".join(self)
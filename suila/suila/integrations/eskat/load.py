@@ -238,6 +238,17 @@ class AnnualIncomeHandler(Handler):
                 out.write(f"Created {len(objs_to_create_list)} AnnualIncome objects")
                 out.write(f"Updated {len(objs_to_update_list)} AnnualIncome objects")
 
+                # Summarize the loaded incomes in one statement
+                AnnualIncomeModel.update_amounts_bulk(
+                    AnnualIncomeModel.objects.filter(
+                        pk__in=[
+                            annual_income.pk
+                            for annual_income in objs_to_create_list
+                            + objs_to_update_list
+                        ]
+                    )
+                )
+
                 if postponed:
                     objs_to_update_list += cls.create_or_update_objects(
                         postponed, load, out
@@ -446,14 +457,11 @@ class MonthlyIncomeHandler(Handler):
                 )
 
                 # Finally, update the PersonMonth's after creating the IncomeReports
-                for person_month in person_months:
-                    person_month.update_amount_sum()
-
-                PersonMonth.objects.bulk_update(
-                    person_months,
-                    ["amount_sum"],
-                    batch_size=500,
+                amount_sums = PersonMonth.recompute_amount_sums(
+                    person_month.pk for person_month in person_months
                 )
+                for person_month in person_months:
+                    person_month.amount_sum = amount_sums[person_month.pk]
                 out.write(f"Updated {len(person_months)} PersonMonth objects")
                 return person_months
 
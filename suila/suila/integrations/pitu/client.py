@@ -1,11 +1,45 @@
 # SPDX-FileCopyrightText: 2024 Magenta ApS <info@magenta.dk>
 #
 # SPDX-License-Identifier: MPL-2.0
+import threading
+import time
 from datetime import datetime
-from typing import List, Set
+from itertools import batched
+from typing import Any, Dict, Iterable, List, Set
 
 from django.conf import settings
-from requests import ReadTimeout, Session
+from requests import HTTPError, ReadTimeout, Session
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter.
+
+    Allows `rate` calls to `acquire` per second on average, with bursts of up to
+    `capacity` calls. `acquire` blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
 
 
 class PituClient:
@@ -22,6 +56,7 @@ class PituClient:
         person_info_service=None,
         person_subscription_service=None,
         company_info_service=None,
+        rate_limit=None,
     ):
         self.person_info_service = person_info_service
         self.person_subscription_service = person_subscription_service
@@ -35,6 +70,8 @@ class PituClient:
         self.session.cert = self.cert
         self.session.verify = self.root_ca
         self.session.headers.update({"Uxp-Client": client_header})
+        # Optional limit on the number of requests per second to the Pitu service
+        self.rate_limiter = TokenBucket(rate_limit) if rate_limit else None
 
     @classmethod
     def from_settings(cls):
@@ -45,6 +82,8 @@ class PituClient:
             params = {}
         if service is None:
             service = self.person_info_service
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
         r = self.session.get(
             self.base_url + path,
             params=params,
@@ -60,6 +99,49 @@ class PituClient:
     def get_person_info(self, cpr: str):
         return self.get(f"/personLookup/1/cpr/{cpr}", service=self.person_info_service)
 
+    def get_person_info_bulk(
+        self, cprs: Iterable[str]
+    ) -> Dict[str, Dict[str, Any] | None]:
+        """Look up person info for many CPRs, using one request per
+        `combined_service_page_size` CPRs.
+
+        Returns a dict mapping each CPR to its person info, or to None if the CPR
+        was not found.
+        """
+        result: Dict[str, Dict[str, Any] | None] = {}
+        for batch in batched(cprs, self.combined_service_page_size):
+            result.update(dict.fromkeys(batch))
+            try:
+                data: Dict[str, Dict[str, Any]] = self.get(
+                    "/personLookup/1/cpr",
+                    params={"cpr": ",".join(batch)},
+                    service=self.person_info_service,
+                )
+            except HTTPError as e:
+                if not self.is_not_found(e):
+                    raise
+                # A 404 for the batch does not tell which of its CPRs were not
+                # found, so look them up one by one
+                for cpr in batch:
+                    result[cpr] = self.get_person_info_or_none(cpr)
+                continue
+            for cpr, person_info in data.items():
+                if cpr in result:
+                    result[cpr] = person_info or None
+        return result
+
+    def get_person_info_or_none(self, cpr: str) -> Dict[str, Any] | None:
+        try:
+            return self.get_person_info(cpr) or None
+        except HTTPError as e:
+            if self.is_not_found(e):
+                return None
+            raise
+
+    @staticmethod
+    def is_not_found(error: HTTPError) -> bool:
+        return error.response is not None and error.response.status_code == 404
+
     def get_company_info(self, cvr: int | str):
         return self.get(f"/{cvr}", service=self.company_info_service)
 
@@ -5,13 +5,13 @@ import datetime
 import logging
 from dataclasses import dataclass
 from datetime import date
-from io import BytesIO
+from itertools import batched
 
 from django.conf import settings
 from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.management.base import OutputWrapper
 from django.db import transaction
-from tenQ.client import ClientException
+from simple_history.utils import bulk_create_with_history
 
 from suila.exceptions import BTaxFilesNotFound
 from suila.integrations.prisme.csv_format import CSVFormat
@@ -75,6 +75,8 @@ class BTaxPayment(CSVFormat):
 class BTaxPaymentImport(SFTPImport):
     """Import one or more B tax CSV files from Prisme SFTP"""
 
+    chunk_size: int = 5000
+
     @transaction.atomic()
     def import_b_tax(
         self,
@@ -104,20 +106,26 @@ class BTaxPaymentImport(SFTPImport):
         if not relevant_file_found and not force:
             raise BTaxFilesNotFound(month=month)
 
-        for filename in new_filenames:
+        # Download the files concurrently, while parsing and saving the contents of
+        # each file in chunks of `chunk_size` rows.
+        for filename, buf in self.get_files(
+            new_filenames,
+            max_workers=settings.PRISME_SFTP_MAX_WORKERS,  # type: ignore[misc]
+        ):
             stdout.write(f"Loading new file: {filename}\n")
-            rows: list[BTaxPayment] | None = self._parse(filename)
-            if rows is not None:
-                objs: list[BTaxPaymentModel] = self._create_objects(filename, rows)
-                all_objs.extend(objs)
-                # List processed data
-                if verbosity >= 2:
-                    for obj in objs:
-                        stdout.write(f"Created {obj}\n")
+            if buf is not None:
+                load = DataLoad.objects.create(source="btax")
+                for rows in batched(BTaxPayment.iter_csv_buf(buf), self.chunk_size):
+                    objs: list[BTaxPaymentModel] = self._create_objects(
+                        filename, list(rows), load
+                    )
+                    all_objs.extend(objs)
+                    # List processed data
+                    if verbosity >= 2:
+                        for obj in objs:
+                            stdout.write(f"Created {obj}\n")
             else:
-                stdout.write(
-                    f"Failed to load new file {filename}\n"
-                )  # pragma: no cover
+                stdout.write(f"Failed to load new file {filename}\n")
 
         stdout.write("All done\n")
 
@@ -135,66 +143,38 @@ class BTaxPaymentImport(SFTPImport):
         )
         return known_filenames
 
-    def _parse(self, filename: str) -> list[BTaxPayment] | None:
-        try:
-            buf: BytesIO = self.get_file(filename)
-        except ClientException:
-            logger.exception("encountered error when retrieving file %r", filename)
-            return None
-        else:
-            return BTaxPayment.from_csv_buf(buf)
-
     def _create_objects(
         self,
         filename: str,
         rows: list[BTaxPayment],
+        load: DataLoad,
     ) -> list[BTaxPaymentModel]:
-        person_months: list[tuple[BTaxPayment, PersonMonth | None]] = []
-        load = DataLoad.objects.create(source="btax")
-
-        for row in rows:
-            # Only create `PersonMonth`, etc. if `BTaxPayment` indicates an actual
-            # rate payment.
-            if abs(row.amount_paid) > 0:
-                year, _ = Year.objects.get_or_create(year=row.tax_year)
-                person, _ = Person.objects.get_or_create(
-                    cpr=row.cpr,
-                    defaults={"load": load},
-                )
-                person_year, _ = PersonYear.objects.get_or_create(
-                    year=year,
-                    person=person,
-                    defaults={"load": load},
-                )
-                # Find existing `PersonMonth`, or create a new `PersonMonth` if not
-                try:
-                    person_month = PersonMonth.objects.get(
-                        person_year=person_year,
-                        month=row.rate_number,
-                    )
-                except PersonMonth.DoesNotExist:
-                    person_month = PersonMonth.objects.create(
-                        load=load,
-                        person_year=person_year,
-                        import_date=date.today(),
-                        month=row.rate_number,
-                    )
-                person_months.append((row, person_month))
-            else:
-                person_months.append((row, None))
+        # Only create `PersonMonth`, etc. if `BTaxPayment` indicates an actual rate
+        # payment.
+        person_month_map: dict[tuple[str, int, int], PersonMonth] = (
+            self._get_or_create_person_months(
+                [row for row in rows if abs(row.amount_paid) > 0], load
+            )
+        )
+        person_months: list[tuple[BTaxPayment, PersonMonth | None]] = [
+            (
+                row,
+                (
+                    person_month_map[(row.cpr, row.tax_year, row.rate_number)]
+                    if abs(row.amount_paid) > 0
+                    else None
+                ),
+            )
+            for row in rows
+        ]
 
         # Update `PersonMonth.has_paid_b_tax` for all person months that were found or
         # created.
-        person_month_list = [
-            person_month for row, person_month in person_months if person_month
-        ]
-        for person_month in person_month_list:
+        for person_month in person_month_map.values():
             person_month.has_paid_b_tax = True
-        PersonMonth.objects.bulk_update(
-            person_month_list,
-            ["has_paid_b_tax"],
-            batch_size=1000,
-        )
+        PersonMonth.objects.filter(
+            pk__in=[person_month.pk for person_month in person_month_map.values()]
+        ).update(has_paid_b_tax=True)
 
         # Create `BTaxPayment` objects for input rows in `person_months`
         objs: list[BTaxPaymentModel] = [
@@ -233,3 +213,103 @@ class BTaxPaymentImport(SFTPImport):
         )
 
         return objs
+
+    def _get_or_create_person_months(
+        self,
+        rows: list[BTaxPayment],
+        load: DataLoad,
+    ) -> dict[tuple[str, int, int], PersonMonth]:
+        """Return the person months matching `rows`, keyed by CPR, year and month.
+
+        Any missing `Year`, `Person`, `PersonYear` or `PersonMonth` objects are created
+        using bulk inserts, so the number of queries does not depend on the number of
+        rows.
+        """
+        if not rows:
+            return {}
+
+        years: set[int] = {row.tax_year for row in rows}
+        cprs: set[str] = {row.cpr for row in rows}
+        person_year_keys: set[tuple[str, int]] = {
+            (row.cpr, row.tax_year) for row in rows
+        }
+        person_month_keys: set[tuple[str, int, int]] = {
+            (row.cpr, row.tax_year, row.rate_number) for row in rows
+        }
+
+        # Create missing `Year` objects
+        Year.objects.bulk_create(
+            [Year(year=year) for year in years],
+            ignore_conflicts=True,
+        )
+
+        # Create missing `Person` objects
+        persons: dict[str, int] = dict(
+            Person.objects.filter(cpr__in=cprs).values_list("cpr", "pk")
+        )
+        new_persons: list[Person] = bulk_create_with_history(
+            [Person(cpr=cpr, load=load) for cpr in cprs if cpr not in persons],
+            Person,
+            batch_size=1000,
+        )
+        persons.update((person.cpr, person.pk) for person in new_persons)
+
+        # Create missing `PersonYear` objects
+        person_years: dict[tuple[str, int], int] = {
+            (cpr, year): pk
+            for cpr, year, pk in PersonYear.objects.filter(
+                person__cpr__in=cprs, year__in=years
+            ).values_list("person__cpr", "year_id", "pk")
+        }
+        missing_person_year_keys: list[tuple[str, int]] = [
+            key for key in person_year_keys if key not in person_years
+        ]
+        new_person_years: list[PersonYear] = bulk_create_with_history(
+            [
+                PersonYear(person_id=persons[cpr], year_id=year, load=load)
+                for cpr, year in missing_person_year_keys
+            ],
+            PersonYear,
+            batch_size=1000,
+        )
+        person_years.update(
+            (key, person_year.pk)
+            for key, person_year in zip(missing_person_year_keys, new_person_years)
+        )
+
+        # Create missing `PersonMonth` objects
+        existing_person_month_keys: set[tuple[str, int, int]] = set(
+            PersonMonth.objects.filter(
+                person_year__in=person_years.values()
+            ).values_list("person_year__person__cpr", "person_year__year_id", "month")
+        )
+        bulk_create_with_history(
+            [
+                PersonMonth(
+                    load=load,
+                    person_year_id=person_years[(cpr, year)],
+                    import_date=date.today(),
+                    month=month,
+                )
+                for cpr, year, month in person_month_keys
+                if (cpr, year, month) not in existing_person_month_keys
+            ],
+            PersonMonth,
+            batch_size=1000,
+        )
+
+        # Map each (CPR, year, month) to its `PersonMonth` using a single query
+        return {
+            key: person_month
+            for person_month in PersonMonth.objects.filter(
+                person_year__in=person_years.values()
+            ).select_related("person_year__person", "person_year__year")
+            if (
+                key := (
+                    person_month.person_year.person.cpr,
+                    person_month.person_year.year_id,
+                    person_month.month,
+                )
+            )
+            in person_month_keys
+        }
@@ -3,13 +3,15 @@
 # SPDX-License-Identifier: MPL-2.0
 import logging
 import os
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from csv import DictWriter
 from datetime import date
 from decimal import Decimal
+from functools import cached_property
 from io import BytesIO, StringIO
-from typing import Generator
+from itertools import groupby
+from typing import Generator, Iterable
 
-from common.utils import add_or_subtract_working_days
 from dateutil.relativedelta import TU, relativedelta
 from django.conf import settings
 from django.core.management.base import OutputWrapper
@@ -19,16 +21,17 @@ from django.db.models.functions import Cast, LPad, Substr
 from django.utils.numberformat import format as format_number
 from simple_history.utils import bulk_update_with_history
 from tenacity import after_log, retry, retry_if_exception_type, stop_after_attempt
-from tenQ.client import ClientException, put_file_in_prisme_folder
+from tenQ.client import ClientException
 from tenQ.writer.g68 import TransaktionstypeEnum, UdbetalingsberettigetIdentKodeEnum
 
-from suila.dates import get_payment_date
+from suila.dates import add_working_days, get_payment_date
 from suila.integrations.prisme.g68g69 import (
     G68G69TransactionPair,
     G68G69TransactionWriter,
 )
 from suila.integrations.prisme.mod11 import validate_mod11
 from suila.integrations.prisme.retry import retry_wait
+from suila.integrations.prisme.sftp import put_file_in_prisme_folder
 from suila.models import (
     PersonMonth,
     PrismeAccountAlias,
@@ -44,6 +47,18 @@ class BatchExport:
     def __init__(self, year: int, month: int):
         self._year = year
         self._month = month
+        # Payment and posting dates only depend on year and month, so we compute
+        # them once per (year, month) rather than once per person month.
+        self._payment_dates: dict[tuple[int, int], date] = {}
+        self._posting_dates: dict[tuple[int, int], date] = {}
+
+    @cached_property
+    def account_aliases(self) -> dict[tuple[str, int], PrismeAccountAlias]:
+        # All Prisme account aliases, keyed by location code and tax year
+        return {
+            (alias.tax_municipality_location_code, alias.tax_year): alias
+            for alias in PrismeAccountAlias.objects.all()
+        }
 
     def get_person_month_queryset(self) -> QuerySet[PersonMonth]:
         # Find all person months for this year/month which:
@@ -87,74 +102,63 @@ class BatchExport:
 
     def get_batches(
         self, qs: QuerySet[PersonMonth]
-    ) -> Generator[tuple[PrismeBatch, QuerySet[PersonMonth]], None, None]:
+    ) -> Generator[tuple[PrismeBatch, list[PersonMonth]], None, None]:
         # Get `mod11_separate_cprs` list of CPRs from settings
         prisme: dict = settings.PRISME  # type: ignore[misc]
-        mod11_separate_cprs: list[str] = prisme["mod11_separate_cprs"]
-
-        # Keep a separate set of all `PersonMonth` PKs where the CPR does not pass a
-        # modulus-11 test. (These will be yielded last.)
-        non_mod11_pks: set[int] = {
-            person_month.pk
-            for person_month in qs
-            if not validate_mod11(person_month.identifier)  # type: ignore[attr-defined]
-        }
-
-        # Split the remaining `PersonMonth` queryset into batches, yielding one
-        # `PrismeBatch` and the matching `PersonMonth` objects for each `prefix`
-        # (== first two digits of CPR.)
-        remaining_qs: QuerySet[PersonMonth] = qs.exclude(pk__in=non_mod11_pks)
-        current_batch: PrismeBatch | None = None
-        for person_month in remaining_qs:
-            # Use default prefix (first two digits of CPR)
-            person_month_prefix: int = int(
-                person_month.prefix  # type: ignore[attr-defined]
-            )
-            # Start a new "normal" batch whenever the prefix changes
-            if (current_batch is None) or (person_month_prefix != current_batch.prefix):
-                current_batch = PrismeBatch(
-                    prefix=person_month_prefix,
-                    export_date=date.today(),
-                )
+        mod11_separate_cprs: set[str] = set(prisme["mod11_separate_cprs"])
+
+        # `PersonMonth` objects where the CPR does not pass a modulus-11 test. These
+        # are collected while iterating, and yielded last.
+        separate_non_mod11: list[PersonMonth] = []
+        remaining_non_mod11: list[PersonMonth] = []
+
+        # Split the queryset into batches in a single pass, yielding one `PrismeBatch`
+        # and the matching `PersonMonth` objects for each `prefix` (== first two
+        # digits of CPR.) This relies on the queryset being ordered by prefix.
+        prefix: str
+        person_months: Iterable[PersonMonth]
+        for prefix, person_months in groupby(
+            qs.iterator(chunk_size=2000),
+            key=lambda person_month: person_month.prefix,  # type: ignore[attr-defined]
+        ):
+            batch: list[PersonMonth] = []
+            for person_month in person_months:
+                identifier: str = person_month.identifier  # type: ignore[attr-defined]
+                if validate_mod11(identifier):
+                    batch.append(person_month)
+                elif person_month.person_year.person.cpr in mod11_separate_cprs:
+                    separate_non_mod11.append(person_month)
+                else:
+                    remaining_non_mod11.append(person_month)
+            if batch:
                 yield (
-                    current_batch,
-                    remaining_qs.filter(  # type: ignore[misc]
-                        prefix=person_month.prefix  # type: ignore[attr-defined]
-                    ),
+                    PrismeBatch(prefix=int(prefix), export_date=date.today()),
+                    batch,
                 )
 
-        # Finally, yield batches for the non-mod11 CPR items, if any exist
-        if non_mod11_pks:
-            non_mod11: QuerySet[PersonMonth] = qs.filter(pk__in=non_mod11_pks)
-            if mod11_separate_cprs:
-                # Yield separate batch for *each* CPR
-                sub_qs: QuerySet[PersonMonth] = non_mod11.filter(
-                    person_year__person__cpr__in=mod11_separate_cprs
-                )
-                for person_month in sub_qs:
-                    logger.info(
-                        "Yielding separate batch for non-mod11 CPR %r",
-                        person_month.person_year.person.cpr,
-                    )
-                    yield (
-                        PrismeBatch(
-                            # Use the CPR as prefix
-                            prefix=int(person_month.person_year.person.cpr),
-                            export_date=date.today(),
-                        ),
-                        qs.filter(pk=person_month.pk),
-                    )
+        # Finally, yield batches for the non-mod11 CPR items, if any exist.
+        # Yield separate batch for *each* CPR in `mod11_separate_cprs`
+        for person_month in separate_non_mod11:
+            logger.info(
+                "Yielding separate batch for non-mod11 CPR %r",
+                person_month.person_year.person.cpr,
+            )
+            yield (
+                PrismeBatch(
+                    # Use the CPR as prefix
+                    prefix=int(person_month.person_year.person.cpr),
+                    export_date=date.today(),
+                ),
+                [person_month],
+            )
 
-            # Yield a *combined* batch for the non-mod11 CPRs *not in*
-            # `mod11_separate_cprs`
-            remaining_non_mod11: QuerySet[PersonMonth] = non_mod11.exclude(
-                person_year__person__cpr__in=mod11_separate_cprs
+        # Yield a *combined* batch for the non-mod11 CPRs *not in*
+        # `mod11_separate_cprs`
+        if remaining_non_mod11:
+            yield (
+                PrismeBatch(prefix=32, export_date=date.today()),
+                remaining_non_mod11,
             )
-            if remaining_non_mod11.exists():
-                yield (
-                    PrismeBatch(prefix=32, export_date=date.today()),
-                    remaining_non_mod11,
-                )
 
     def get_prisme_batch_item(
         self,
@@ -164,13 +168,11 @@ class BatchExport:
     ) -> PrismeBatchItem | None:
         # Find Prisme account alias for this municipality and tax year
         location_code: str | None = person_month.person_year.person.location_code
-        tax_year: int = person_month.person_year.year.year
-        try:
-            account_alias = PrismeAccountAlias.objects.get(
-                tax_municipality_location_code=location_code,
-                tax_year=tax_year,
-            )
-        except PrismeAccountAlias.DoesNotExist:
+        tax_year: int = person_month.person_year.year_id
+        account_alias: PrismeAccountAlias | None = self.account_aliases.get(
+            (location_code, tax_year)  # type: ignore[arg-type]
+        )
+        if account_alias is None:
             logger.error(
                 "No Prisme account alias found for tax municipality location code %r,"
                 "tax year %r, person %r",
@@ -242,26 +244,22 @@ class BatchExport:
         # after the month we are exporting.)
         # Note, the payment date in Prisme not necessarily the same as the third Monday
         # in the month.
-        return add_or_subtract_working_days(
-            get_payment_date(person_month.year, person_month.month), -1
-        )
+        key = (person_month.year, person_month.month)
+        if key not in self._payment_dates:
+            self._payment_dates[key] = add_working_days(get_payment_date(*key), -1)
+        return self._payment_dates[key]
 
     def get_posting_date(self, person_month: PersonMonth) -> date:
         # Posting date is the second Tuesday two months after the given `PersonMonth`.
         # E.g. for a `PersonMonth` in February 2025, the posting date is April 8, 2025.
-        return person_month.year_month + relativedelta(months=2, weekday=TU(+2))
-
-    @transaction.atomic
-    def upload_batch(
-        self,
-        prisme_batch: PrismeBatch,
-        prisme_batch_items: list[PrismeBatchItem],
-    ) -> PrismeBatch.Status:
-        # Get destination folder and filename for this batch
-        destination_folder: str = self.get_destination_folder(prisme_batch)
-        filename: str = self.get_destination_filename(prisme_batch)
+        key = (person_month.year, person_month.month)
+        if key not in self._posting_dates:
+            self._posting_dates[key] = person_month.year_month + relativedelta(
+                months=2, weekday=TU(+2)
+            )
+        return self._posting_dates[key]
 
-        # Export batch to Prisme
+    def get_batch_file(self, prisme_batch_items: list[PrismeBatchItem]) -> BytesIO:
         buf: BytesIO = BytesIO()
         for prisme_batch_item in prisme_batch_items:
             buf.write(prisme_batch_item.g68_content.encode("utf-8"))
@@ -269,37 +267,93 @@ class BatchExport:
             buf.write(prisme_batch_item.g69_content.encode("utf-8"))
             buf.write(b"\r\n")
         buf.seek(0)
+        return buf
 
+    def upload_batch_file(self, prisme_batch: PrismeBatch, buf: BytesIO) -> None:
+        # Get destination folder and filename for this batch
+        destination_folder: str = self.get_destination_folder(prisme_batch)
+        filename: str = self.get_destination_filename(prisme_batch)
         try:
             self._put_file_in_prisme_folder(buf, destination_folder, filename)
-        except ClientException as e:
-            prisme_batch.status = PrismeBatch.Status.Failed
-            prisme_batch.failed_message = str(e)
+        except ClientException:
             logger.exception(
                 "failed to upload to Prisme "
                 "(destination_folder=%r, destination_filename=%r)",
                 destination_folder,
                 filename,
             )
-        else:
-            prisme_batch.status = PrismeBatch.Status.Sent
-            prisme_batch.failed_message = ""
-            # Save all Prisme batch items belonging to the current batch
-            PrismeBatchItem.objects.bulk_create(prisme_batch_items)
-
-            person_months_to_update = []
-            for prisme_batch_item in prisme_batch_items:
-                person_month = prisme_batch_item.person_month
-                person_month.benefit_transferred = prisme_batch_item.amount
-                person_months_to_update.append(person_month)
-            bulk_update_with_history(
-                person_months_to_update, PersonMonth, ["benefit_transferred"]
-            )
-        finally:
-            prisme_batch.save()
+            raise
 
+    def mark_batch_failed(self, prisme_batch: PrismeBatch, error: ClientException):
+        prisme_batch.status = PrismeBatch.Status.Failed
+        prisme_batch.failed_message = str(error)
+        prisme_batch.save()
+
+    @transaction.atomic
+    def mark_batch_sent(
+        self,
+        prisme_batch: PrismeBatch,
+        prisme_batch_items: list[PrismeBatchItem],
+    ):
+        prisme_batch.status = PrismeBatch.Status.Sent
+        prisme_batch.failed_message = ""
+        # Save all Prisme batch items belonging to the current batch
+        PrismeBatchItem.objects.bulk_create(prisme_batch_items)
+
+        person_months_to_update = []
+        for prisme_batch_item in prisme_batch_items:
+            person_month = prisme_batch_item.person_month
+            person_month.benefit_transferred = prisme_batch_item.amount
+            person_months_to_update.append(person_month)
+        bulk_update_with_history(
+            person_months_to_update, PersonMonth, ["benefit_transferred"]
+        )
+        prisme_batch.save()
+
+    @transaction.atomic
+    def upload_batch(
+        self,
+        prisme_batch: PrismeBatch,
+        prisme_batch_items: list[PrismeBatchItem],
+    ) -> PrismeBatch.Status:
+        # Export batch to Prisme
+        try:
+            self.upload_batch_file(
+                prisme_batch, self.get_batch_file(prisme_batch_items)
+            )
+        except ClientException as e:
+            self.mark_batch_failed(prisme_batch, e)
+        else:
+            self.mark_batch_sent(prisme_batch, prisme_batch_items)
         return prisme_batch.status
 
+    def upload_batches_concurrently(
+        self,
+        batches: Iterable[tuple[PrismeBatch, list[PrismeBatchItem]]],
+        max_workers: int,
+    ) -> Generator[tuple[PrismeBatch, PrismeBatch.Status], None, None]:
+        # Only the SFTP uploads happen in the worker threads. All database work
+        # (building the batches, and recording the outcome of each upload) happens
+        # in the calling thread, one batch at a time.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures: dict[Future, tuple[PrismeBatch, list[PrismeBatchItem]]] = {
+                executor.submit(
+                    self.upload_batch_file,
+                    prisme_batch,
+                    self.get_batch_file(prisme_batch_items),
+                ): (prisme_batch, prisme_batch_items)
+                for prisme_batch, prisme_batch_items in batches
+            }
+            for future in as_completed(futures):
+                prisme_batch, prisme_batch_items = futures[future]
+                try:
+                    future.result()
+                except ClientException as e:
+                    self.mark_batch_failed(prisme_batch, e)
+                else:
+                    self.mark_batch_sent(prisme_batch, prisme_batch_items)
+                yield prisme_batch, prisme_batch.status
+
     def get_control_list_data(self) -> QuerySet:
         # Fetch all Prisme batch items created for this year and month
         prisme_batch_items: QuerySet[PrismeBatchItem] = (
@@ -373,7 +427,45 @@ class BatchExport:
             filename,
         )
 
-    def export_batches(self, stdout: OutputWrapper, verbosity: int):
+    def build_batch(
+        self,
+        prisme_batch: PrismeBatch,
+        person_months: list[PersonMonth],
+        stdout: OutputWrapper,
+        verbosity: int,
+    ) -> tuple[PrismeBatch, list[PrismeBatchItem]]:
+        # Instantiate a new writer for each Prisme batch, ensuring that the line
+        # numbers start from 0, etc.
+        writer: G68G69TransactionWriter = self.get_g68_g69_transaction_writer()
+
+        # Ensure the current Prisme batch is saved (so it has a PK)
+        prisme_batch.save()
+
+        # Build all items for this batch
+        prisme_batch_items: list[PrismeBatchItem] = []
+        for person_month in person_months:
+            prisme_batch_item: PrismeBatchItem | None = self.get_prisme_batch_item(
+                prisme_batch,
+                person_month,
+                writer,
+            )
+            if prisme_batch_item is not None:
+                prisme_batch_items.append(prisme_batch_item)
+                if verbosity >= 2:
+                    stdout.write(f"{person_month}")
+                    stdout.write(prisme_batch_item.g68_content)
+                    stdout.write(prisme_batch_item.g69_content)
+                    stdout.write()
+            else:
+                stdout.write(f"Could not build Prisme batch item for {person_month}")
+        return prisme_batch, prisme_batch_items
+
+    def export_batches(
+        self,
+        stdout: OutputWrapper,
+        verbosity: int,
+        max_workers: int = 1,
+    ):
         person_month_queryset: QuerySet[PersonMonth] = self.get_person_month_queryset()
 
         num_person_months: int = person_month_queryset.count()
@@ -385,39 +477,23 @@ class BatchExport:
             f"year={self._year}, month={self._month} ...",
         )
 
-        prisme_batch: PrismeBatch
-        person_months: QuerySet[PersonMonth]
-        for prisme_batch, person_months in self.get_batches(person_month_queryset):
-            # Instantiate a new writer for each Prisme batch, ensuring that the line
-            # numbers start from 0, etc.
-            writer: G68G69TransactionWriter = self.get_g68_g69_transaction_writer()
-
-            # Ensure the current Prisme batch is saved (so it has a PK)
-            prisme_batch.save()
-
-            # Build all items for this batch
-            prisme_batch_items: list[PrismeBatchItem] = []
-            for person_month in person_months:
-                prisme_batch_item: PrismeBatchItem | None = self.get_prisme_batch_item(
-                    prisme_batch,
-                    person_month,
-                    writer,
-                )
-                if prisme_batch_item is not None:
-                    prisme_batch_items.append(prisme_batch_item)
-                    if verbosity >= 2:
-                        stdout.write(f"{person_month}")
-                        stdout.write(prisme_batch_item.g68_content)
-                        stdout.write(prisme_batch_item.g69_content)
-                        stdout.write()
-                else:
-                    stdout.write(
-                        f"Could not build Prisme batch item for {person_month}"
-                    )
+        batches: Iterable[tuple[PrismeBatch, list[PrismeBatchItem]]] = (
+            self.build_batch(prisme_batch, person_months, stdout, verbosity)
+            for prisme_batch, person_months in self.get_batches(person_month_queryset)
+        )
 
-            # Export the current batch to Prisme
-            status = self.upload_batch(prisme_batch, prisme_batch_items)
+        # Export the batches to Prisme, either one at a time, or using a pool of
+        # `max_workers` concurrent SFTP uploads.
+        statuses: Iterable[tuple[PrismeBatch, PrismeBatch.Status]]
+        if max_workers > 1:
+            statuses = self.upload_batches_concurrently(batches, max_workers)
+        else:
+            statuses = (
+                (prisme_batch, self.upload_batch(prisme_batch, prisme_batch_items))
+                for prisme_batch, prisme_batch_items in batches
+            )
 
+        for prisme_batch, status in statuses:
             # Collect/report upload status for this batch
             if status is PrismeBatch.Status.Sent:
                 num_succeeded_batches += 1
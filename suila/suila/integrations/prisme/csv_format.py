@@ -5,7 +5,7 @@ import csv
 import re
 from datetime import date
 from io import BytesIO, TextIOWrapper
-from typing import Self
+from typing import Iterator, Self
 
 
 class CSVFormat:
@@ -13,6 +13,18 @@ class CSVFormat:
     def from_csv_row(cls, row: list[str]) -> Self:
         raise NotImplementedError("must be implemented by subclass")  # pragma: no cover
 
+    @classmethod
+    def iter_csv_buf(
+        cls,
+        buf: BytesIO,
+        delimiter: str = ";",
+        encoding: str = "utf-16-le",
+    ) -> Iterator[Self]:
+        """Parse `buf` one row at a time, yielding an instance for each row"""
+        reader = csv.reader(TextIOWrapper(buf, encoding=encoding), delimiter=delimiter)
+        for row in reader:
+            yield cls.from_csv_row(row)
+
     @classmethod
     def from_csv_buf(
         cls,
@@ -20,8 +32,7 @@ class CSVFormat:
         delimiter: str = ";",
         encoding: str = "utf-16-le",
     ) -> list[Self]:
-        reader = csv.reader(TextIOWrapper(buf, encoding=encoding), delimiter=delimiter)
-        return [cls.from_csv_row(row) for row in reader]
+        return list(cls.iter_csv_buf(buf, delimiter=delimiter, encoding=encoding))
 
     @classmethod
     def parse_date(cls, val: str) -> date:
@@ -5,9 +5,7 @@ from dataclasses import dataclass
 from datetime import date
 
 from tenQ.writer.g68 import (
-    G68Transaction,
     G68TransactionWriter,
-    Posteringshenvisning,
     TransaktionstypeEnum,
     UdbetalingsberettigetIdentKodeEnum,
 )
@@ -51,7 +49,7 @@ class G68G69TransactionWriter(G68TransactionWriter):
         text: str,
     ) -> G68G69TransactionPair:
         # This also increments `self._line_no`
-        g68_transaction_serialized = self.serialize_transaction(
+        g68_transaction_serialized, g69_udbetalingshenvisning = self.serialize_g68(
             transaction_type,
             recipient_type,
             recipient,
@@ -62,13 +60,6 @@ class G68G69TransactionWriter(G68TransactionWriter):
             text,
         )
 
-        # Get the G68 "posteringshenvisning" ID
-        g68_transaction_fields = list(G68Transaction.parse(g68_transaction_serialized))
-        g69_udbetalingshenvisning = None
-        for field in g68_transaction_fields:
-            if isinstance(field, Posteringshenvisning):
-                g69_udbetalingshenvisning = field.val
-
         # Build the G69 transaction, using:
         # - the G68 "posteringshenvisning" as the "udbetalingshenvisning",
         # - the G68 "maskinnummer" as the "maskinnummer",
@@ -76,7 +67,7 @@ class G68G69TransactionWriter(G68TransactionWriter):
         #   (== `self._line_no`),
         # - the G68 "posteringsdato" as the "posteringsdato".
         g69_transaction_serialized = self._g69_transaction_writer.serialize_transaction(
-            udbet_henv_nr=int(g69_udbetalingshenvisning),  # type: ignore[arg-type]
+            udbet_henv_nr=int(g69_udbetalingshenvisning),
             eks_løbenr=self._line_no,
             maskinnr=self.machine_id.val,
             kontonr=account,
@@ -92,3 +83,35 @@ class G68G69TransactionWriter(G68TransactionWriter):
             g68=g68_transaction_serialized,
             g69=g69_transaction_serialized,
         )
+
+    def serialize_g68(
+        self,
+        transaction_type: TransaktionstypeEnum,
+        recipient_type: UdbetalingsberettigetIdentKodeEnum,
+        recipient: str,
+        amount: int,
+        payment_date: date,
+        posting_date: date,
+        invoice_no: str,
+        text: str,
+    ) -> tuple[str, str]:
+        """Serialize a G68 transaction, and return it along with its
+        "posteringshenvisning" (field 16.)"""
+        g68_transaction_serialized = self.serialize_transaction(
+            transaction_type,
+            recipient_type,
+            recipient,
+            amount,
+            payment_date,
+            posting_date,
+            invoice_no,
+            text,
+        )
+        # The fields of a G68 transaction are written in order, each prefixed by "&"
+        # and its field number. None of the fields preceding field 16 can contain
+        # "&", so the first "&16" starts the "posteringshenvisning" (18 digits.)
+        start: int = g68_transaction_serialized.index("&16") + 3
+        return (
+            g68_transaction_serialized,
+            g68_transaction_serialized[start : start + 18],
+        )
@@ -5,6 +5,8 @@ import logging
 import re
 from dataclasses import dataclass
 from datetime import date
+from decimal import Decimal
+from typing import Iterator
 
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
@@ -125,9 +127,7 @@ class PostingStatusImport(SFTPImport):
         )
 
     def _get_max_date(self, rows: list[PostingStatus]) -> date:
-        max_date: date = max(
-            row.due_date - relativedelta(months=2, day=1) for row in rows
-        )
+        max_date: date = max(self._get_issue_date(row) for row in rows)
         return max_date
 
     def _filter_prisme_batch_items_on_date(
@@ -151,6 +151,76 @@ class PostingStatusImport(SFTPImport):
         )
         return qs.filter(_date__lte=max_date)
 
+    def _get_issue_date(self, row: PostingStatus) -> date:
+        return row.due_date - relativedelta(months=2, day=1)
+
+    def _match_rows(
+        self,
+        qs: QuerySet[PrismeBatchItem],
+        rows: list[PostingStatus],
+    ) -> Iterator[tuple[PostingStatus, PrismeBatchItem]]:
+        """Yield each row in `rows` along with its matching Prisme batch item.
+
+        Items are looked up by invoice number, or by CPR, date and amount if no item
+        matches the invoice number. All candidate items are fetched in (at most) two
+        queries, and the rows are then matched in memory.
+        """
+        items_by_invoice_no: dict[str, PrismeBatchItem] = {
+            item.invoice_no: item
+            for item in qs.filter(
+                invoice_no__in={row.normalized_invoice_no for row in rows}
+            )
+        }
+
+        unmatched_rows: list[PostingStatus] = []
+        for row in rows:
+            item: PrismeBatchItem | None = items_by_invoice_no.get(
+                row.normalized_invoice_no
+            )
+            if item is None:
+                logger.debug(
+                    "No Prisme batch item found for invoice number %s (raw invoice "
+                    "number = %s)",
+                    row.normalized_invoice_no,
+                    row.invoice_no,
+                )
+                unmatched_rows.append(row)
+            else:
+                yield row, item
+
+        if not unmatched_rows:
+            return
+
+        # Try to look up by CPR/date/amount instead
+        items_by_cpr_date_amount: dict[
+            tuple[str, int, int, Decimal | None], PrismeBatchItem
+        ] = {
+            (
+                item.person_month.person_year.person.cpr,
+                item.person_month.person_year.year_id,
+                item.person_month.month,
+                item.person_month.benefit_transferred,
+            ): item
+            for item in qs.filter(
+                person_month__person_year__person__cpr__in={
+                    f"{row.cpr:010d}" for row in unmatched_rows
+                }
+            )
+        }
+
+        for row in unmatched_rows:
+            issue_date: date = self._get_issue_date(row)
+            key = (f"{row.cpr:010d}", issue_date.year, issue_date.month, row.amount)
+            item = items_by_cpr_date_amount.get(key)  # type: ignore[arg-type]
+            if item is None:
+                logger.debug(
+                    "No Prisme batch item found for CPR %s, year %r, month %r, "
+                    "amount %r",
+                    *key,
+                )
+            else:
+                yield row, item
+
     @transaction.atomic
     def _update_prisme_batch_items(self, filename: str, stdout: OutputWrapper):
         rows: list[PostingStatus] = self._parse(filename)
@@ -170,37 +240,7 @@ class PostingStatusImport(SFTPImport):
         # The items whose invoice number match a line in the file change status to
         # `Failed`.
         matches: list[PrismeBatchItem] = []
-        for row in rows:
-            try:
-                item: PrismeBatchItem = qs.get(invoice_no=row.normalized_invoice_no)
-            except PrismeBatchItem.DoesNotExist:
-                logger.debug(
-                    "No Prisme batch item found for invoice number %s (raw invoice "
-                    "number = %s)",
-                    row.normalized_invoice_no,
-                    row.invoice_no,
-                )
-                # Try to look up by CPR/date/amount instead
-                issue_date = row.due_date - relativedelta(months=2, day=1)
-                try:
-                    item = qs.get(
-                        person_month__person_year__person__cpr=f"{row.cpr:010d}",
-                        person_month__person_year__year__year=issue_date.year,
-                        person_month__month=issue_date.month,
-                        person_month__benefit_transferred=row.amount,
-                    )
-                except PrismeBatchItem.DoesNotExist:
-                    logger.debug(
-                        "No Prisme batch item found for CPR %s, year %r, month %r, "
-                        "amount %r",
-                        f"{row.cpr:010d}",
-                        issue_date.year,
-                        issue_date.month,
-                        row.amount,
-                    )
-                    # Go to next row in CSV
-                    continue
-
+        for row, item in self._match_rows(qs, rows):
             item.status = PrismeBatchItem.PostingStatus.Failed
             item.posting_status_file = posting_status_file
             item.error_code = row.error_code
@@ -0,0 +1,215 @@
+# SPDX-FileCopyrightText: 2025 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+import atexit
+import logging
+import posixpath
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, Iterator
+
+from django.conf import settings as django_settings
+from paramiko import AutoAddPolicy, RejectPolicy, SFTPClient, SSHClient, SSHException
+from paramiko.hostkeys import HostKeyEntry
+from tenQ.client import ClientException
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SFTPSession:
+    ssh_client: SSHClient
+    sftp_client: SFTPClient
+    created: float = field(default_factory=time.monotonic)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created
+
+    def is_alive(self) -> bool:
+        transport = self.ssh_client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            # Send an SSH "ignore" message, which fails if the connection is broken
+            transport.send_ignore()
+        except (SSHException, OSError, EOFError):
+            return False
+        return True
+
+    def close(self) -> None:
+        try:
+            self.sftp_client.close()
+            self.ssh_client.close()
+        except Exception:  # pragma: no cover
+            logger.warning("error closing SFTP session", exc_info=True)
+
+
+class SFTPSessionPool:
+    """Keeps idle SFTP sessions to a single Prisme SFTP server around, so they can be
+    reused by subsequent file operations instead of performing a new SSH handshake
+    for each operation.
+
+    Idle sessions are checked for liveness before they are reused, and are closed
+    once they are older than `max_age` seconds.
+    """
+
+    def __init__(self, config: dict[str, Any], max_size: int, max_age: float):
+        self.config = config
+        self.max_size = max_size
+        self.max_age = max_age
+        self._idle: list[SFTPSession] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def session(self) -> Iterator[SFTPClient]:
+        """Yield an SFTP client from the pool, opening a new session if no usable
+        idle session exists.
+
+        Any error raised while opening or using the session is raised as a
+        `ClientException`, and the session is discarded rather than returned to the
+        pool.
+        """
+        try:
+            session: SFTPSession = self._acquire()
+        except (SSHException, OSError, EOFError) as exc:
+            raise ClientException(str(exc)) from exc
+        try:
+            yield session.sftp_client
+        except (SSHException, OSError, EOFError) as exc:
+            session.close()
+            raise ClientException(str(exc)) from exc
+        except BaseException:
+            session.close()
+            raise
+        else:
+            self._release(session)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.close()
+
+    def _acquire(self) -> SFTPSession:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                session: SFTPSession = self._idle.pop()
+            if session.age < self.max_age and session.is_alive():
+                return session
+            logger.debug("discarding stale SFTP session (age=%.1fs)", session.age)
+            session.close()
+        return self._connect()
+
+    def _release(self, session: SFTPSession) -> None:
+        if session.age < self.max_age:
+            with self._lock:
+                if len(self._idle) < self.max_size:
+                    self._idle.append(session)
+                    return
+        session.close()
+
+    def _connect(self) -> SFTPSession:
+        ssh_client: SSHClient = connect(self.config)
+        logger.debug("opened SFTP session to %s", self.config["host"])
+        return SFTPSession(ssh_client, ssh_client.open_sftp())
+
+
+def connect(config: dict[str, Any]) -> SSHClient:
+    """Open an SSH connection to the SFTP server in `config`, using the same
+    settings as the tenQ client (`host`, `port`, `username`, `password` and
+    `known_hosts`.)
+
+    If `known_hosts` (lines in the OpenSSH known hosts format) is configured, the
+    host key of the server must be in it or in the system known hosts, otherwise
+    the connection is rejected. If not, an unknown host key is accepted, as the
+    tenQ client does, and a warning is logged.
+    """
+    ssh_client = SSHClient()
+    ssh_client.load_system_host_keys()
+    known_hosts: list[str] = config.get("known_hosts") or []
+    for line in known_hosts:
+        entry: HostKeyEntry | None = HostKeyEntry.from_line(line)
+        if entry is None or entry.key is None:
+            raise SSHException(f"invalid known hosts entry: {line!r}")
+        for hostname in entry.hostnames:
+            ssh_client.get_host_keys().add(hostname, entry.key.get_name(), entry.key)
+    if known_hosts:
+        ssh_client.set_missing_host_key_policy(RejectPolicy())
+    else:
+        logger.warning(
+            "no known hosts configured, the host key of %s is not verified",
+            config["host"],
+        )
+        ssh_client.set_missing_host_key_policy(AutoAddPolicy())
+    ssh_client.connect(
+        hostname=config["host"],
+        port=config["port"],
+        username=config["username"],
+        password=config["password"],
+        look_for_keys=False,
+        allow_agent=False,
+    )
+    return ssh_client
+
+
+_pools: dict[tuple[str, int, str], SFTPSessionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(config: dict[str, Any]) -> SFTPSessionPool:
+    """Return the process-wide session pool for the SFTP server in `config`"""
+    key = (config["host"], config["port"], config["username"])
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = SFTPSessionPool(
+                config,
+                max_size=django_settings.PRISME_SFTP_MAX_WORKERS,  # type: ignore[misc]
+                max_age=django_settings.PRISME_SFTP_MAX_AGE_SECONDS,  # type: ignore
+            )
+        return _pools[key]
+
+
+@atexit.register
+def close_pools() -> None:
+    with _pools_lock:
+        pools: list[SFTPSessionPool] = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def list_prisme_folder(config: dict[str, Any], folder: str) -> list[str]:
+    with get_pool(config).session() as sftp:
+        return sftp.listdir(folder)
+
+
+def get_file_in_prisme_folder(
+    config: dict[str, Any], folder: str, filename: str
+) -> BytesIO:
+    buf = BytesIO()
+    with get_pool(config).session() as sftp:
+        sftp.getfo(posixpath.join(folder, filename), buf)
+    buf.seek(0)
+    return buf
+
+
+def put_file_in_prisme_folder(
+    config: dict[str, Any],
+    buf: BytesIO | str,
+    folder: str,
+    filename: str,
+) -> None:
+    remote_path: str = posixpath.join(folder, filename)
+    with get_pool(config).session() as sftp:
+        if isinstance(buf, str):
+            # `buf` is the path of a local file
+            sftp.put(buf, remote_path)
+        else:
+            buf.seek(0)
+            sftp.putfo(buf, remote_path)
@@ -2,13 +2,17 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
+from typing import Iterable, Iterator
 
 from django.conf import settings
 from tenacity import after_log, retry, retry_if_exception_type, stop_after_attempt
-from tenQ.client import ClientException, get_file_in_prisme_folder, list_prisme_folder
+from tenQ.client import ClientException
 
 from suila.integrations.prisme.retry import retry_wait
+from suila.integrations.prisme.sftp import get_file_in_prisme_folder, list_prisme_folder
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +47,37 @@ class SFTPImport:
         )
         return buf
 
+    def get_files(
+        self,
+        filenames: Iterable[str],
+        max_workers: int = 1,
+    ) -> Iterator[tuple[str, BytesIO | None]]:
+        """Download `filenames` concurrently, yielding each filename and its contents
+        in the order given.
+
+        At most `max_workers` downloads are in progress at any time, and the next files
+        are downloaded while the caller processes the current one. If a file cannot be
+        retrieved, its contents are `None`.
+        """
+
+        def get_file(filename: str) -> BytesIO | None:
+            try:
+                return self.get_file(filename)
+            except ClientException:
+                logger.exception("encountered error when retrieving file %r", filename)
+                return None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending: deque[tuple[str, Future]] = deque()
+            for filename in filenames:
+                pending.append((filename, executor.submit(get_file, filename)))
+                if len(pending) > max_workers:
+                    filename, future = pending.popleft()
+                    yield filename, future.result()
+            while pending:
+                filename, future = pending.popleft()
+                yield filename, future.result()
+
     @retry_policy
     def _get_remote_folder_filenames(self):
         return list_prisme_folder(
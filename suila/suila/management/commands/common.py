@@ -16,6 +16,9 @@ logger = logging.getLogger(__name__)
 
 
 class SuilaBaseCommand(BaseCommand):
+    # The `JobLog` of the current run, available to `_handle`
+    job_log: JobLog | None = None
+
     def add_arguments(self, parser):
         parser.add_argument("--profile", action="store_true", default=False)
         parser.add_argument("--reraise", action="store_true", default=False)
@@ -24,6 +27,7 @@ class SuilaBaseCommand(BaseCommand):
     def handle(self, *args, **options):
         job_name = os.path.basename(self.filename).split(".")[0]
         job_log = self.create_joblog(job_name, *args, **options)
+        self.job_log = job_log
 
         try:
             if options.get("profile", False):
@@ -31,6 +31,7 @@ from suila.models import (
     PrismeBatchItem,
     TaxInformationPeriod,
     Year,
+    deferred_income_recalculation,
 )
 
 User = get_user_model()
@@ -225,55 +226,56 @@ class Command(BaseCommand):
         line_no = 1
         for person, salary in persons.items():
             set_history_date(person, dates[2])
-            for date in dates:
-                year = date.year
-                month = date.month
-                year_obj, _ = Year.objects.update_or_create(year=year)
-
-                person_year, _ = PersonYear.objects.update_or_create(
-                    person=person, year=year_obj
-                )
-
-                person_month, _ = PersonMonth.objects.update_or_create(
-                    month=month,
-                    person_year=person_year,
-                    defaults={"import_date": datetime.date.today()},
-                )
-                set_history_date(person_month, date)
-                income = Decimal(salary[date.month - 1])
-                MonthlyIncomeReport.objects.update_or_create(
-                    person_month=person_month,
-                    month=month,
-                    year=year,
-                    defaults={
-                        "salary_income": income - 100,
-                        "employer_paid_gl_pension_income": Decimal(100),
-                        "employer": employer,
-                    },
-                )
-
-                if person.name == "Person with prisme items":
-                    tax_scope = "FULL"
-                else:
-                    tax_scope = random.choice(["FULL", "LIM", None])
+            with deferred_income_recalculation():
+                for date in dates:
+                    year = date.year
+                    month = date.month
+                    year_obj, _ = Year.objects.update_or_create(year=year)
+
+                    person_year, _ = PersonYear.objects.update_or_create(
+                        person=person, year=year_obj
+                    )
 
-                set_history_date(person_year, date)
+                    person_month, _ = PersonMonth.objects.update_or_create(
+                        month=month,
+                        person_year=person_year,
+                        defaults={"import_date": datetime.date.today()},
+                    )
+                    set_history_date(person_month, date)
+                    income = Decimal(salary[date.month - 1])
+                    MonthlyIncomeReport.objects.update_or_create(
+                        person_month=person_month,
+                        month=month,
+                        year=year,
+                        defaults={
+                            "salary_income": income - 100,
+                            "employer_paid_gl_pension_income": Decimal(100),
+                            "employer": employer,
+                        },
+                    )
 
-                if tax_scope:
-                    TaxInformationPeriod.objects.update_or_create(
+                    if person.name == "Person with prisme items":
+                        tax_scope = "FULL"
+                    else:
+                        tax_scope = random.choice(["FULL", "LIM", None])
+
+                    set_history_date(person_year, date)
+
+                    if tax_scope:
+                        TaxInformationPeriod.objects.update_or_create(
+                            person_year=person_year,
+                            tax_scope=tax_scope,
+                            start_date=datetime.datetime(year, month, 1, tzinfo=tz),
+                            end_date=datetime.datetime(
+                                year, month, days_in_month(year, month), tzinfo=tz
+                            ),
+                        )
+                    person_year.update_quarantine()
+                    AnnualIncome.objects.create(
                         person_year=person_year,
-                        tax_scope=tax_scope,
-                        start_date=datetime.datetime(year, month, 1, tzinfo=tz),
-                        end_date=datetime.datetime(
-                            year, month, days_in_month(year, month), tzinfo=tz
-                        ),
+                        account_tax_result=Decimal(130000),
+                        salary=random.randint(65000, 500000),
                     )
-                person_year.update_quarantine()
-                AnnualIncome.objects.create(
-                    person_year=person_year,
-                    account_tax_result=Decimal(130000),
-                    salary=random.randint(65000, 500000),
-                )
 
             call_command(ManagementCommands.ESTIMATE_INCOME, cpr=person.cpr)
 
@@ -0,0 +1,51 @@
+# SPDX-FileCopyrightText: 2025 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+from suila.integrations.eboks.client import EboksClient
+from suila.integrations.eboks.dispatch_queue import DispatchQueue
+from suila.management.commands.common import SuilaBaseCommand
+from suila.models import EboksMessage, SuilaEboksMessage
+
+
+class Command(SuilaBaseCommand):
+    """Send the e-Boks messages left in the dispatch queue, e.g. by an interrupted
+    run of `send_monthly_eboks_message`."""
+
+    filename = __file__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--send-workers",
+            type=int,
+            default=4,
+            help="Number of concurrent e-Boks requests",
+        )
+        super().add_arguments(parser)
+
+    def _handle(self, *args, **kwargs):
+        with (
+            EboksClient.from_settings() as client,
+            DispatchQueue.from_settings(
+                client,
+                workers=kwargs["send_workers"],
+                on_sent=self.handle_sent,
+                on_progress=self.report_progress,
+            ) as queue,
+        ):
+            loaded: int = queue.load()
+            self.stdout.write(f"{loaded} queued letters loaded")
+            queue.drain()
+            self.report_progress(queue.progress)
+
+    def handle_sent(self, message: EboksMessage):
+        suilamessage: SuilaEboksMessage | None = SuilaEboksMessage.objects.filter(
+            pk=message.pk
+        ).first()
+        if suilamessage is not None:
+            suilamessage.update_welcome_letter()
+
+    def report_progress(self, progress: str):
+        self.stdout.write(progress)
+        if self.job_log is not None:
+            self.job_log.output = progress
+            self.job_log.save(update_fields=("output",))
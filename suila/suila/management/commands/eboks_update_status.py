@@ -8,5 +8,29 @@ from suila.models import EboksMessage
 class Command(SuilaBaseCommand):
     filename = __file__
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of message IDs to look up per request",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of concurrent e-Boks requests",
+        )
+        super().add_arguments(parser)
+
     def _handle(self, *args, **kwargs):
-        EboksMessage.update_final_statuses()
+        counts = EboksMessage.update_final_statuses(
+            batch_size=kwargs["batch_size"], workers=kwargs["workers"]
+        )
+        output = ", ".join(
+            f"{status or '(none)'}: {count}" for status, count in sorted(counts.items())
+        )
+        self.stdout.write(output or "No messages awaiting post-processing")
+        if self.job_log is not None:
+            self.job_log.output = output
+            self.job_log.save(update_fields=("output",))
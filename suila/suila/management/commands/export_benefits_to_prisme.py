@@ -3,6 +3,8 @@
 # SPDX-License-Identifier: MPL-2.0
 from datetime import date
 
+from django.conf import settings
+
 from suila.integrations.prisme.benefits import BatchExport
 from suila.management.commands.common import SuilaBaseCommand
 
@@ -24,8 +26,18 @@ class Command(SuilaBaseCommand):
             nargs="?",
             default=today.month,
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.PRISME_SFTP_MAX_WORKERS,  # type: ignore[misc]
+            help="Number of batch files to upload to Prisme concurrently",
+        )
         super().add_arguments(parser)
 
     def _handle(self, *args, **options):
         batch_export: BatchExport = BatchExport(options["year"], options["month"])
-        batch_export.export_batches(self.stdout, verbosity=options["verbosity"])
+        batch_export.export_batches(
+            self.stdout,
+            verbosity=options["verbosity"],
+            max_workers=options["workers"],
+        )
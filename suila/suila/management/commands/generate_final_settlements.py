@@ -2,24 +2,53 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 import logging
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import batched
+from typing import Deque, List, Tuple
 
-from django.db.models import Q
+import django
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
 
 from suila.management.commands.common import SuilaBaseCommand
-from suila.models import FinalSettlement, PersonYear
+from suila.models import (
+    FinalSettlement,
+    PersonMonth,
+    PersonYear,
+    SuilaEboksMessage,
+    render_pdf,
+)
 
 logger = logging.getLogger(__name__)
 
 
 class Command(SuilaBaseCommand):
+    """Generate the final settlements for a year.
+
+    The settlement results are computed for all person years at once, after which
+    the PDFs are rendered in a pool of worker processes, as PDF rendering is
+    CPU-bound. Each batch of final settlements is saved along with its e-Boks
+    messages in a transaction once its PDFs are rendered, so a failure leaves no
+    final settlements without a PDF, and the command can simply be run again.
+    """
+
     filename = __file__
 
     def add_arguments(self, parser):
         parser.add_argument("year", type=int)
+        parser.add_argument(
+            "--render-workers",
+            type=int,
+            default=None,
+            help="Number of PDF rendering processes (default: number of CPUs)",
+        )
         super().add_arguments(parser)
 
     def _handle(self, *args, **kwargs):
         year = kwargs["year"]
+        render_workers: int = kwargs["render_workers"] or os.cpu_count() or 1
         person_years = (
             PersonYear.objects.filter(
                 year_id=year,
@@ -31,6 +60,10 @@ class Command(SuilaBaseCommand):
                 # Exclude those that already have a message
                 personmonth__suilaeboksmessage__type="årsopgørelse"
             )
+            .exclude(
+                # ... or a final settlement
+                annual_income_statements__final_settlements__isnull=False
+            )
             .exclude(
                 person__full_address="",
             )
@@ -41,22 +74,69 @@ class Command(SuilaBaseCommand):
                 | Q(person__full_address__contains="Administrativ")
             )
         )
-        person_years = person_years.distinct().select_related("person")
-
-        def handle_person_year(person_year):
-            annual_income = person_year.annual_income_statements.last()
-            final_settlement = FinalSettlement(annual_income=annual_income)
-            final_settlement.save()
-            pdf = final_settlement.pdf
-            result = final_settlement.result
-            final_settlement.save()
+        person_years = person_years.distinct().annotate(
+            # The final settlement letter is attached to the latest month
+            latest_person_month_id=Subquery(
+                PersonMonth.objects.filter(person_year=OuterRef("pk"))
+                .order_by("-month")
+                .values("pk")[:1]
+            )
+        )
+
+        final_settlements: List[FinalSettlement] = (
+            FinalSettlement.build_for_person_years(person_years)
+        )
+
+        # Batches of final settlements waiting to have their PDFs rendered
+        rendering: Deque[
+            Tuple[List[FinalSettlement], List[SuilaEboksMessage], List[Future]]
+        ] = deque()
+        with ProcessPoolExecutor(
+            max_workers=render_workers, initializer=django.setup
+        ) as executor:
+            for batch in batched(final_settlements, 100):
+                messages = [
+                    SuilaEboksMessage(
+                        person_month_id=(
+                            final_settlement.person_year.latest_person_month_id
+                        ),
+                        type="årsopgørelse",
+                    )
+                    for final_settlement in batch
+                ]
+                # Fetch the letter contents for the entire batch at once
+                SuilaEboksMessage.prefetch_context(messages)
+                futures = [
+                    executor.submit(render_pdf, message.html_docs({"pdf": True}))
+                    for message in messages
+                ]
+                rendering.append((list(batch), messages, futures))
+                # Prepare the next batch while this one is being rendered
+                if len(rendering) > 1:
+                    self.save_pdfs(*rendering.popleft())
+            while rendering:
+                self.save_pdfs(*rendering.popleft())
+        logger.debug(f"Generated {len(final_settlements)} final settlements")
+
+    def save_pdfs(
+        self,
+        final_settlements: List[FinalSettlement],
+        messages: List[SuilaEboksMessage],
+        futures: List[Future],
+    ):
+        # Wait for the entire batch, so nothing is saved if a PDF fails to render
+        pdfs: List[bytes] = [future.result() for future in futures]
+        with transaction.atomic():
+            for final_settlement, message, pdf in zip(
+                final_settlements, messages, pdfs
+            ):
+                message.set_pdf_data(pdf)
+                message.save()
+                final_settlement.eboks_message = message
+                final_settlement._pdf = message.contents.name
+            FinalSettlement.objects.bulk_create(final_settlements)
+        for final_settlement in final_settlements:
             logger.debug(
                 f"Created final settlement {final_settlement.pk} with result"
-                + f" {result} and PDF in {pdf}"
+                + f" {final_settlement._result} and PDF {final_settlement._pdf}"
             )
-
-        i = 0
-        for person_year in person_years:
-            handle_person_year(person_year)
-            i += 1
-        logger.debug(f"Generated {i} final settlements")
@@ -1,11 +1,13 @@
 # SPDX-FileCopyrightText: 2024 Magenta ApS <info@magenta.dk>
 #
 # SPDX-License-Identifier: MPL-2.0
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Any, Dict, Tuple, TypeGuard
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import batched
+from typing import Any, Dict, Iterable, List, Set, Tuple, TypeGuard
 
 from django.db.models import Q, QuerySet
 from requests.exceptions import HTTPError
+from simple_history.utils import bulk_update_with_history
 
 from suila.integrations.pitu.client import PituClient
 from suila.management.commands.common import SuilaBaseCommand
@@ -52,37 +54,93 @@ class Command(SuilaBaseCommand):
         self._write_verbose("Done")
         self.pitu_client.close()
 
+    # Fields written by `update_person` (including the fields updated by
+    # `Person.on_cpr_status_change`)
+    person_fields: List[str] = [
+        "civil_state",
+        "name",
+        "full_address",
+        "foreign_address",
+        "country_code",
+        "cpr_status",
+        "paused",
+        "pause_reason",
+    ]
+
+    # Number of changed persons written per bulk update
+    batch_size: int = 1000
+
     def update_persons(self, persons: QuerySet[Person], maxworkers: int = 5):
         self._write_verbose(f"Starting person update-workers (max_worker={maxworkers})")
+        self._changed_persons: List[Person] = []
+        # Look up `combined_service_page_size` persons per request to DAFO/Pitu, and
+        # only keep a bounded number of lookups in flight, rather than submitting a
+        # future for every batch at once.
+        page_size: int = self.pitu_client.combined_service_page_size
+        window_size: int = maxworkers * 2
         with ThreadPoolExecutor(max_workers=maxworkers) as executor:
-            future_to_person = {
-                executor.submit(self.fetch_person, person): person for person in persons
-            }
-            for future in as_completed(future_to_person):
+            pending: Set[Future] = set()
+            for batch in batched(persons.iterator(chunk_size=page_size), page_size):
+                if len(pending) >= window_size:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    self._process_results(done)
+                pending.add(executor.submit(self.fetch_persons, batch))
+            self._process_results(wait(pending).done)
+        self._save_changed_persons()
+
+    def _process_results(self, futures: Iterable[Future]):
+        for future in futures:
+            try:
+                results: List[Tuple[Person, Any]] = future.result()
+            except Exception as e:
+                self._write_verbose(f"Error fetching persons: {e}")
+                continue
+            for person_model, fetched_person_data in results:
                 try:
-                    future_tuple = future.result()
-                    if future_tuple:
-                        person_model, fetched_person_data = future_tuple
-                        self.update_person(person_model, fetched_person_data)
+                    if self.update_person(person_model, fetched_person_data):
+                        self._changed_persons.append(person_model)
                 except Exception as e:
                     self._write_verbose(f"Error processing person: {e}")
+        if len(self._changed_persons) >= self.batch_size:
+            self._save_changed_persons()
+
+    def _save_changed_persons(self):
+        if self._changed_persons:
+            bulk_update_with_history(
+                self._changed_persons,
+                Person,
+                self.person_fields,
+                batch_size=self.batch_size,
+            )
+            self._write_verbose(
+                f"Saved CPR data for {len(self._changed_persons)} persons"
+            )
+            self._changed_persons = []
 
-    def fetch_person(self, person: Person) -> Tuple[Person, Any] | None:
+    def fetch_persons(self, persons: Iterable[Person]) -> List[Tuple[Person, Any]]:
+        """Fetch DAFO/Pitu data for `persons`.
+
+        Returns a list of (person, data) tuples for the persons found in DAFO.
+        """
+        persons_by_cpr: Dict[str, Person] = {person.cpr: person for person in persons}
         try:
-            return person, self.pitu_client.get_person_info(person.cpr)
+            person_info = self.pitu_client.get_person_info_bulk(list(persons_by_cpr))
         except HTTPError as e:
-            if e.response.status_code == 404:
-                self._write_verbose(
-                    f"Could not find person with CPR={person.cpr} in DAFO"
+            self._write_verbose(
+                (
+                    f"Unexpected {e.response.status_code} "
+                    f"error: {str(e.response.content)}"
                 )
+            )
+            return []
+        results: List[Tuple[Person, Any]] = []
+        for cpr, person in persons_by_cpr.items():
+            data = person_info.get(cpr)
+            if data is None:
+                self._write_verbose(f"Could not find person with CPR={cpr} in DAFO")
             else:
-                self._write_verbose(
-                    (
-                        f"Unexpected {e.response.status_code} "
-                        f"error: {str(e.response.content)}"
-                    )
-                )
-            return None  # Indicate failure
+                results.append((person, data))
+        return results
 
     def _get_pitu_client(self) -> PituClient:
         # Use default configuration (CPR service) for Pitu client
@@ -92,7 +150,17 @@ class Command(SuilaBaseCommand):
         if self._verbose:
             self.stdout.write(msg, **kwargs)
 
-    def update_person(self, person: Person, data: Dict[str, Any]):
+    def update_person(self, person: Person, data: Dict[str, Any]) -> bool:
+        """Update `person` in memory using the DAFO/Pitu `data`.
+
+        Returns True if any field of `person` was changed. The caller is responsible
+        for saving the changed persons.
+        """
+        old_values: Tuple[Any, ...] = tuple(
+            getattr(person, field) for field in self.person_fields
+        )
+        old_cpr_status: int | None = person.cpr_status
+
         if "civilstand" in data:
             person.civil_state = data["civilstand"]
         else:
@@ -117,8 +185,14 @@ class Command(SuilaBaseCommand):
         person.foreign_address = data.get("udlandsadresse")
         person.country_code = data.get("landekode")
         person.cpr_status = data.get("statuskode")
-        person.save()
+        # Bulk updates do not send `pre_save`, so handle CPR status changes here
+        person.on_cpr_status_change(old_cpr_status, person.cpr_status)
 
-        self._write_verbose(
-            (f"Updated CPR data for {person.cpr} " f"(person data = {data})")
+        changed: bool = old_values != tuple(
+            getattr(person, field) for field in self.person_fields
         )
+        if changed:
+            self._write_verbose(
+                (f"Updated CPR data for {person.cpr} " f"(person data = {data})")
+            )
+        return changed
@@ -26,8 +26,7 @@ class Command(GetPersonInfoFromDafoCommand):
         self.pitu_client = self._get_pitu_client()
 
         person_qs_params = []
-        pitu_client = self._get_pitu_client()
-        updated_cprs = pitu_client.get_subscription_results(self.since)
+        updated_cprs = self.pitu_client.get_subscription_results(self.since)
         person_qs_params.append(Q(cpr__in=updated_cprs))
 
         persons = Person.objects.filter(*person_qs_params).order_by("pk")
@@ -35,4 +34,4 @@ class Command(GetPersonInfoFromDafoCommand):
         self.update_persons(persons, kwargs["maxworkers"])
 
         self._write_verbose("Done")
-        pitu_client.close()
+        self.pitu_client.close()
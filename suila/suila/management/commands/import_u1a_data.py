@@ -4,18 +4,14 @@
 
 from collections import defaultdict
 from decimal import Decimal
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 from django.conf import settings
 from django.db import transaction
 from pydantic import BaseModel
 from simple_history.utils import bulk_create_with_history, bulk_update_with_history
 
-from suila.integrations.akap.u1a import (
-    AKAPU1AItem,
-    get_akap_u1a_items,
-    get_akap_u1a_items_unique_cprs,
-)
+from suila.integrations.akap.u1a import AKAPU1A, AKAPU1AItem, get_all_akap_u1a_items
 from suila.management.commands.common import SuilaBaseCommand
 from suila.models import (
     DataLoad,
@@ -145,19 +141,25 @@ class Command(SuilaBaseCommand):
     ) -> ImportResult:
         result = ImportResult(import_year=year.year)
 
-        u1a_cprs: List[str] = [cpr] if cpr else []
-        if len(u1a_cprs) == 0:
-            # Get all unique CPRs in that year from AKAP
+        if not cpr:
             self._write_verbose(f"- No CPR(s) specified, fetching all for year: {year}")
-            u1a_cprs = get_akap_u1a_items_unique_cprs(
-                settings.AKAP_HOST,  # type: ignore[misc]
-                settings.AKAP_API_SECRET,  # type: ignore[misc]
-                year.year,
-                fetch_all=True,
-            )
 
-            if len(u1a_cprs) > 0:
-                self._write_verbose(f"- Fetched CPRs: {u1a_cprs}")
+        # Get all U1A items for the year (and CPR, if specified) from AKAP
+        akap_u1a_items: List[AKAPU1AItem] = get_all_akap_u1a_items(
+            settings.AKAP_HOST,  # type: ignore[misc]
+            settings.AKAP_API_SECRET,  # type: ignore[misc]
+            year=year.year,
+            cpr=cpr,
+            limit=settings.AKAP_PAGE_SIZE,  # type: ignore[misc]
+            max_workers=settings.AKAP_MAX_WORKERS,  # type: ignore[misc]
+        )
+        u1a_items_by_cpr: Dict[str, List[AKAPU1AItem]] = defaultdict(list)
+        for item in akap_u1a_items:
+            u1a_items_by_cpr[item.cpr_cvr_tin].append(item)
+
+        u1a_cprs: List[str] = [cpr] if cpr else list(u1a_items_by_cpr.keys())
+        if not cpr and len(u1a_cprs) > 0:
+            self._write_verbose(f"- Fetched CPRs: {u1a_cprs}")
 
         if len(u1a_cprs) < 1:
             self.stdout.write("- No CPR numbers found.")
@@ -172,154 +174,125 @@ class Command(SuilaBaseCommand):
         persons: List[Person] = []
         for cpr in u1a_cprs:
             person = persons_map.get(cpr)
-            if person:
-                persons.append(person)
-            else:
+            if person is None:
                 result.cprs_skipped.append(cpr)
                 self.stdout.write(
                     f"- WARNING: Could not find Person with CPR: {cpr}, skipping!"
                 )
+            elif not u1a_items_by_cpr.get(cpr):
+                self._write_verbose(
+                    f"\t- Person, {person}, does not have any U1AItems.. Skipping!"
+                )
+                result.cprs_skipped.append(cpr)
+            else:
+                persons.append(person)
 
         if not persons:
             self.stdout.write("- Unable to find Persons from CPR(s).")
             self.stdout.write("Stopping import!")
             return result
 
-        # Go through each person and create/update MonthlyIncomeReports
-        reports_to_create = {}
-        reports_to_update = {}
-        person_months_to_update: Dict[int, PersonMonth] = {}
+        # Get, or create, the PersonYears, Employers and PersonMonths referred to by
+        # the U1A items, using a constant number of queries.
+        person_years: Dict[str, PersonYear] = self._get_or_create_person_years(
+            data_load, year, persons, result
+        )
 
+        # Group the U1A items of each person by U1A
+        u1a_items_by_person_and_u1a: Dict[Tuple[str, int], List[AKAPU1AItem]] = (
+            defaultdict(list)
+        )
         for person in persons:
-            self.stdout.write(
-                f"- Fetching AKAP U1A data for person: {person} ({person.cpr})..."
-            )
-            person_akap_u1a_items = get_akap_u1a_items(
-                settings.AKAP_HOST,  # type: ignore[misc]
-                settings.AKAP_API_SECRET,  # type: ignore[misc]
-                year=year.year,
-                cpr=person.cpr,
-                fetch_all=True,
-            )
-            self._write_verbose(f"\t- Fetched U1A-items: {len(person_akap_u1a_items)}")
+            for item in u1a_items_by_cpr[person.cpr]:
+                u1a_items_by_person_and_u1a[(person.cpr, item.u1a.id)].append(item)
 
-            if len(person_akap_u1a_items) < 1:
-                self._write_verbose(
-                    f"\t- Person, {person}, does not have any U1AItems.. Skipping!"
-                )
-                result.cprs_skipped.append(person.cpr)
-                continue
-
-            u1a_items_dict: Dict[int, List[AKAPU1AItem]] = defaultdict(list)
-            for item in person_akap_u1a_items:
-                u1a_items_dict[item.u1a.id].append(item)
-
-            # Get, or create, PersonYear
-            self._write_verbose(f"\t- Fetching/creating PersonYear: {year}")
-            person_year, created = PersonYear.objects.get_or_create(
-                person=person,
-                year=year,
-                defaults={"load": data_load},
+        u1as: List[AKAPU1A] = [
+            u1a_items[0].u1a for u1a_items in u1a_items_by_person_and_u1a.values()
+        ]
+        employers: Dict[int, Employer] = self._get_or_create_employers(
+            data_load, u1as, result
+        )
+        person_months: Dict[Tuple[int, int], PersonMonth] = (
+            self._get_or_create_person_months(
+                data_load,
+                {
+                    (person_years[cpr], u1a_items[0].u1a.dato_vedtagelse.month)
+                    for (cpr, _), u1a_items in u1a_items_by_person_and_u1a.items()
+                },
+                result,
             )
+        )
 
-            if created:
-                result.person_years_created.append(person_year.id)
-
-            # Update, or create, MonthlyIncomeReports for each U1A
-            for _, u1a_items in u1a_items_dict.items():
-                u1a = u1a_items[0].u1a
-                u1a_month = u1a.dato_vedtagelse.month
+        # Get existing MonthlyIncomeReports for the PersonMonths and Employers
+        existing_reports: Dict[Tuple[int, int], MonthlyIncomeReport] = {
+            (report.employer_id, report.person_month_id): report
+            for report in MonthlyIncomeReport.objects.filter(
+                person_month__in=person_months.values(),
+                employer__in=employers.values(),
+            )
+        }
 
-                self.stdout.write(f"\t- Handling data for U1A: {u1a}...")
+        # Create/update MonthlyIncomeReports for each U1A
+        reports_to_create = {}
+        reports_to_update = {}
+        person_months_to_update: Dict[int, PersonMonth] = {}
 
-                # Get U1A Employer & PersonMonth (or create them)
-                self._write_verbose(
-                    (
-                        "\t\t- Fetching/creating Employer: "
-                        f"{u1a.virksomhedsnavn} ({u1a.cvr})"
-                    )
-                )
-                u1a_employer, created = Employer.objects.get_or_create(
-                    cvr=u1a.cvr,
-                    defaults={"load": data_load, "name": u1a.virksomhedsnavn},
-                )
-                if created:
-                    result.employers_created.append(u1a_employer.id)
+        for (cpr, _), u1a_items in u1a_items_by_person_and_u1a.items():
+            person_year = person_years[cpr]
+            u1a = u1a_items[0].u1a
+            u1a_month = u1a.dato_vedtagelse.month
+            u1a_employer = employers[int(u1a.cvr)]
+            u1a_person_month = person_months[(person_year.pk, u1a_month)]
 
-                self._write_verbose(
-                    (
-                        "\t\t- Fetching/creating PersonMonth: "
-                        f"{person_year.year.year}/{u1a_month}"
-                    )
-                )
-                u1a_person_month, created = PersonMonth.objects.get_or_create(
-                    person_year=person_year,
-                    month=u1a_month,
-                    defaults={"load": data_load, "import_date": data_load.timestamp},
+            self.stdout.write(f"\t- Handling data for U1A: {u1a}...")
+            self.stdout.write(
+                (
+                    "\t\t- Updating MonthlyIncomeReports for PersonMonth: "
+                    f"{u1a_person_month} ({u1a_employer})..."
                 )
-                if created:
-                    result.person_months_created.append(u1a_person_month.id)
+            )
 
-                # Add/update U-income to MonthlyIncomeReport
-                self.stdout.write(
-                    (
-                        "\t\t- Updating MonthlyIncomeReports for PersonMonth: "
-                        f"{u1a_person_month} ({u1a_employer})..."
-                    )
+            field_values: Dict[str, Any] = {
+                "u_income": sum(
+                    (u1a_item.udbytte for u1a_item in u1a_items), Decimal("0")
                 )
-
-                field_values: Dict[str, Any] = {
-                    "u_income": sum(
-                        (u1a_item.udbytte for u1a_item in u1a_items), Decimal("0")
-                    )
-                }
-                key = (
-                    person.cpr,
-                    person_year.year.year,
-                    u1a_person_month.month,
-                    u1a.cvr,
+            }
+            key = (cpr, year.year, u1a_month, u1a.cvr)
+            self._write_verbose(f"\t\t\t- MonthlyIncomeReport key: {key}")
+
+            report = existing_reports.get((u1a_employer.pk, u1a_person_month.pk))
+            if report is None:
+                report = MonthlyIncomeReport(
+                    employer=u1a_employer,
+                    person_month=u1a_person_month,
+                    load=data_load,
+                    **field_values,
                 )
-                self._write_verbose(f"\t\t\t- MonthlyIncomeReport key: {key}")
-
-                try:
-                    report = MonthlyIncomeReport.objects.get(
-                        employer=u1a_employer,
-                        person_month=u1a_person_month,
-                    )
-                except MonthlyIncomeReport.DoesNotExist:
-                    report = MonthlyIncomeReport(
-                        employer=u1a_employer,
-                        person_month=u1a_person_month,
-                        load=data_load,
-                        **field_values,
-                    )
+                report.update_amount()
+                reports_to_create[key] = report
+                self._write_verbose(f"\t\t\t- CREATED MonthlyIncomeReport: {report}")
+            else:
+                # An existing monthly income report exists
+                # for this person month and employer - update it.
+                changed = False
+                for field_name, field_value in field_values.items():
+                    if getattr(report, field_name) != field_value:
+                        setattr(report, field_name, field_value)
+                        changed = True
+
+                if changed:
                     report.update_amount()
-                    reports_to_create[key] = report
+                    reports_to_update[key] = report
                     self._write_verbose(
-                        f"\t\t\t- CREATED MonthlyIncomeReport: {report}"
+                        f"\t\t\t- UPDATED MonthlyIncomeReport: {report}"
                     )
-                else:
-                    # An existing monthly income report exists
-                    # for this person month and employer - update it.
-                    changed = False
-                    for field_name, field_value in field_values.items():
-                        if getattr(report, field_name) != field_value:
-                            setattr(report, field_name, field_value)
-                            changed = True
-
-                    if changed:
-                        report.update_amount()
-                        reports_to_update[key] = report
-                        self._write_verbose(
-                            f"\t\t\t- UPDATED MonthlyIncomeReport: {report}"
-                        )
-
-                # Lastly, set the related PersonMonth model to be updated
-                # NOTE: This will occur after MonthlyIncomeReports have been created,
-                # or updated.
-                person_months_to_update[u1a_person_month.id] = u1a_person_month
-
-            result.cprs_handled.append(person.cpr)
+
+            # Lastly, set the related PersonMonth model to be updated
+            # NOTE: This will occur after MonthlyIncomeReports have been created,
+            # or updated.
+            person_months_to_update[u1a_person_month.id] = u1a_person_month
+
+        result.cprs_handled = [person.cpr for person in persons]
 
         self.stdout.write("- Comitting database changes...")
 
@@ -357,7 +330,7 @@ class Command(SuilaBaseCommand):
 
         # Final, update PersonMonth.amount_sums
         # NOTE: This can only occur after create/update of MonthlyIncomeReports,
-        # since ."update_amount_sum()" uses a MonthlyIncomeReports-queryset.
+        # since the sums are computed from the MonthlyIncomeReports.
         self.stdout.write(
             (
                 "- Updating existing PersonMonths, "
@@ -365,11 +338,111 @@ class Command(SuilaBaseCommand):
                 "changes..."
             )
         )
-        for pm in list(person_months_to_update.values()):
-            pm.update_amount_sum()
-            pm.save()
-
+        amount_sums: Dict[int, Decimal] = PersonMonth.recompute_amount_sums(
+            person_months_to_update.keys()
+        )
+        for pm in person_months_to_update.values():
+            pm.amount_sum = amount_sums[pm.id]
             if pm.id not in result.person_months_created:
                 result.person_months_updated.append(pm.id)
+        PersonMonth.history.bulk_history_create(
+            list(person_months_to_update.values()), update=True, batch_size=1000
+        )
 
         return result
+
+    def _get_or_create_person_years(
+        self,
+        data_load: DataLoad,
+        year: Year,
+        persons: List[Person],
+        result: ImportResult,
+    ) -> Dict[str, PersonYear]:
+        self._write_verbose(f"- Fetching/creating PersonYears: {year}")
+        persons_by_id: Dict[int, Person] = {person.id: person for person in persons}
+        person_years: Dict[str, PersonYear] = {}
+        for person_year in PersonYear.objects.filter(year=year, person__in=persons):
+            person_year.person = persons_by_id[person_year.person_id]
+            person_years[person_year.person.cpr] = person_year
+
+        created: List[PersonYear] = bulk_create_with_history(
+            [
+                PersonYear(person=person, year=year, load=data_load)
+                for person in persons
+                if person.cpr not in person_years
+            ],
+            PersonYear,
+            batch_size=1000,
+        )
+        for person_year in created:
+            person_years[person_year.person.cpr] = person_year
+            result.person_years_created.append(person_year.id)
+
+        for person_year in person_years.values():
+            person_year.year = year
+        return person_years
+
+    def _get_or_create_employers(
+        self,
+        data_load: DataLoad,
+        u1as: List[AKAPU1A],
+        result: ImportResult,
+    ) -> Dict[int, Employer]:
+        names: Dict[int, str] = {int(u1a.cvr): u1a.virksomhedsnavn for u1a in u1as}
+        self._write_verbose(f"- Fetching/creating Employers: {list(names.keys())}")
+        employers: Dict[int, Employer] = {
+            employer.cvr: employer
+            for employer in Employer.objects.filter(cvr__in=names.keys())
+        }
+        created: List[Employer] = Employer.objects.bulk_create(
+            [
+                Employer(cvr=cvr, name=name, load=data_load)
+                for cvr, name in names.items()
+                if cvr not in employers
+            ]
+        )
+        for employer in created:
+            employers[employer.cvr] = employer
+            result.employers_created.append(employer.id)
+        return employers
+
+    def _get_or_create_person_months(
+        self,
+        data_load: DataLoad,
+        keys: Set[Tuple[PersonYear, int]],
+        result: ImportResult,
+    ) -> Dict[Tuple[int, int], PersonMonth]:
+        self._write_verbose(f"- Fetching/creating PersonMonths: {len(keys)}")
+        person_years_by_id: Dict[int, PersonYear] = {
+            person_year.pk: person_year for person_year, _ in keys
+        }
+        person_months: Dict[Tuple[int, int], PersonMonth] = {}
+        for person_month in PersonMonth.objects.filter(
+            person_year__in=person_years_by_id.keys(),
+            month__in={month for _, month in keys},
+        ):
+            person_month.person_year = person_years_by_id[person_month.person_year_id]
+            person_months[(person_month.person_year_id, person_month.month)] = (
+                person_month
+            )
+
+        created: List[PersonMonth] = bulk_create_with_history(
+            [
+                PersonMonth(
+                    person_year=person_year,
+                    month=month,
+                    load=data_load,
+                    import_date=data_load.timestamp,
+                )
+                for person_year, month in keys
+                if (person_year.pk, month) not in person_months
+            ],
+            PersonMonth,
+            batch_size=1000,
+        )
+        for person_month in created:
+            person_months[(person_month.person_year_id, person_month.month)] = (
+                person_month
+            )
+            result.person_months_created.append(person_month.id)
+        return person_months
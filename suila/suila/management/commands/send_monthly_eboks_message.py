@@ -2,21 +2,37 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 import logging
-from concurrent.futures import as_completed
-from concurrent.futures.thread import ThreadPoolExecutor
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from itertools import batched
+from typing import Deque, Tuple
 
+import django
 from django.conf import settings
 from django.db.models import Q
 
 from suila.integrations.eboks.client import EboksClient
+from suila.integrations.eboks.dispatch_queue import DispatchQueue
 from suila.management.commands.common import SuilaBaseCommand
-from suila.models import PersonMonth, PersonYear, SuilaEboksMessage
+from suila.models import PersonMonth, PersonYear, SuilaEboksMessage, render_pdf
 
 logger = logging.getLogger(__name__)
 
 
 class Command(SuilaBaseCommand):
+    """Generate (and optionally send) the monthly e-Boks letters.
+
+    The letters are processed in a three-stage pipeline:
+    1. The letter contents are gathered from the database in batches and rendered
+       as HTML in the main thread.
+    2. The HTML is rendered as PDF in a pool of worker processes, as PDF rendering
+       is CPU-bound.
+    3. The letters are sent to e-Boks by a `DispatchQueue`, which retries failed
+       letters later on without holding up the other letters.
+    """
+
     filename = __file__
 
     def add_arguments(self, parser):
@@ -25,18 +41,32 @@ class Command(SuilaBaseCommand):
         parser.add_argument("--cpr", type=str)
         parser.add_argument("--save", action="store_true")
         parser.add_argument("--send", action="store_true")
+        parser.add_argument(
+            "--render-workers",
+            type=int,
+            default=None,
+            help="Number of PDF rendering processes (default: number of CPUs)",
+        )
+        parser.add_argument(
+            "--send-workers",
+            type=int,
+            default=4,
+            help="Number of concurrent e-Boks requests",
+        )
         super().add_arguments(parser)
 
     def _handle(self, *args, **kwargs):
-        client = EboksClient.from_settings()
-        year = kwargs["year"]
-        month = kwargs["month"]
-        save = kwargs["save"]
-        send = kwargs["send"]
+        self.client = EboksClient.from_settings()
+        self.year = kwargs["year"]
+        self.month = kwargs["month"]
+        self.save_pdf = kwargs["save"]
+        self.send_letters = kwargs["send"]
+        render_workers: int = kwargs["render_workers"] or os.cpu_count() or 1
+        send_workers: int = kwargs["send_workers"]
 
         qs = (
             PersonYear.objects.filter(
-                year_id=year,
+                year_id=self.year,
                 person__welcome_letter_sent_at__isnull=True,
                 person__full_address__isnull=False,
             )
@@ -54,43 +84,87 @@ class Command(SuilaBaseCommand):
             qs = qs.filter(person__cpr=kwargs["cpr"])
         qs = qs.select_related("person")
 
-        def handle_person_year(personyear: PersonYear):
-            typ = (
-                "afventer"
-                if settings.ENFORCE_QUARANTINE  # type: ignore
-                and personyear.in_quarantine
-                else "opgørelse"
-            )
-            try:
-                personmonth: PersonMonth = personyear.personmonth_set.get(month=month)
-            except PersonMonth.DoesNotExist:
-                pass
-            else:
-                if personmonth.has_tax_information_period:
-                    suilamessage = SuilaEboksMessage.objects.create(
-                        person_month=personmonth, type=typ
-                    )
-                    if save:
-                        with open(f"/tmp/{personyear.person.cpr}.pdf", "wb") as fp:
-                            fp.write(suilamessage.pdf)
-                    return suilamessage
-                else:
-                    logger.info(
-                        "Skipping %r (no full tax scope for month)", personmonth
-                    )
+        self.processed = 0
+        self.rendered = 0
+        self.started = time.monotonic()
+
+        # Letters waiting to be rendered, in the order they were submitted
+        rendering: Deque[Tuple[SuilaEboksMessage, Future]] = deque()
 
-        i = 0
-        for batch in batched(qs.iterator(), 100):
-            with ThreadPoolExecutor() as executor:
-                futures = [
-                    executor.submit(handle_person_year, personyear)
-                    for personyear in batch
+        with (
+            ProcessPoolExecutor(
+                max_workers=render_workers, initializer=django.setup
+            ) as render_executor,
+            DispatchQueue.from_settings(
+                self.client, workers=send_workers, on_sent=self.handle_sent
+            ) as self.queue,
+        ):
+            for batch in batched(qs.iterator(chunk_size=100), 100):
+                suilamessages = [
+                    suilamessage
+                    for suilamessage in map(self.get_message, batch)
+                    if suilamessage is not None
                 ]
-                for future in as_completed(futures):
-                    suilamessage = future.result()
-                    if suilamessage:
-                        if send:
-                            suilamessage.send(client)
-                        suilamessage.update_welcome_letter()
-                    i += 1
-                    self.stdout.write(str(i))
+                # Fetch the letter contents for the entire batch at once
+                SuilaEboksMessage.prefetch_context(suilamessages)
+                for suilamessage in suilamessages:
+                    future = render_executor.submit(
+                        render_pdf, suilamessage.html_docs({"pdf": True})
+                    )
+                    rendering.append((suilamessage, future))
+                    # Keep at most two letters per rendering process in flight
+                    while rendering and (
+                        len(rendering) > 2 * render_workers or rendering[0][1].done()
+                    ):
+                        self.handle_rendered(*rendering.popleft())
+                self.queue.poll()
+                self.processed += len(batch)
+                self.report_progress()
+            while rendering:
+                self.handle_rendered(*rendering.popleft())
+            self.queue.drain()
+        self.report_progress()
+
+    def get_message(self, personyear: PersonYear) -> SuilaEboksMessage | None:
+        typ = (
+            "afventer"
+            if settings.ENFORCE_QUARANTINE and personyear.in_quarantine  # type: ignore
+            else "opgørelse"
+        )
+        try:
+            personmonth: PersonMonth = personyear.personmonth_set.get(month=self.month)
+        except PersonMonth.DoesNotExist:
+            return None
+        if not personmonth.has_tax_information_period:
+            logger.info("Skipping %r (no full tax scope for month)", personmonth)
+            return None
+        return SuilaEboksMessage(person_month=personmonth, type=typ)
+
+    def handle_rendered(self, suilamessage: SuilaEboksMessage, future: Future):
+        pdf_data: bytes = future.result()
+        suilamessage.set_pdf_data(pdf_data)
+        suilamessage.save()
+        self.rendered += 1
+        if self.save_pdf:
+            with open(f"/tmp/{suilamessage.person.cpr}.pdf", "wb") as fp:
+                fp.write(pdf_data)
+        if self.send_letters:
+            self.queue.put(suilamessage)
+        else:
+            suilamessage.update_welcome_letter()
+
+    def handle_sent(self, suilamessage: SuilaEboksMessage):
+        suilamessage.update_welcome_letter()
+
+    def report_progress(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.rendered / elapsed if elapsed > 0 else 0.0
+        progress = (
+            f"{self.processed} person years processed, "
+            f"{self.rendered} letters rendered ({rate:.1f} letters/s), "
+            f"{self.queue.progress}"
+        )
+        self.stdout.write(progress)
+        if self.job_log is not None:
+            self.job_log.output = progress
+            self.job_log.save(update_fields=("output",))
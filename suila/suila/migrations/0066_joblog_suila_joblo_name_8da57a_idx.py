@@ -0,0 +1,20 @@
+# Generated by Django 5.2.17 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("suila", "0065_alter_joblog_name_finalsettlement"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="joblog",
+            index=models.Index(
+                fields=["name", "status", "runtime"],
+                name="suila_joblo_name_8da57a_idx",
+            ),
+        ),
+    ]
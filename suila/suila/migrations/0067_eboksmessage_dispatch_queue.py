@@ -0,0 +1,59 @@
+# Generated by Django 5.2.17 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("suila", "0066_joblog_suila_joblo_name_8da57a_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eboksmessage",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="eboksmessage",
+            name="failure_reason",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("", ""),
+                    ("collision", "Besked-id findes allerede"),
+                    ("rejected", "Afvist af e-Boks"),
+                    ("unavailable", "e-Boks kunne ikke kontaktes"),
+                ],
+                default="",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="eboksmessage",
+            name="next_attempt_at",
+            field=models.DateTimeField(default=None, null=True),
+        ),
+        migrations.AlterField(
+            model_name="eboksmessage",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("created", "Genereret"),
+                    ("queued", "I kø"),
+                    ("sent", "Afsendt"),
+                    ("post_processing", "Afventer efterbehandling"),
+                    ("failed", "Afsendelse fejlet"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eboksmessage",
+            index=models.Index(
+                fields=["status", "next_attempt_at"],
+                name="suila_eboks_status_9469ba_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.17 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("suila", "0067_eboksmessage_dispatch_queue"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="eboksmessage",
+            index=models.Index(
+                fields=["contents"], name="suila_eboks_content_daac79_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="finalsettlement",
+            index=models.Index(fields=["_pdf"], name="suila_final__pdf_8859a8_idx"),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.17 on 2026-10-18 22:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("suila", "0068_pdf_reference_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="eboksmessage",
+            name="failure_reason",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("", ""),
+                    ("collision", "Besked-id findes allerede"),
+                    ("rejected", "Afvist af e-Boks"),
+                    ("unavailable", "e-Boks kunne ikke kontaktes"),
+                    ("error", "Uventet fejl"),
+                ],
+                default="",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -5,16 +5,20 @@ from __future__ import annotations
 
 import base64
 import calendar
+import hashlib
 import logging
 import os
-import uuid
+import threading
+from collections import Counter, defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import date, datetime
 from decimal import Decimal
 from functools import cached_property
-from io import BytesIO
 from itertools import batched
 from os.path import basename
-from typing import Any, Dict, Iterable, List, Sequence, Tuple
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Sequence, Tuple
 
 import pandas as pd
 import pytz
@@ -25,10 +29,9 @@ from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import DateTimeRangeField
-from django.core.files import File
 from django.core.files.base import ContentFile
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
-from django.db import models
+from django.db import connection, models, transaction
 from django.db.models import (
     SET_NULL,
     BooleanField,
@@ -48,9 +51,12 @@ from django.db.models import (
     TextChoices,
     Value,
     When,
+    prefetch_related_objects,
 )
+from django.db.models.fields.files import FieldFile
 from django.db.models.functions import Coalesce
-from django.db.models.signals import post_save, pre_save
+from django.db.models.lookups import GreaterThan, LessThan
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.template.loader import get_template
 from django.utils import timezone
@@ -59,13 +65,13 @@ from django.utils.translation import gettext_lazy as _
 from django.utils.translation import override
 from django_stubs_ext import StrOrPromise
 from lxml import etree
-from pypdf import PdfWriter
 from simple_history.models import HistoricalRecords
 from weasyprint import CSS, HTML
 from weasyprint.text.fonts import FontConfiguration
 
 from suila.data import engine_choices
 from suila.integrations.eboks.client import EboksClient, MessageFailureException
+from suila.integrations.eboks.envelope import DispatchEnvelope
 from suila.model_mixins import PermissionsMixin
 
 logger = logging.getLogger(__name__)
@@ -845,6 +851,22 @@ class PersonYear(PermissionsMixin, models.Model):
 
         return get_people_in_quarantine(self.year.year, [self.person.cpr])
 
+    @classmethod
+    def load_quarantine(cls, person_years: Iterable["PersonYear"]) -> None:
+        """Set `quarantine_df` on each of `person_years`, using one call to
+        `get_people_in_quarantine` per year instead of one per person year"""
+        from common.utils import get_people_in_quarantine
+
+        by_year: defaultdict[int, list[PersonYear]] = defaultdict(list)
+        for person_year in person_years:
+            by_year[person_year.year.year].append(person_year)
+        for year, items in by_year.items():
+            df: pd.DataFrame = get_people_in_quarantine(
+                year, [person_year.person.cpr for person_year in items]
+            )
+            for person_year in items:
+                person_year.quarantine_df = df
+
     @property
     def in_quarantine(self) -> bool:
         return (
@@ -869,7 +891,9 @@ class PersonYear(PermissionsMixin, models.Model):
 
     @property
     def engines_used_for_latest_calculation(self):
-
+        # This is only used for a single person year at a time, outside of the job
+        # dispatcher, so it looks up the latest job itself. The lookup is served by
+        # the (name, status, runtime) index on JobLog.
         last_job = (
             JobLog.objects.filter(
                 name=ManagementCommands.CALCULATE_BENEFIT,
@@ -1295,6 +1319,39 @@ class PersonMonth(PermissionsMixin, models.Model):
             self.monthlyincomereport_set.all()
         )
 
+    @classmethod
+    def recompute_amount_sums(cls, pks: Iterable[int]) -> Dict[int, Decimal]:
+        """Recompute `amount_sum` for the person months given by `pks`.
+
+        This is the set-based version of `update_amount_sum`, using a single UPDATE
+        statement for all the person months. Returns a dict mapping each updated
+        person month ID to its new `amount_sum`.
+        """
+        pks = list(pks)
+        if not pks:
+            return {}
+        person_month_table = connection.ops.quote_name(cls._meta.db_table)
+        report_table = connection.ops.quote_name(MonthlyIncomeReport._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {person_month_table} AS pm
+                SET amount_sum = sums.amount_sum
+                FROM (
+                    SELECT
+                        ids.id,
+                        COALESCE(SUM(mir.a_income + mir.u_income), 0) AS amount_sum
+                    FROM unnest(%s::bigint[]) AS ids(id)
+                    LEFT JOIN {report_table} AS mir ON mir.person_month_id = ids.id
+                    GROUP BY ids.id
+                ) AS sums
+                WHERE pm.id = sums.id
+                RETURNING pm.id, pm.amount_sum
+                """,
+                [pks],
+            )
+            return dict(cursor.fetchall())
+
     def __str__(self):
         return f"{self.year}/{self.month} ({self.person})"
 
@@ -1354,12 +1411,16 @@ class PersonMonth(PermissionsMixin, models.Model):
         if focus_date > now:
             return self.person_year.person.paused
 
+        # Range filters (rather than `runtime__month` etc.) can use the JobLog index
+        month_start = timezone.make_aware(
+            datetime(focus_date.year, focus_date.month, 1)
+        )
         calculate_benefit_jobs_this_month = (
             JobLog.objects.filter(
                 name=ManagementCommands.CALCULATE_BENEFIT,
-                runtime__month=focus_date.month,
-                runtime__year=focus_date.year,
                 status=StatusChoices.SUCCEEDED,
+                runtime__gte=month_start,
+                runtime__lt=month_start + relativedelta(months=1),
             )
             .filter(
                 Q(cpr_param__isnull=True) | Q(cpr_param=self.person_year.person.cpr)
@@ -1622,6 +1683,14 @@ class MonthlyIncomeReport(PermissionsMixin, models.Model):
 
     @staticmethod
     def pre_save(sender, instance: MonthlyIncomeReport, *args, **kwargs):
+        if _deferred_person_month_pks.get() is not None:
+            # Avoid looking up the person month, unless `month` and `year` are not
+            # yet populated.
+            if instance.month is None or instance.year is None:
+                instance.month = instance.person_month.month
+                instance.year = instance.person_month.year
+            instance.update_amount()
+            return
         instance.month = instance.person_month.month
         instance.year = instance.person_month.year
         instance.person = instance.person_month.person
@@ -1638,6 +1707,11 @@ class MonthlyIncomeReport(PermissionsMixin, models.Model):
         **kwargs,
     ):
         if update_fields is None or "a_income" in update_fields:
+            deferred_pks: set[int] | None = _deferred_person_month_pks.get()
+            if deferred_pks is not None:
+                deferred_pks.add(instance.person_month_id)
+                return
+            # A regular save, so the history row records the user of the request
             instance.person_month.update_amount_sum()
             instance.person_month.save(update_fields=["amount_sum"])
 
@@ -1655,6 +1729,43 @@ post_save.connect(
 )
 
 
+_deferred_person_month_pks: ContextVar[set[int] | None] = ContextVar(
+    "deferred_person_month_pks", default=None
+)
+
+
+@contextmanager
+def deferred_income_recalculation() -> Iterator[set[int]]:
+    """Suspend the per-row `MonthlyIncomeReport` signal handlers.
+
+    While the context is active, saving a `MonthlyIncomeReport` does not look up
+    its person month or recompute the person month `amount_sum`. Instead, the IDs
+    of the affected person months are collected, and their amount sums are
+    recomputed using a single UPDATE statement when the context exits without
+    errors. Nested contexts share the collected IDs of the outermost context.
+
+    Yields the set of collected person month IDs.
+    """
+    pks: set[int] | None = _deferred_person_month_pks.get()
+    if pks is not None:
+        yield pks
+        return
+    pks = set()
+    token = _deferred_person_month_pks.set(pks)
+    try:
+        yield pks
+    finally:
+        _deferred_person_month_pks.reset(token)
+    amount_sums: Dict[int, Decimal] = PersonMonth.recompute_amount_sums(pks)
+    if amount_sums:
+        person_months: List[PersonMonth] = list(
+            PersonMonth.objects.filter(pk__in=amount_sums)
+        )
+        PersonMonth.history.bulk_history_create(
+            person_months, update=True, batch_size=1000
+        )
+
+
 class BTaxPayment(PermissionsMixin, models.Model):
     """This model is used for tracking whether the person has actually paid tax on their
     B income for a given month.
@@ -2399,26 +2510,32 @@ class AnnualIncome(PermissionsMixin, models.Model):
         blank=True,
     )
 
-    def update_amounts(self):
+    # Incomes summarized as A and B income in all years. Care fee income is A income
+    # from 2025 and B income before that, and occupational benefit is A income
+    # until 2026.
+    a_income_fields: Tuple[str, ...] = (
+        "salary",
+        "foreign_pension_income",
+        "subsidy_foreign_pension_income",
+        "other_a_income",
+    )
+    b_income_fields: Tuple[str, ...] = (
+        "deposit_interest_income",
+        "bond_interest_income",
+        "other_interest_income",
+        "foreign_dividend_income",
+        "foreign_income",
+        "group_life_income",
+        "rental_income",
+        "other_b_income",
+        "account_share_business_amount",
+    )
+
+    def update_amounts(self, u_income: Decimal | None = None):
         year = self.person_year.year.year
         q = Decimal("0.01")
-        a_incomes = [
-            self.salary,
-            self.foreign_pension_income,
-            self.subsidy_foreign_pension_income,
-            self.other_a_income,
-        ]
-        b_incomes = [
-            self.deposit_interest_income,
-            self.bond_interest_income,
-            self.other_interest_income,
-            self.foreign_dividend_income,
-            self.foreign_income,
-            self.group_life_income,
-            self.rental_income,
-            self.other_b_income,
-            self.account_share_business_amount,
-        ]
+        a_incomes = [getattr(self, name) for name in self.a_income_fields]
+        b_incomes = [getattr(self, name) for name in self.b_income_fields]
 
         if year > 2024:
             a_incomes.append(self.care_fee_income)
@@ -2429,10 +2546,71 @@ class AnnualIncome(PermissionsMixin, models.Model):
 
         self.summarized_a_income = Decimal(sum(filter(None, a_incomes))).quantize(q)
         self.summarized_b_income = Decimal(sum(filter(None, b_incomes))).quantize(q)
-        self.summarized_u_income = self.get_u_income().quantize(q)
+        if u_income is None:
+            u_income = self.get_u_income()
+        self.summarized_u_income = u_income.quantize(q)
 
         return
 
+    @classmethod
+    def update_amounts_bulk(cls, queryset: QuerySet[AnnualIncome]) -> int:
+        """Update and save the summarized amounts of the annual incomes in `queryset`
+        using a single `UPDATE` statement, and return the number of rows updated.
+
+        The amounts are the same as the ones computed by `update_amounts`. The
+        year-dependent classification of income is expressed as `CASE` expressions
+        on the year of the person year, and the U income is summed in a subquery
+        grouped by person year.
+
+        As with `QuerySet.update`, no history records are created.
+        """
+        zero = Decimal(0)
+
+        def amount(name: str) -> Coalesce:
+            return Coalesce(F(name), zero)
+
+        def total(*amounts: Expression) -> Expression:
+            return sum(amounts[1:], amounts[0])
+
+        # Joined fields cannot be referenced in an `UPDATE`, so the year is looked
+        # up in a subquery. The primary key of `Year` is the year itself.
+        year = Subquery(
+            PersonYear.objects.filter(pk=OuterRef("person_year_id")).values("year_id"),
+            output_field=IntegerField(),
+        )
+        care_fee_income_a = Case(
+            When(GreaterThan(year, 2024), then=amount("care_fee_income")),
+            default=Value(zero),
+        )
+        care_fee_income_b = Case(
+            When(GreaterThan(year, 2024), then=Value(zero)),
+            default=amount("care_fee_income"),
+        )
+        occupational_benefit_a = Case(
+            When(LessThan(year, 2026), then=amount("occupational_benefit")),
+            default=Value(zero),
+        )
+        u_income = Subquery(
+            MonthlyIncomeReport.objects.filter(
+                person_month__person_year=OuterRef("person_year_id"), u_income__gt=0
+            )
+            .order_by()
+            .values("person_month__person_year")
+            .annotate(sum=Func(F("u_income"), function="SUM"))
+            .values("sum")
+        )
+        return queryset.update(
+            summarized_a_income=total(
+                *map(amount, cls.a_income_fields),
+                care_fee_income_a,
+                occupational_benefit_a,
+            ),
+            summarized_b_income=total(
+                *map(amount, cls.b_income_fields), care_fee_income_b
+            ),
+            summarized_u_income=Coalesce(u_income, zero),
+        )
+
     def get_u_income(self) -> Decimal:
         return self.person_year.amount_sum_by_type(IncomeType.U)
 
@@ -2462,6 +2640,11 @@ class AnnualIncome(PermissionsMixin, models.Model):
 
 
 class FinalSettlement(PermissionsMixin, models.Model):
+    class Meta:
+        indexes = [
+            # Used by `pdf_reference_count`
+            Index(fields=("_pdf",)),
+        ]
 
     # The connection to PersonYear is through AnnualIncome
     annual_income = models.ForeignKey(
@@ -2503,17 +2686,74 @@ class FinalSettlement(PermissionsMixin, models.Model):
             self.eboks_message = SuilaEboksMessage.objects.create(
                 person_month=person_month, type="årsopgørelse"
             )
-            pdf_bytes = self.eboks_message.pdf
-            cpr = self.person_year.person.cpr
-            year = self.person_year.year.year
-            # Include year and CPR in file name to identify.
-            # Include PK to ensure uniqueness.
-            pdf_content = ContentFile(
-                pdf_bytes, name=f"aarsopgoerelse_{year}_{cpr}_{self.pk}.pdf"
-            )
-            self._pdf = pdf_content
+            # The e-Boks message has already rendered and stored the PDF, so
+            # refer to the same (content-addressed) file instead of storing a copy.
+            self._pdf = self.eboks_message.contents.name
         return self._pdf
 
+    @classmethod
+    def build_for_person_years(
+        cls, person_years: QuerySet[PersonYear]
+    ) -> List[FinalSettlement]:
+        """Build (but do not save) final settlements for `person_years`, using the
+        latest annual income of each person year.
+
+        The results for all person years are computed in one pass: the latest annual
+        income and the benefit transferred of each person year are fetched, the
+        annual incomes which have no summarized amounts yet are summarized using
+        `AnnualIncome.update_amounts_bulk`, and the benefit is then calculated
+        using the calculation method of the year, all in a fixed number of queries.
+        """
+        zero = Decimal(0)
+        person_years = person_years.select_related("year").annotate(
+            latest_annual_income_id=Subquery(
+                AnnualIncome.objects.filter(person_year=OuterRef("pk"))
+                .order_by("-pk")
+                .values("pk")[:1]
+            ),
+            sum_benefit_transferred=Coalesce(
+                Subquery(
+                    PersonMonth.objects.filter(person_year=OuterRef("pk"))
+                    .order_by()
+                    .values("person_year")
+                    .annotate(sum=Func(F("benefit_transferred"), function="SUM"))
+                    .values("sum")
+                ),
+                zero,
+            ),
+        )
+        person_years_by_annual_income: Dict[int, PersonYear] = {
+            person_year.latest_annual_income_id: person_year
+            for person_year in person_years
+            if person_year.latest_annual_income_id is not None
+        }
+        AnnualIncome.update_amounts_bulk(
+            AnnualIncome.objects.filter(
+                Q(summarized_a_income__isnull=True)
+                | Q(summarized_b_income__isnull=True)
+                | Q(summarized_u_income__isnull=True),
+                pk__in=person_years_by_annual_income.keys(),
+            )
+        )
+        annual_incomes: Dict[int, AnnualIncome] = AnnualIncome.objects.in_bulk(
+            person_years_by_annual_income.keys()
+        )
+        # Share one `Year` (and calculation method) between all person years
+        years: Dict[int, Year] = {}
+        final_settlements: List[FinalSettlement] = []
+        for annual_income_id, person_year in person_years_by_annual_income.items():
+            person_year.year = years.setdefault(person_year.year_id, person_year.year)
+            annual_income = annual_incomes[annual_income_id]
+            annual_income.person_year = person_year
+            benefit: Decimal = annual_income.calculate_actual_annual_benefit()
+            final_settlements.append(
+                cls(
+                    annual_income=annual_income,
+                    _result=benefit - person_year.sum_benefit_transferred,
+                )
+            )
+        return final_settlements
+
     @property
     def benefit_due_for_year(self):
         return self.annual_income.calculate_actual_annual_benefit()
@@ -2557,6 +2797,11 @@ def after_save_final_settlement(sender, instance, **kwargs):
     instance.pdf
 
 
+@receiver(post_delete, sender=FinalSettlement)
+def after_delete_final_settlement(sender, instance, **kwargs):
+    release_pdf(instance._pdf)
+
+
 class JobLog(PermissionsMixin, models.Model):
     """
     model which keeps track of:
@@ -2566,6 +2811,11 @@ class JobLog(PermissionsMixin, models.Model):
         - With which args/kwargs
     """
 
+    class Meta:
+        indexes = [
+            Index(fields=("name", "status", "runtime")),
+        ]
+
     name = models.TextField(choices=ManagementCommands)
     runtime = models.DateTimeField(auto_now_add=True)
     runtime_end = models.DateTimeField(default=None, null=True)
@@ -2588,6 +2838,14 @@ class JobLog(PermissionsMixin, models.Model):
 
 
 class EboksMessage(PermissionsMixin, models.Model):
+    class Meta:
+        indexes = [
+            # Used by `DispatchQueue` to find the queued messages which are due
+            Index(fields=("status", "next_attempt_at")),
+            # Used by `pdf_reference_count`
+            Index(fields=("contents",)),
+        ]
+
     created = models.DateTimeField(auto_now_add=True)
     sent = models.DateTimeField(null=True)
     cpr_cvr = models.CharField(validators=[RegexValidator(r"\d{8,10}")])
@@ -2597,6 +2855,8 @@ class EboksMessage(PermissionsMixin, models.Model):
     status = models.CharField(
         choices=(
             ("created", _("Genereret")),
+            # Waiting to be sent by the dispatch queue
+            ("queued", _("I kø")),
             # sent means that the message was successfully delivered to e-boks.
             ("sent", _("Afsendt")),
             # Successfully sent to proxy but awaiting post-processing
@@ -2635,6 +2895,25 @@ class EboksMessage(PermissionsMixin, models.Model):
     contents = models.FileField(
         null=True, upload_to=settings.LOCAL_EBOKS_PDF_STORAGE  # type: ignore
     )
+    # Dispatch queue state
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, default=None)
+    failure_reason = models.CharField(
+        choices=(
+            ("", ""),
+            # The message ID already exists on the server (HTTP 419)
+            ("collision", _("Besked-id findes allerede")),
+            # The message was rejected by e-Boks (HTTP 400)
+            ("rejected", _("Afvist af e-Boks")),
+            # e-Boks could not be reached in any of the attempts
+            ("unavailable", _("e-Boks kunne ikke kontaktes")),
+            # Any other error, e.g. an unexpected response from e-Boks
+            ("error", _("Uventet fejl")),
+        ),
+        default="",
+        blank=True,
+        max_length=20,
+    )
 
     @classmethod
     def dispatch(
@@ -2651,9 +2930,35 @@ class EboksMessage(PermissionsMixin, models.Model):
         return message
 
     def set_pdf_data(self, pdf_data: bytes):
-        name = f"{uuid.uuid4()}.pdf"
-        self.contents.save(
-            content=File(BytesIO(pdf_data), name=name), name=name, save=False
+        previous: FieldFile = self.contents
+        store_pdf(self.contents, pdf_data)
+        self._stored_pdf_data = pdf_data
+        if previous and previous.name != self.contents.name:
+            # Release the previous PDF once this message no longer refers to it
+            self._replaced_pdfs.append(previous)
+
+    @cached_property
+    def _replaced_pdfs(self) -> List[FieldFile]:
+        return []
+
+    # The PDF data stored by `set_pdf_data`, until the message is saved
+    _stored_pdf_data: bytes | None = None
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "contents" not in update_fields:
+            return
+        if self._stored_pdf_data is not None:
+            retain_pdf(self.contents, self._stored_pdf_data)
+            self._stored_pdf_data = None
+        while self._replaced_pdfs:
+            release_pdf(self._replaced_pdfs.pop())
+
+    @property
+    def envelope(self) -> DispatchEnvelope:
+        return DispatchEnvelope(
+            self.cpr_cvr, self.title, self.content_type, self.contents
         )
 
     @cached_property
@@ -2680,20 +2985,7 @@ class EboksMessage(PermissionsMixin, models.Model):
             self.save(update_fields=["status", "message_id", "sent"])
             raise
         else:
-            self.message_id = response_json[
-                "message_id"
-            ]  # message_id might have changed so get it from the response
-            # we always only have 1 recipient
-            recipient = response_json["recipients"][0]
-            self.recipient_status = recipient["status"]
-            self.sent = timezone.now()
-            if recipient["post_processing_status"] == "":
-                self.status = "sent"
-                self.is_postprocessing = False
-
-            else:
-                self.status = "post_processing"
-                self.is_postprocessing = True
+            self.set_dispatched(response_json)
             self.save(
                 update_fields=["status", "message_id", "sent", "is_postprocessing"]
             )
@@ -2701,6 +2993,23 @@ class EboksMessage(PermissionsMixin, models.Model):
             if created_client:
                 client.close()
 
+    def set_dispatched(self, response_json: Dict[str, Any]) -> None:
+        """Update the message from the e-Boks response to a successful dispatch"""
+        self.message_id = response_json[
+            "message_id"
+        ]  # message_id might have changed so get it from the response
+        # we always only have 1 recipient
+        recipient = response_json["recipients"][0]
+        self.recipient_status = recipient["status"]
+        self.sent = timezone.now()
+        if recipient["post_processing_status"] == "":
+            self.status = "sent"
+            self.is_postprocessing = False
+
+        else:
+            self.status = "post_processing"
+            self.is_postprocessing = True
+
     @staticmethod
     def generate_xml(
         cpr_cvr: str, title: str, content_type_id: int, pdf_data: bytes
@@ -2744,28 +3053,208 @@ class EboksMessage(PermissionsMixin, models.Model):
         return etree.tostring(root, xml_declaration=True, encoding="UTF-8")
 
     @staticmethod
-    def update_final_statuses(client: EboksClient | None = None):
-        if EboksMessage.objects.filter(is_postprocessing=True).exists():
-            if client is None:
-                client = EboksClient.from_settings()
-            qs = EboksMessage.objects.filter(is_postprocessing=True)
-            messages = {message.message_id: message for message in qs}
-            response = client.get_recipient_status(list(messages.keys()))
-            for response_message in response.json():
-                message_id = response_message["message_id"]
-                message = messages[message_id]
-                recipient = response_message["recipients"][0]
-                if recipient["post_processing_status"] != "pending":
-                    message.status = "sent"
-                    message.post_processing_status = recipient["post_processing_status"]
-                    message.is_postprocessing = False
-                    message.save(
-                        update_fields=[
-                            "status",
-                            "post_processing_status",
-                            "is_postprocessing",
-                        ]
+    def update_final_statuses(
+        client: EboksClient | None = None, batch_size: int = 100, workers: int = 1
+    ) -> Counter[str]:
+        """Update the messages awaiting post-processing with their status in e-Boks.
+
+        The statuses are fetched in batches of `batch_size` message IDs, using up to
+        `workers` concurrent requests, and the messages whose post-processing is
+        done are saved with a single `bulk_update` per batch.
+
+        Returns the number of messages per post-processing status.
+        """
+        counts: Counter[str] = Counter()
+        qs = (
+            EboksMessage.objects.filter(is_postprocessing=True)
+            .order_by("pk")
+            .only("pk", "message_id")
+        )
+        if not qs.exists():
+            return counts
+        created_client = False
+        if client is None:
+            client = EboksClient.from_settings()
+            created_client = True
+        # Batches of messages (keyed by message ID) and their pending requests
+        pending: Deque[Tuple[Dict[str, EboksMessage], Future]] = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for batch in batched(qs.iterator(chunk_size=batch_size), batch_size):
+                    messages = {message.message_id: message for message in batch}
+                    future = executor.submit(
+                        client.get_recipient_status, list(messages.keys())
                     )
+                    pending.append((messages, future))
+                    # Keep at most two requests per worker in flight
+                    while len(pending) > 2 * workers:
+                        EboksMessage._update_statuses(*pending.popleft(), counts)
+                while pending:
+                    EboksMessage._update_statuses(*pending.popleft(), counts)
+        finally:
+            if created_client:
+                client.close()
+        return counts
+
+    @staticmethod
+    def _update_statuses(
+        messages: Dict[str, EboksMessage], future: Future, counts: Counter[str]
+    ) -> None:
+        updated: List[EboksMessage] = []
+        for response_message in future.result().json():
+            message = messages.get(response_message["message_id"])
+            if message is None:
+                continue
+            recipient = response_message["recipients"][0]
+            counts[recipient["post_processing_status"]] += 1
+            if recipient["post_processing_status"] != "pending":
+                message.status = "sent"
+                message.post_processing_status = recipient["post_processing_status"]
+                message.is_postprocessing = False
+                updated.append(message)
+        EboksMessage.objects.bulk_update(
+            updated, ["status", "post_processing_status", "is_postprocessing"]
+        )
+
+
+@receiver(post_delete, sender=EboksMessage)
+def after_delete_eboks_message(sender, instance, **kwargs):
+    release_pdf(instance.contents)
+
+
+@contextmanager
+def pdf_lock(name: str) -> Iterator[None]:
+    """Hold a lock on the stored PDF `name` for the rest of the current transaction
+    (or for the duration of the block, outside a transaction.)
+
+    Storing and deleting the same PDF is serialized by this lock, across processes.
+    """
+    key: int = int.from_bytes(
+        hashlib.sha256(name.encode("utf-8")).digest()[:8], "big", signed=True
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [key])
+        yield
+
+
+def store_pdf(field_file: FieldFile, pdf_data: bytes) -> None:
+    """Store `pdf_data` in `field_file` under a name derived from its SHA-256 hash.
+
+    Identical PDFs (e.g. a letter which is regenerated or resent) are only written
+    once, and the file is shared by all the objects referring to it. It is deleted
+    by `release_pdf` when the last of them is gone.
+
+    Until the object referring to the file is committed, the file may be deleted
+    by `release_pdf` in another transaction, so `retain_pdf` must be called when
+    the object is saved.
+    """
+    digest: str = hashlib.sha256(pdf_data).hexdigest()
+    name: str = field_file.field.generate_filename(field_file.instance, f"{digest}.pdf")
+    storage = field_file.storage
+    with pdf_lock(name):
+        if not storage.exists(name):
+            storage.save(name, ContentFile(pdf_data))
+    setattr(field_file.instance, field_file.field.attname, name)
+
+
+def pdf_reference_count(name: str) -> int:
+    """Return the number of objects referring to the stored PDF `name`"""
+    return (
+        EboksMessage.objects.filter(contents=name).count()
+        + FinalSettlement.objects.filter(_pdf=name).count()
+    )
+
+
+def retain_pdf(field_file: FieldFile, pdf_data: bytes) -> None:
+    """Make sure the PDF stored by `store_pdf` in `field_file` exists once the
+    object referring to it is committed.
+
+    `release_pdf` in another transaction may have deleted the file after
+    `store_pdf` found it, but before this object referring to it was committed. In
+    that case the file is stored again.
+    """
+    name: str = field_file.name
+    storage = field_file.storage
+
+    def store_missing():
+        with pdf_lock(name):
+            if not storage.exists(name):
+                storage.save(name, ContentFile(pdf_data))
+
+    transaction.on_commit(store_missing)
+
+
+def release_pdf(field_file: FieldFile | None) -> None:
+    """Delete the stored PDF in `field_file` if nothing refers to it anymore.
+
+    The check runs once the current transaction is committed, so a rolled back
+    deletion does not leave objects referring to a missing file. The check and the
+    deletion hold the lock on the PDF, so they do not interleave with `store_pdf`
+    or `retain_pdf` storing the same PDF.
+    """
+    if not field_file:
+        return
+    name: str = field_file.name
+    storage = field_file.storage
+
+    def delete_unreferenced():
+        with pdf_lock(name):
+            if pdf_reference_count(name) == 0:
+                storage.delete(name)
+
+    transaction.on_commit(delete_unreferenced)
+
+
+_pdf_resources = threading.local()
+
+
+def get_pdf_resources() -> Tuple[CSS, FontConfiguration, Dict[str, Any]]:
+    """Return the stylesheet, font configuration and resource cache used for
+    rendering PDFs.
+
+    These are created once per thread (which in the PDF rendering worker processes
+    means once per process) and reused. The resource cache holds the images shared
+    by all letters (such as the sender logo and the benefit graphs), so they are
+    only loaded and decoded once rather than once per letter.
+    """
+    if not hasattr(_pdf_resources, "css"):
+        font_config = FontConfiguration()
+        _pdf_resources.font_config = font_config
+        _pdf_resources.css = CSS(
+            filename=os.path.join(
+                settings.BASE_DIR.parent,  # type: ignore[misc]
+                "suila",
+                "static",
+                "suila",
+                "pdf.css",
+            ),
+            font_config=font_config,
+        )
+        _pdf_resources.cache = {}
+    return _pdf_resources.css, _pdf_resources.font_config, _pdf_resources.cache
+
+
+def render_pdf(html_docs: Iterable[str]) -> bytes:
+    """Render the HTML documents of a letter into a single PDF.
+
+    Each document is laid out separately (so page numbers restart for each
+    document), and the pages of all documents are then written as one PDF in a
+    single pass.
+
+    This does not access the database, so it can be called from worker
+    processes.
+    """
+    css, font_config, cache = get_pdf_resources()
+    documents = [
+        HTML(string=html).render(
+            font_config=font_config, stylesheets=[css], cache=cache
+        )
+        for html in html_docs
+    ]
+    if not documents:
+        return b""
+    pages = [page for document in documents for page in document.pages]
+    return documents[0].copy(pages).write_pdf()
 
 
 class SuilaEboksMessage(EboksMessage):
@@ -2901,17 +3390,93 @@ class SuilaEboksMessage(EboksMessage):
         with override(language):
             return gettext(self.person.get_pause_reason_display())
 
-    @cached_property
-    def context(self):
+    @property
+    def year_range(self) -> range:
+        # The current year and the two previous years
+        return range(self.year, self.year - 3, -1)
+
+    @classmethod
+    def get_income(
+        cls, messages: Sequence[SuilaEboksMessage]
+    ) -> List[Dict[str, List[Decimal]]]:
+        """Return the income sums shown in each of `messages`.
+
+        For each message, each income type maps to a list of the sum for the
+        message month, followed by the sums for each year in `year_range`.
+        The sums are computed using a fixed number of aggregated queries, regardless
+        of the number of messages.
+        """
         quant = Decimal("0.01")
-        year_range = range(self.year, self.year - 3, -1)
-        year_map = [[self.person_month]] + [
-            PersonMonth.objects.filter(
-                person_year__person=self.person, person_year__year_id=y
-            )
-            for y in year_range
+        prefetch_related_objects(list(messages), "person_month__person_year")
+        person_month_ids = {message.person_month_id for message in messages}
+        person_ids = {message.person_year.person_id for message in messages}
+        years = {year for message in messages for year in message.year_range}
+
+        person_key = "person_month__person_year__person"
+        year_key = "person_month__person_year__year"
+        monthly_sums: Dict[int, Dict[str, Decimal]] = defaultdict(dict)
+        yearly_sums: Dict[Tuple[int, int], Dict[str, Decimal]] = defaultdict(dict)
+        aggregates: List[Tuple[type[models.Model], Dict[str, Sum]]] = [
+            (
+                MonthlyIncomeReport,
+                {
+                    "catchsale_income": Sum("catchsale_income"),
+                    "salary_income": Sum("salary_income"),
+                    "capital_income": Sum("u_income"),
+                },
+            ),
+            (BTaxPayment, {"btax_paid": Sum("amount_paid")}),
         ]
+        for model, sums in aggregates:
+            for row in (
+                model.objects.filter(person_month_id__in=person_month_ids)
+                .values("person_month_id")
+                .annotate(**sums)
+            ):
+                monthly_sums[row["person_month_id"]].update(
+                    {key: row[key] for key in sums}
+                )
+            for row in (
+                model.objects.filter(
+                    **{f"{person_key}__in": person_ids, f"{year_key}__in": years}
+                )
+                .values(person_key, year_key)
+                .annotate(**sums)
+            ):
+                yearly_sums[(row[person_key], row[year_key])].update(
+                    {key: row[key] for key in sums}
+                )
+
+        keys = [key for _, sums in aggregates for key in sums]
+        result: List[Dict[str, List[Decimal]]] = []
+        for message in messages:
+            groups = [monthly_sums[message.person_month_id]] + [
+                yearly_sums[(message.person_year.person_id, year)]
+                for year in message.year_range
+            ]
+            result.append(
+                {
+                    key: [
+                        Decimal(group.get(key) or 0).quantize(quant) for group in groups
+                    ]
+                    for key in keys
+                }
+            )
+        return result
+
+    @classmethod
+    def prefetch_context(cls, messages: Sequence[SuilaEboksMessage]) -> None:
+        """Populate the data used by `context` for all of `messages` in bulk"""
+        for message, income in zip(messages, cls.get_income(messages)):
+            # Populate the cached property
+            message.income = income
+
+    @cached_property
+    def income(self) -> Dict[str, List[Decimal]]:
+        return self.get_income([self])[0]
 
+    @cached_property
+    def context(self):
         context: Dict[str, Any] = {
             "person": self.person,
             "year": self.year,
@@ -2964,56 +3529,7 @@ class SuilaEboksMessage(EboksMessage):
                     + self.person_year.b_income
                     - self.person_year.b_expenses
                     - self.person_year.catchsale_expenses,
-                    "income": {
-                        "catchsale_income": [
-                            Decimal(
-                                sum(
-                                    [
-                                        report.catchsale_income
-                                        for pm in months
-                                        for report in pm.monthlyincomereport_set.all()
-                                    ]
-                                )
-                            ).quantize(quant)
-                            for months in year_map
-                        ],
-                        "salary_income": [
-                            Decimal(
-                                sum(
-                                    [
-                                        report.salary_income
-                                        for pm in months
-                                        for report in pm.monthlyincomereport_set.all()
-                                    ]
-                                )
-                            ).quantize(quant)
-                            for months in year_map
-                        ],
-                        "btax_paid": [
-                            Decimal(
-                                sum(
-                                    [
-                                        payment.amount_paid
-                                        for pm in months
-                                        for payment in pm.btaxpayment_set.all()
-                                    ]
-                                )
-                            ).quantize(quant)
-                            for months in year_map
-                        ],
-                        "capital_income": [
-                            Decimal(
-                                sum(
-                                    [
-                                        report.u_income
-                                        for pm in months
-                                        for report in pm.monthlyincomereport_set.all()
-                                    ]
-                                )
-                            ).quantize(quant)
-                            for months in year_map
-                        ],
-                    },
+                    "income": self.income,
                 }
             )
         return context
@@ -3045,26 +3561,7 @@ class SuilaEboksMessage(EboksMessage):
 
     @property
     def pdf(self) -> bytes:
-        font_config = FontConfiguration()
-        writer = PdfWriter()
-        data = BytesIO()
-        css = CSS(
-            filename=os.path.join(
-                settings.BASE_DIR.parent,  # type: ignore[misc]
-                "suila",
-                "static",
-                "suila",
-                "pdf.css",
-            )
-        )
-        for html in self.html_docs({"pdf": True}):
-            pdf_data = HTML(string=html).write_pdf(
-                font_config=font_config, stylesheets=[css]
-            )
-            writer.append(BytesIO(pdf_data))
-            writer.write_stream(data)
-        data.seek(0)
-        return data.read()
+        return render_pdf(self.html_docs({"pdf": True}))
 
     def update_fields(self, force_update=False):
         month_name = self.month_names["da"][self.month - 1]
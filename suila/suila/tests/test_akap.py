@@ -5,6 +5,7 @@
 import unittest
 from datetime import date, datetime
 from decimal import Decimal
+from typing import Iterator
 from unittest.mock import MagicMock, patch
 
 from pydantic import ValidationError
@@ -18,6 +19,8 @@ from suila.integrations.akap.u1a import (
     get_akap_u1a_entries,
     get_akap_u1a_items,
     get_akap_u1a_items_unique_cprs,
+    get_all_akap_u1a_items,
+    iter_akap_u1a_items,
 )
 
 
@@ -26,7 +29,7 @@ class TestAKAPAPI(unittest.TestCase):
         self.host = "https://test.api"
         self.auth_token = "test-token"
 
-    @patch("suila.integrations.akap.u1a.requests.get")
+    @patch("suila.integrations.akap.u1a.session.get")
     def test_get_akap_u1a_entries(self, mock_get: MagicMock):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -69,7 +72,7 @@ class TestAKAPAPI(unittest.TestCase):
         self.assertIsInstance(entries[0], AKAPU1A)
         self.assertEqual(entries[0].navn, "Test Company")
 
-    @patch("suila.integrations.akap.u1a.requests.get")
+    @patch("suila.integrations.akap.u1a.session.get")
     def test_get_akap_u1a_entries_with_pagination(self, mock_get: MagicMock):
         # Mock responses for pagination
         first_response = MagicMock()
@@ -179,7 +182,7 @@ class TestAKAPAPI(unittest.TestCase):
             params={"limit": 1, "offset": 2},
         )
 
-    @patch("suila.integrations.akap.u1a.requests.get")
+    @patch("suila.integrations.akap.u1a.session.get")
     def test_get_akap_u1a_entries_invalid_response(self, mock_get: MagicMock):
         mock_response = MagicMock()
         mock_response.status_code = 400
@@ -192,7 +195,7 @@ class TestAKAPAPI(unittest.TestCase):
             "AKAP udbytte API did not respond with HTTP 200", str(context.exception)
         )
 
-    @patch("suila.integrations.akap.u1a.requests.get")
+    @patch("suila.integrations.akap.u1a.session.get")
     def test_get_akap_u1a_items_full_coverage(self, mock_get: MagicMock):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -268,7 +271,7 @@ class TestAKAPAPI(unittest.TestCase):
             params={"limit": 50, "offset": 0},
         )
 
-    @patch("suila.integrations.akap.u1a.requests.get")
+    @patch("suila.integrations.akap.u1a.session.get")
     @patch("suila.integrations.akap.u1a.logger")
     def test_get_akap_u1a_items_non_200_response(
         self, mock_logger: MagicMock, mock_get: MagicMock
@@ -291,7 +294,7 @@ class TestAKAPAPI(unittest.TestCase):
             params={"limit": 50, "offset": 0},
         )
 
-    @patch("suila.integrations.akap.u1a.requests.get")
+    @patch("suila.integrations.akap.u1a.session.get")
     def test_get_akap_u1a_items_with_pagination(self, mock_get: MagicMock):
         first_response = MagicMock()
         first_response.status_code = 200
@@ -432,7 +435,97 @@ class TestAKAPAPI(unittest.TestCase):
             params={"limit": 1, "offset": 2},
         )
 
-    @patch("suila.integrations.akap.u1a.requests.get")
+    @patch("suila.integrations.akap.u1a.session.get")
+    def test_get_all_akap_u1a_items(self, mock_get: MagicMock):
+        def _item(item_id: int) -> dict:
+            return {
+                "id": item_id,
+                "u1a": {
+                    "id": 1,
+                    "navn": "Test Company 1",
+                    "revisionsfirma": "Test Audit",
+                    "virksomhedsnavn": "Test Business",
+                    "cvr": "12345678",
+                    "email": "test1@example.com",
+                    "regnskabsår": 2023,
+                    "udbytte": "100000.00",
+                    "by": "Copenhagen",
+                    "dato": "2023-01-01",
+                    "dato_vedtagelse": "2023-01-01",
+                    "underskriftsberettiget": "Test Person",
+                    "oprettet": "2023-01-01T12:00:00",
+                    "oprettet_af_cpr": "1234567890",
+                },
+                "cpr_cvr_tin": "1234567890",
+                "navn": f"Test Name {item_id}",
+                "adresse": "Test Address",
+                "postnummer": "1000",
+                "by": "Copenhagen",
+                "land": "Denmark",
+                "udbytte": "5000.00",
+                "oprettet": "2023-01-01T12:00:00",
+            }
+
+        def _get(url, headers=None, params=None):
+            response = MagicMock()
+            response.status_code = 200
+            response.json.return_value = {
+                "count": 5,
+                "items": [
+                    _item(item_id)
+                    for item_id in range(params["offset"], params["offset"] + 2)
+                    if item_id < 5
+                ],
+            }
+            return response
+
+        mock_get.side_effect = _get
+
+        # Act
+        items = get_all_akap_u1a_items(
+            self.host, self.auth_token, year=2023, limit=2, max_workers=2
+        )
+
+        # Assert: all pages were fetched, and the items are returned in order
+        self.assertEqual([item.id for item in items], [0, 1, 2, 3, 4])
+        self.assertEqual(mock_get.call_count, 3)
+        for offset in (0, 2, 4):
+            mock_get.assert_any_call(
+                self.host + URL_U1A_ITEMS,
+                headers={"Authorization": f"Bearer {self.auth_token}"},
+                params={"limit": 2, "offset": offset, "year": 2023},
+            )
+
+        # Act: iterate over the items one page at a time
+        mock_get.reset_mock()
+        items_iter = iter_akap_u1a_items(
+            self.host, self.auth_token, year=2023, limit=2, fetch_all=True
+        )
+        # Assert: pages are fetched lazily, as the items are consumed
+        self.assertIsInstance(items_iter, Iterator)
+        self.assertEqual(mock_get.call_count, 0)
+        self.assertEqual(next(items_iter).id, 0)
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual([item.id for item in items_iter], [1, 2, 3, 4])
+        self.assertEqual(mock_get.call_count, 3)
+
+    @patch("suila.integrations.akap.u1a.session.get")
+    @patch("suila.integrations.akap.u1a.logger")
+    def test_get_all_akap_u1a_items_non_200_response(
+        self, mock_logger: MagicMock, mock_get: MagicMock
+    ):
+        mock_get.return_value.status_code = 500
+        mock_get.return_value.text = "Internal Server Error"
+
+        with self.assertRaises(Exception) as context:
+            get_all_akap_u1a_items(self.host, self.auth_token, year=2023)
+
+        mock_logger.error.assert_called_once_with("Internal Server Error")
+        self.assertIn(
+            "AKAP udbytte API did not respond with HTTP 200", str(context.exception)
+        )
+
+    @patch("suila.integrations.akap.u1a.session.get")
     def test_get_akap_u1a_items_unique_cprs(self, mock_get: MagicMock):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -446,7 +539,7 @@ class TestAKAPAPI(unittest.TestCase):
         self.assertEqual(len(unique_cprs), 1)
         self.assertEqual(unique_cprs[0], "1234567890")
 
-    @patch("suila.integrations.akap.u1a.requests.get")
+    @patch("suila.integrations.akap.u1a.session.get")
     def test_get_akap_u1a_items_unique_cprs_with_year(self, mock_get: MagicMock):
         mock_response = MagicMock()
         mock_response.status_code = 200
@@ -467,7 +560,7 @@ class TestAKAPAPI(unittest.TestCase):
         self.assertEqual(len(cprs), 1)
         self.assertEqual(cprs[0], "1234567890")
 
-    @patch("suila.integrations.akap.u1a.requests.get")
+    @patch("suila.integrations.akap.u1a.session.get")
     @patch("suila.integrations.akap.u1a.logger")
     def test_get_akap_u1a_items_unique_cprs_non_200_response(
         self, mock_logger: MagicMock, mock_get: MagicMock
@@ -490,7 +583,7 @@ class TestAKAPAPI(unittest.TestCase):
             params={"limit": 50, "offset": 0},
         )
 
-    @patch("suila.integrations.akap.u1a.requests.get")
+    @patch("suila.integrations.akap.u1a.session.get")
     def test_get_akap_u1a_items_unique_cprs_with_pagination(self, mock_get: MagicMock):
         # Mock responses for pagination
         first_response = MagicMock()
@@ -6,10 +6,14 @@ import re
 from datetime import datetime
 from decimal import Decimal
 from typing import Dict
+from unittest.mock import patch
 
+import pandas as pd
 from bs4 import BeautifulSoup
 from common.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.utils import timezone
 from ninja_extra.testing import TestClient
 
@@ -21,6 +25,7 @@ from suila.models import (
     Person,
     PersonMonth,
     PersonYear,
+    QuarantineReason,
     TaxInformationPeriod,
     Year,
 )
@@ -109,10 +114,56 @@ class ApiTestCase(TestCase):
             {
                 "count": len(items),
                 "items": list(items),
+                "next_cursor": None,
             },
             f"response: {response.json()['items']} does not match {items}",
         )
 
+    def expect_pages(self, url: str, limit: int, *items: Dict):
+        # Walk through the list using the cursor of each page
+        pages = []
+        response = self.client.get(
+            f"{url}?limit={limit}", headers=self.headers_user_accepted
+        )
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["count"], len(items))
+            pages.append(response.json()["items"])
+            cursor = response.json()["next_cursor"]
+            if cursor is None:
+                break
+            response = self.client.get(
+                f"{url}?limit={limit}&cursor={cursor}",
+                headers=self.headers_user_accepted,
+            )
+        self.assertEqual(
+            pages, [list(items[i : i + limit]) for i in range(0, len(items), limit)]
+        )
+
+    def expect_invalid_cursor(self, url: str):
+        for cursor in ("foo", "WzFd", "eyJhIjogMX0="):  # not base64, [1], {"a": 1}
+            response = self.client.get(
+                f"{url}?cursor={cursor}", headers=self.headers_user_accepted
+            )
+            self.assertEqual(response.status_code, 400)
+        # A cursor cannot be combined with an offset
+        cursor = self.client.get(
+            f"{url}?limit=1", headers=self.headers_user_accepted
+        ).json()["next_cursor"]
+        response = self.client.get(
+            f"{url}?cursor={cursor}&offset=1", headers=self.headers_user_accepted
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def expect_constant_queries(self, url: str):
+        # The number of queries does not depend on the number of items listed
+        with CaptureQueriesContext(connection) as one:
+            self.client.get(f"{url}?limit=1", headers=self.headers_user_accepted)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url, headers=self.headers_user_accepted)
+        self.assertGreater(response.json()["count"], 1)
+        self.assertEqual(len(one), len(many))
+
 
 class PersonApiTest(ApiTestCase):
 
@@ -189,6 +240,11 @@ class PersonApiTest(ApiTestCase):
         self.expect_list("/api/person?location_code=456", self.expected2)
         self.expect_list("/api/person?location_code=789")  # no items
 
+    def test_list_pages(self):
+        self.expect_pages("/api/person", 1, self.expected1, self.expected2)
+        self.expect_pages("/api/person", 2, self.expected1, self.expected2)
+        self.expect_invalid_cursor("/api/person")
+
 
 class PersonYearApiTest(ApiTestCase):
 
@@ -324,6 +380,49 @@ class PersonYearApiTest(ApiTestCase):
         self.expect_list("/api/personyear?cpr=2233445566&year=2025", self.expected2b)
         self.expect_list("/api/personyear?cpr=2233445566&year=2026")  # no items
 
+    def test_list_pages(self):
+        self.expect_pages(
+            "/api/personyear",
+            3,
+            self.expected1a,
+            self.expected1b,
+            self.expected2a,
+            self.expected2b,
+        )
+        self.expect_invalid_cursor("/api/personyear")
+
+    def test_list_queries(self):
+        self.expect_constant_queries("/api/personyear")
+
+    @override_settings(ENFORCE_QUARANTINE=True)
+    @patch("common.utils.get_people_in_quarantine")
+    def test_list_quarantine(self, get_people_in_quarantine):
+        # Arrange: the second person is in quarantine
+        get_people_in_quarantine.return_value = pd.DataFrame(
+            {
+                "in_quarantine": [False, True],
+                "quarantine_reason": [
+                    QuarantineReason.NONE,
+                    QuarantineReason.RECEIVED_TOO_MUCH,
+                ],
+            },
+            index=["1234567890", "2233445566"],
+        )
+        # Act and assert
+        self.expect_list(
+            "/api/personyear?year=2025",
+            {**self.expected1b, "quarantine_reason": "-"},
+            {
+                **self.expected2b,
+                "in_quarantine": True,
+                "quarantine_reason": "Du modtog for meget tilskud i 2024",
+            },
+        )
+        # Assert: quarantine is computed once for the page, not once per item
+        get_people_in_quarantine.assert_called_once_with(
+            2025, ["1234567890", "2233445566"]
+        )
+
 
 class PersonMonthApiTest(ApiTestCase):
 
@@ -576,6 +675,20 @@ class PersonMonthApiTest(ApiTestCase):
             "/api/personmonth?cpr=2233445566&year=2025&month=1"
         )  # no items
 
+    def test_list_pages(self):
+        self.expect_pages(
+            "/api/personmonth",
+            2,
+            self.expected1a,
+            self.expected1b,
+            self.expected1c,
+            self.expected2a,
+        )
+        self.expect_invalid_cursor("/api/personmonth")
+
+    def test_list_queries(self):
+        self.expect_constant_queries("/api/personmonth")
+
 
 class ApiDocTest(TestCase):
 
@@ -13,12 +13,8 @@ from django.conf import settings
 from django.test import override_settings
 from more_itertools import one
 
-from suila.benefit import (
-    calculate_benefit,
-    get_calculation_date,
-    get_payout_date,
-    get_payout_df,
-)
+from suila.benefit import calculate_benefit, get_payout_df
+from suila.dates import get_calculation_date, get_payout_date
 from suila.exceptions import CalculationMethodNotSet
 from suila.models import PersonMonth, PersonYear, PrismeBatch, PrismeBatchItem
 
@@ -1,12 +1,20 @@
 # SPDX-FileCopyrightText: 2024 Magenta ApS <info@magenta.dk>
 #
 # SPDX-License-Identifier: MPL-2.0
-from datetime import date
+from datetime import date, timedelta
 from decimal import Decimal
 
-from django.test import TestCase
+import holidays
+from django.test import SimpleTestCase, TestCase
 
-from suila.dates import get_last_working_day, get_pause_effect_date, get_payment_date
+from suila.dates import (
+    add_working_days,
+    get_last_working_day,
+    get_pause_effect_date,
+    get_payment_date,
+    get_working_days,
+    is_working_day,
+)
 from suila.models import (
     Person,
     PersonMonth,
@@ -136,3 +144,37 @@ class TestPauseEffectDate(TestCase):
         self.assertEqual(get_last_working_day(2025, 10), date(2025, 10, 31))
         self.assertEqual(get_last_working_day(2025, 11), date(2025, 11, 28))
         self.assertEqual(get_last_working_day(2025, 12), date(2025, 12, 31))
+
+
+class TestWorkingDays(SimpleTestCase):
+    def test_get_working_days(self):
+        working_days = get_working_days(2025)
+        self.assertEqual(list(working_days), sorted(working_days))
+        self.assertNotIn(date(2025, 1, 1), working_days)  # New Year's Day
+        self.assertNotIn(date(2025, 1, 4), working_days)  # Saturday
+        self.assertIn(date(2025, 1, 2), working_days)
+        # The calendar is only built once per year
+        self.assertIs(get_working_days(2025), working_days)
+
+    def test_is_working_day(self):
+        self.assertTrue(is_working_day(date(2025, 10, 3)))
+        self.assertFalse(is_working_day(date(2025, 10, 4)))
+        self.assertFalse(is_working_day(date(2025, 12, 24)))
+
+    def test_add_working_days_across_years(self):
+        # 2026-01-01 is New Year's Day
+        self.assertEqual(add_working_days(date(2025, 12, 31), 1), date(2026, 1, 2))
+        self.assertEqual(add_working_days(date(2026, 1, 2), -1), date(2025, 12, 31))
+        self.assertEqual(add_working_days(date(2025, 10, 3), 0), date(2025, 10, 3))
+
+    def test_add_working_days_matches_holidays(self):
+        holiday_calendar = holidays.GL()  # type: ignore
+        day = date(2025, 12, 1)
+        while day < date(2026, 2, 1):
+            for n in (-3, -1, 1, 2, 5):
+                with self.subTest(day=day, n=n):
+                    self.assertEqual(
+                        add_working_days(day, n),
+                        holiday_calendar.get_nth_working_day(day, n),
+                    )
+            day += timedelta(days=1)
@@ -186,6 +186,60 @@ class TestJobDispatcher(TestCase):
             )
         )
 
+    def test_job_ran_day(self):
+        self.assertTrue(
+            self.job_dispatcher.job_ran_day(
+                ManagementCommands.CALCULATE_STABILITY_SCORE, 2025, 2, 1
+            )
+        )
+        self.assertFalse(
+            self.job_dispatcher.job_ran_day(
+                ManagementCommands.CALCULATE_STABILITY_SCORE, 2025, 2, 2
+            )
+        )
+        self.assertFalse(
+            self.job_dispatcher.job_ran_day(
+                ManagementCommands.CALCULATE_STABILITY_SCORE,
+                2025,
+                1,
+                1,
+                job_params={"cpr_param": "333"},  # Only has a failed job
+            )
+        )
+
+    def test_job_log_snapshot(self):
+        job_dispatcher = JobDispatcher(year=2025, month=1, day=1)
+
+        # The succeeded JobLogs for a year are loaded once, and then reused
+        with self.assertNumQueries(1):
+            for month in range(1, 13):
+                job_dispatcher.job_ran_month(
+                    ManagementCommands.CALCULATE_STABILITY_SCORE, 2025, month
+                )
+            job_dispatcher.job_ran_year(ManagementCommands.LOAD_ESKAT, 2025)
+        self.assertFalse(
+            job_dispatcher.job_ran_year(ManagementCommands.LOAD_ESKAT, 2025)
+        )
+
+        # Calling a job clears the snapshot, so JobLogs created by the job are seen
+        def call_command(*args, **kwargs):
+            job_log = JobLog.objects.create(
+                name=ManagementCommands.LOAD_ESKAT, status=StatusChoices.SUCCEEDED
+            )
+            job_log.runtime = datetime.datetime(2025, 1, 1)
+            job_log.save()
+
+        with mock.patch("suila.dispatch.management") as management_mock:
+            management_mock.call_command.side_effect = call_command
+            job_dispatcher.allow_job = MagicMock(return_value=True)
+            job_dispatcher.check_dependencies = MagicMock()
+            job_dispatcher.call_job(
+                ManagementCommands.LOAD_ESKAT, 2025, "monthlyincome"
+            )
+        self.assertTrue(
+            job_dispatcher.job_ran_year(ManagementCommands.LOAD_ESKAT, 2025)
+        )
+
     def test_allow_job_invalid_job_name(self):
         self.assertFalse(self.job_dispatcher.allow_job("something-darkside"))
 
@@ -1,37 +1,53 @@
 # SPDX-FileCopyrightText: 2024 Magenta ApS <info@magenta.dk>
 #
 # SPDX-License-Identifier: MPL-2.0
+import hashlib
 import json
+import logging
 import os
 import os.path
 import re
+import threading
 import time
 from concurrent.futures import Future
 from datetime import date, datetime, timedelta
 from decimal import Decimal
-from io import StringIO
-from unittest.mock import MagicMock, patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import ANY, MagicMock, patch
+from uuid import uuid4
 
 import pandas as pd
 import requests
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.files.temp import NamedTemporaryFile
 from django.core.management import call_command as core_call_command
 from django.db import connections
 from django.test import TestCase, TransactionTestCase, override_settings
 from django.utils import timezone
+from pypdf import PdfReader, PdfWriter
 from requests import Response
 from requests.exceptions import ConnectionError
+from weasyprint import CSS, HTML
+from weasyprint.text.fonts import FontConfiguration
 
 from suila.integrations.eboks.client import (
     EboksClient,
     MessageCollisionException,
     MessageFailureException,
 )
+from suila.integrations.eboks.dispatch_queue import DispatchQueue
+from suila.integrations.eboks.envelope import DispatchEnvelope
 from suila.models import (
     AnnualIncome,
+    BTaxPayment,
     EboksMessage,
+    JobLog,
     ManagementCommands,
+    MonthlyIncomeReport,
     Person,
     PersonMonth,
     PersonYear,
@@ -39,8 +55,13 @@ from suila.models import (
     SuilaEboksMessage,
     TaxInformationPeriod,
     Year,
+    get_pdf_resources,
+    pdf_reference_count,
+    render_pdf,
 )
 
+logger = logging.getLogger(__name__)
+
 
 class EboksTest(TestCase):
 
@@ -68,6 +89,21 @@ class EboksTest(TestCase):
             **kwargs,
         }
 
+    def assertDispatched(self, mock_request: MagicMock, message: EboksMessage):
+        mock_request.assert_called_with(
+            "PUT",
+            f"https://eboxtest.nanoq.gl/int/rest/srv.svc/3/"
+            f"dispatchsystem/3994/dispatches/{message.message_id}",
+            None,
+            ANY,
+            timeout=60,
+        )
+        # The request body is the XML envelope, streamed from the stored PDF
+        envelope = mock_request.call_args.args[3]
+        self.assertIsInstance(envelope, DispatchEnvelope)
+        self.assertEqual(bytes(envelope), message.xml)
+        self.assertEqual(len(envelope), len(message.xml))
+
     @staticmethod
     def mock_request(recipient_status, post_processing_status, fails=0, status=200):
         mock = MagicMock()
@@ -118,14 +154,7 @@ class SendTest(EboksTest):
         message.set_pdf_data(pdf_data=self.data)
         with EboksClient.from_settings() as client:
             message.send(client)
-        mock_request.assert_called_with(
-            "PUT",
-            f"https://eboxtest.nanoq.gl/int/rest/srv.svc/3/"
-            f"dispatchsystem/3994/dispatches/{message.message_id}",
-            None,
-            message.xml,
-            timeout=60,
-        )
+        self.assertDispatched(mock_request, message)
         self.assertEqual(message.status, "sent")
         self.assertEqual(message.recipient_status, "")
         self.assertIsNotNone(message.pk)
@@ -134,14 +163,7 @@ class SendTest(EboksTest):
     def test_send_success(self, mock_request):
         mock_request.side_effect = self.mock_request("", "")
         message = EboksMessage.dispatch("12345678", "EboksTest", 179343, self.data)
-        mock_request.assert_called_with(
-            "PUT",
-            f"https://eboxtest.nanoq.gl/int/rest/srv.svc/3/"
-            f"dispatchsystem/3994/dispatches/{message.message_id}",
-            None,
-            message.xml,
-            timeout=60,
-        )
+        self.assertDispatched(mock_request, message)
         self.assertEqual(message.status, "sent")
         self.assertEqual(message.recipient_status, "")
         self.assertIsNotNone(message.pk)
@@ -150,14 +172,7 @@ class SendTest(EboksTest):
     def test_send_postprocessing(self, mock_request):
         mock_request.side_effect = self.mock_request("exempt", "pending")
         message = EboksMessage.dispatch("12345678", "EboksTest", 179343, self.data)
-        mock_request.assert_called_with(
-            "PUT",
-            f"https://eboxtest.nanoq.gl/int/rest/srv.svc/3/"
-            f"dispatchsystem/3994/dispatches/{message.message_id}",
-            None,
-            message.xml,
-            timeout=60,
-        )
+        self.assertDispatched(mock_request, message)
         self.assertEqual(message.status, "post_processing")
         self.assertEqual(message.recipient_status, "exempt")
         self.assertIsNotNone(message.pk)
@@ -202,14 +217,7 @@ class SendTest(EboksTest):
                 message = EboksMessage.dispatch(
                     "12345678", "EboksTest", 179343, self.data
                 )
-                mock_request.assert_called_with(
-                    "PUT",
-                    f"https://eboxtest.nanoq.gl/int/rest/srv.svc/3/"
-                    f"dispatchsystem/3994/dispatches/{message.message_id}",
-                    None,
-                    message.xml,
-                    timeout=60,
-                )
+                self.assertDispatched(mock_request, message)
                 mock_sleep.assert_called_with(10)
                 self.assertEqual(len(mock_sleep.mock_calls), blockings)
                 self.assertEqual(message.status, "post_processing")
@@ -227,14 +235,7 @@ class SendTest(EboksTest):
             message.set_pdf_data(self.data)
             with self.assertRaises(MessageFailureException):
                 message.send()
-            mock_request.assert_called_with(
-                "PUT",
-                f"https://eboxtest.nanoq.gl/int/rest/srv.svc/3/"
-                f"dispatchsystem/3994/dispatches/{message.message_id}",
-                None,
-                message.xml,
-                timeout=60,
-            )
+            self.assertDispatched(mock_request, message)
             mock_sleep.assert_called_with(10)
             self.assertEqual(len(mock_sleep.mock_calls), 5)
             self.assertEqual(message.status, "failed")
@@ -253,14 +254,7 @@ class SendTest(EboksTest):
                 message = EboksMessage.dispatch(
                     "12345678", "EboksTest", 179343, self.data
                 )
-                mock_request.assert_called_with(
-                    "PUT",
-                    f"https://eboxtest.nanoq.gl/int/rest/srv.svc/3/"
-                    f"dispatchsystem/3994/dispatches/{message.message_id}",
-                    None,
-                    message.xml,
-                    timeout=60,
-                )
+                self.assertDispatched(mock_request, message)
                 mock_sleep.assert_called_with(10)
                 self.assertEqual(len(mock_sleep.mock_calls), 5)
                 self.assertEqual(message.status, "post_processing")
@@ -299,6 +293,90 @@ class EboksXmlTest(EboksTest):
         ):
             EboksMessage.generate_xml("123456789", "EboksTest", 179343, self.data)
 
+    def test_envelope(self):
+        message = EboksMessage(
+            cpr_cvr="1234567890", title="Årsopgørelse & <test>", content_type=179343
+        )
+        message.set_pdf_data(self.data)
+        # Use a small chunk size, so the PDF is encoded in many chunks
+        with patch.object(DispatchEnvelope, "chunk_size", 3 * 100):
+            chunks = list(message.envelope)
+        self.assertGreater(len(chunks), 3)
+        self.assertEqual(b"".join(chunks), message.xml)
+        self.assertEqual(len(message.envelope), len(message.xml))
+
+    def test_envelope_invalid(self):
+        pdf = ContentFile(self.data)
+        with self.assertRaises(ValueError, msg="cpr/cvr must be all digits"):
+            DispatchEnvelope("1234567A", "EboksTest", 179343, pdf)
+        with self.assertRaises(
+            ValueError, msg="unknown recipient type for: {123456789}"
+        ):
+            DispatchEnvelope("123456789", "EboksTest", 179343, pdf)
+
+
+class PdfStorageTest(EboksTest):
+    def unique_pdf_data(self) -> bytes:
+        # Append a unique trailer, so the stored file is not shared with other tests
+        return self.data + f"%{uuid4()}\n".encode("ascii")
+
+    def create_message(self, pdf_data: bytes) -> EboksMessage:
+        message = EboksMessage(
+            cpr_cvr="1234567890", title="EboksTest", content_type=179343
+        )
+        message.set_pdf_data(pdf_data)
+        message.save()
+        return message
+
+    def test_identical_pdfs_are_stored_once(self):
+        pdf_data = self.unique_pdf_data()
+        message1 = self.create_message(pdf_data)
+        message2 = self.create_message(pdf_data)
+        self.assertEqual(message1.contents.name, message2.contents.name)
+        self.assertEqual(
+            message1.contents.name,
+            f"{settings.LOCAL_EBOKS_PDF_STORAGE}/"
+            f"{hashlib.sha256(pdf_data).hexdigest()}.pdf",
+        )
+        self.assertEqual(message2.contents.read(), pdf_data)
+        self.assertEqual(pdf_reference_count(message1.contents.name), 2)
+
+    def test_pdf_is_deleted_with_last_reference(self):
+        pdf_data = self.unique_pdf_data()
+        message1 = self.create_message(pdf_data)
+        message2 = self.create_message(pdf_data)
+        name = message1.contents.name
+        with self.captureOnCommitCallbacks(execute=True):
+            message1.delete()
+        self.assertTrue(default_storage.exists(name))
+        with self.captureOnCommitCallbacks(execute=True):
+            message2.delete()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_pdf_deleted_before_commit_is_stored_again(self):
+        pdf_data = self.unique_pdf_data()
+        self.create_message(pdf_data)
+        message = EboksMessage(
+            cpr_cvr="1234567890", title="EboksTest", content_type=179343
+        )
+        message.set_pdf_data(pdf_data)
+        # The last reference to the file is released in another transaction, before
+        # this message is committed.
+        default_storage.delete(message.contents.name)
+        with self.captureOnCommitCallbacks(execute=True):
+            message.save()
+        self.assertEqual(message.contents.read(), pdf_data)
+
+    def test_replaced_pdf_is_released(self):
+        message = self.create_message(self.unique_pdf_data())
+        name = message.contents.name
+        with self.captureOnCommitCallbacks(execute=True):
+            message.set_pdf_data(self.unique_pdf_data())
+            message.save()
+        self.assertNotEqual(message.contents.name, name)
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(message.contents.name))
+
 
 @override_settings(EBOKS=EboksTest.test_settings())
 class FinalStatusTest(EboksTest):
@@ -419,6 +497,86 @@ class FinalStatusTest(EboksTest):
         self.assertEqual(message.post_processing_status, "remote printed")
         self.assertFalse(message.is_postprocessing)
 
+    @patch.object(requests.sessions.Session, "request")
+    def test_update_final_statuses_in_batches(self, mock_request):
+        # Arrange: five messages awaiting post-processing, of which the first
+        # three are done
+        post_statuses = {
+            f"message{i}": status
+            for i, status in enumerate(
+                ["remote printed", "address resolved", "remote printed"]
+                + ["pending"] * 2
+            )
+        }
+        for message_id in post_statuses:
+            message = EboksMessage(
+                cpr_cvr="12345678",
+                title="EboksTest",
+                content_type=179343,
+                message_id=message_id,
+                status="post_processing",
+                post_processing_status="pending",
+                is_postprocessing=True,
+            )
+            message.set_pdf_data(self.data)
+            message.save()
+
+        def side_effect(method, url, params, data, **kwargs):
+            return self.mock_response(
+                200,
+                json.dumps(
+                    [
+                        {
+                            "message_id": message_id,
+                            "recipients": [
+                                {"post_processing_status": post_statuses[message_id]}
+                            ],
+                        }
+                        for message_id in params["message_id"]
+                    ]
+                ).encode("utf-8"),
+            )
+
+        mock_request.side_effect = side_effect
+        # Act
+        with EboksClient.from_settings() as client:
+            counts = EboksMessage.update_final_statuses(client, batch_size=2, workers=2)
+        # Assert: the statuses are looked up two message IDs at a time
+        self.assertEqual(mock_request.call_count, 3)
+        for call in mock_request.call_args_list:
+            self.assertLessEqual(len(call.args[2]["message_id"]), 2)
+        self.assertEqual(
+            counts, {"remote printed": 2, "address resolved": 1, "pending": 2}
+        )
+        for message in EboksMessage.objects.all():
+            expected_status = post_statuses[message.message_id]
+            self.assertEqual(message.post_processing_status, expected_status)
+            self.assertEqual(message.is_postprocessing, expected_status == "pending")
+            self.assertEqual(
+                message.status,
+                "post_processing" if expected_status == "pending" else "sent",
+            )
+
+    @patch.object(requests.sessions.Session, "request")
+    def test_update_final_statuses_reports_counts(self, mock_request):
+        message = EboksMessage(
+            cpr_cvr="12345678",
+            title="EboksTest",
+            content_type=179343,
+            message_id="abcdefgh",
+            status="post_processing",
+            post_processing_status="pending",
+            is_postprocessing=True,
+        )
+        message.set_pdf_data(self.data)
+        message.save()
+        mock_request.side_effect = self.mock_request(
+            message.message_id, "remote printed"
+        )
+        stdout = StringIO()
+        core_call_command("eboks_update_status", stdout=stdout)
+        self.assertIn("remote printed: 1", stdout.getvalue())
+
 
 @override_settings(EBOKS=EboksTest.test_settings())
 class ClientInfoTest(EboksTest):
@@ -489,6 +647,228 @@ class ClientTest(EboksTest):
             self.assertEqual(client.session.verify, "/server.crt")
 
 
+class StubEboksHandler(BaseHTTPRequestHandler):
+    """Answers e-Boks dispatch requests with the HTTP statuses queued for each
+    message title in `server.statuses`, and 200 OK once they are used up. A status
+    of None closes the connection without answering."""
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        title = re.search(rb"<Title>(.*)</Title>", body).group(1).decode("utf-8")
+        message_id = self.path.rstrip("/").split("/")[-1]
+        with self.server.lock:
+            self.server.requests.append(title)
+            statuses = self.server.statuses.get(title) or [200]
+            status = statuses.pop(0)
+        if status is None:
+            self.close_connection = True
+            return
+        content = b""
+        if status == 200:
+            content = json.dumps(
+                {
+                    "message_id": message_id,
+                    "recipients": [{"status": "", "post_processing_status": ""}],
+                }
+            ).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DispatchQueueTest(EboksTest):
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubEboksHandler)
+        self.server.lock = threading.Lock()
+        self.server.statuses = {}
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        host, port = self.server.server_address
+        settings_override = self.settings(
+            EBOKS=self.test_settings(host=f"http://{host}:{port}")
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = EboksClient.from_settings()
+        self.addCleanup(self.client.close)
+
+    def create_message(self, title: str, *statuses: int | None) -> EboksMessage:
+        self.server.statuses[title] = list(statuses)
+        message = EboksMessage(cpr_cvr="1234567890", title=title, content_type=179343)
+        message.set_pdf_data(self.data)
+        message.save()
+        return message
+
+    def get_queue(self, **kwargs) -> DispatchQueue:
+        queue = DispatchQueue(self.client, workers=2, backoff=0, **kwargs)
+        self.addCleanup(queue.executor.shutdown)
+        return queue
+
+    def test_send(self):
+        # Arrange
+        messages = [self.create_message(f"Test {i}") for i in range(5)]
+        sent = []
+        queue = self.get_queue(on_sent=sent.append)
+        # Act
+        for message in messages:
+            queue.put(message)
+        queue.drain()
+        # Assert
+        self.assertCountEqual(sent, messages)
+        for message in messages:
+            message.refresh_from_db()
+            self.assertEqual(message.status, "sent")
+            self.assertEqual(message.attempts, 1)
+            self.assertIsNone(message.next_attempt_at)
+            self.assertIsNotNone(message.sent)
+        self.assertEqual(queue.counts["sent"], 5)
+        self.assertRegex(
+            queue.progress,
+            r"^5 letters sent, 0 failed, 0 awaiting retry \([0-9.]+ letters/min\)$",
+        )
+
+    def test_retry(self):
+        # Arrange: the first two attempts fail
+        message = self.create_message("Retry", 500, 503)
+        queue = self.get_queue()
+        # Act
+        queue.put(message)
+        queue.drain()
+        # Assert
+        message.refresh_from_db()
+        self.assertEqual(message.status, "sent")
+        self.assertEqual(message.attempts, 3)
+        self.assertEqual(queue.counts["retried"], 2)
+        self.assertEqual(self.server.requests, ["Retry"] * 3)
+
+    def test_retry_does_not_block_other_messages(self):
+        # Arrange
+        failing = self.create_message("Failing", 500)
+        succeeding = self.create_message("Succeeding")
+        queue = DispatchQueue(self.client, workers=2, backoff=3600)
+        self.addCleanup(queue.executor.shutdown)
+        # Act: send both messages, without waiting for the retry
+        queue.put(failing)
+        queue.put(succeeding)
+        while queue.in_flight:
+            queue._wait(None)
+            queue.poll()
+        # Assert: the failed message is scheduled for a later attempt, while the
+        # other message has been sent in the meantime.
+        succeeding.refresh_from_db()
+        self.assertEqual(succeeding.status, "sent")
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, "queued")
+        self.assertEqual(failing.attempts, 1)
+        self.assertGreater(
+            failing.next_attempt_at, timezone.now() + timedelta(minutes=59)
+        )
+        self.assertEqual([message for _, _, message in queue.scheduled], [failing])
+
+    def test_collision(self):
+        message = self.create_message("Collision", 419)
+        queue = self.get_queue()
+        queue.put(message)
+        queue.drain()
+        message.refresh_from_db()
+        self.assertEqual(message.status, "failed")
+        self.assertEqual(message.failure_reason, "collision")
+        self.assertEqual(message.attempts, 1)
+
+    def test_rejected(self):
+        message = self.create_message("Rejected", 400)
+        queue = self.get_queue()
+        queue.put(message)
+        queue.drain()
+        message.refresh_from_db()
+        self.assertEqual(message.status, "failed")
+        self.assertEqual(message.failure_reason, "rejected")
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(queue.counts["failed"], 1)
+
+    def test_retries_exhausted(self):
+        message = self.create_message("Unavailable", 500, 500, 500, 500)
+        queue = self.get_queue(max_attempts=3)
+        queue.put(message)
+        queue.drain()
+        message.refresh_from_db()
+        self.assertEqual(message.status, "failed")
+        self.assertEqual(message.failure_reason, "unavailable")
+        self.assertEqual(message.attempts, 3)
+        self.assertEqual(self.server.requests, ["Unavailable"] * 3)
+
+    def test_dropped_connection_is_retried(self):
+        # Arrange: the server closes the connection on the first attempt
+        message = self.create_message("Dropped", None)
+        queue = self.get_queue()
+        # Act
+        queue.put(message)
+        queue.drain()
+        # Assert
+        message.refresh_from_db()
+        self.assertEqual(message.status, "sent")
+        self.assertEqual(message.attempts, 2)
+        self.assertEqual(queue.counts["retried"], 1)
+        self.assertEqual(self.server.requests, ["Dropped"] * 2)
+
+    def test_unexpected_error_is_a_failure(self):
+        # Arrange: e-Boks accepts the message, but the response is not JSON
+        message = self.create_message("Unexpected")
+        succeeding = self.create_message("Succeeding")
+        queue = self.get_queue()
+        # Act
+        with patch.object(
+            EboksMessage,
+            "set_dispatched",
+            autospec=True,
+            side_effect=lambda self, response_json: (
+                json.loads("") if self.title == "Unexpected" else None
+            ),
+        ):
+            queue.put(message)
+            queue.put(succeeding)
+            queue.drain()
+        # Assert: the failure is recorded, and the queue carries on
+        message.refresh_from_db()
+        self.assertEqual(message.status, "failed")
+        self.assertEqual(message.failure_reason, "error")
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(queue.counts["failed"], 1)
+        self.assertEqual(queue.counts["sent"], 1)
+
+    def test_load(self):
+        # Arrange: a message left in the queue by an interrupted run
+        message = self.create_message("Queued")
+        message.status = "queued"
+        message.next_attempt_at = timezone.now()
+        message.save()
+        self.create_message("Not queued")
+        queue = self.get_queue()
+        # Act
+        self.assertEqual(queue.load(), 1)
+        queue.drain()
+        # Assert
+        message.refresh_from_db()
+        self.assertEqual(message.status, "sent")
+        self.assertEqual(self.server.requests, ["Queued"])
+
+    def test_progress_is_reported(self):
+        progress = []
+        queue = self.get_queue(on_progress=progress.append, report_interval=0)
+        queue.put(self.create_message("Test"))
+        queue.drain()
+        self.assertRegex(progress[-1], r"^1 letters sent, 0 failed")
+
+
 @override_settings(EBOKS=EboksTest.test_settings())
 class SuilaMessageTest(EboksTest):
 
@@ -533,6 +913,128 @@ class SuilaMessageTest(EboksTest):
     def test_pdf(self):
         self.assertTrue(len(self.message1.pdf) > 0)
 
+    def test_get_income(self):
+        # Arrange
+        for person_month, salary_income, catchsale_income, u_income in (
+            (self.person_months[0], 1000, 200, 50),
+            (self.person_months[1], 2000, 0, 0),
+        ):
+            MonthlyIncomeReport.objects.create(
+                person_month=person_month,
+                salary_income=Decimal(salary_income),
+                catchsale_income=Decimal(catchsale_income),
+                u_income=Decimal(u_income),
+            )
+        for serial_number, (person_month, amount_paid) in enumerate(
+            ((self.person_months[0], 300), (self.person_months[2], 100))
+        ):
+            BTaxPayment.objects.create(
+                person_month=person_month,
+                amount_paid=Decimal(amount_paid),
+                amount_charged=Decimal(amount_paid),
+                date_charged=date(2020, 1, 1),
+                rate_number=1,
+                filename="",
+                serial_number=serial_number,
+            )
+        messages = list(
+            SuilaEboksMessage.objects.filter(
+                pk__in=[self.message1.pk, self.message2.pk]
+            )
+        )
+        # Act: fetch the income of both messages using a fixed number of queries
+        # (two for the person months and person years, and four aggregations.)
+        with self.assertNumQueries(6):
+            SuilaEboksMessage.prefetch_context(messages)
+        # Assert: the sums are for the month, followed by the sums for the current
+        # year and the two previous years.
+        expected = {
+            "catchsale_income": [Decimal("200.00"), Decimal("200.00")]
+            + [Decimal("0.00")] * 2,
+            "salary_income": [Decimal("1000.00"), Decimal("3000.00")]
+            + [Decimal("0.00")] * 2,
+            "capital_income": [Decimal("50.00"), Decimal("50.00")]
+            + [Decimal("0.00")] * 2,
+            "btax_paid": [Decimal("300.00"), Decimal("400.00")] + [Decimal("0.00")] * 2,
+        }
+        for message in messages:
+            with self.assertNumQueries(0):
+                self.assertEqual(message.income, expected)
+        # Assert: the same sums are used when not prefetched
+        message = SuilaEboksMessage.objects.get(pk=self.message1.pk)
+        self.assertEqual(message.income, expected)
+        self.assertEqual(message.context["income"], expected)
+
+    def test_pdf_contains_all_documents(self):
+        html_docs = self.message1.html_docs({"pdf": True})
+        expected_pages = sum(
+            len(PdfReader(BytesIO(HTML(string=html).write_pdf())).pages)
+            for html in html_docs
+        )
+        pdf = PdfReader(BytesIO(self.message1.pdf))
+        self.assertEqual(len(pdf.pages), expected_pages)
+
+    def test_pdf_resources_are_reused(self):
+        self.assertEqual(get_pdf_resources(), get_pdf_resources())
+
+    def test_pdf_images_are_cached(self):
+        _, _, cache = get_pdf_resources()
+        cache.clear()
+        self.message1.pdf
+        # The images shared by all letters are kept in the resource cache
+        cached_keys = list(cache)
+        self.assertTrue(any("afsender.png" in str(key) for key in cached_keys))
+        # ... and reused when rendering the next letter
+        self.message2.pdf
+        self.assertEqual(cached_keys, list(cache)[: len(cached_keys)])
+
+    @skipUnless(os.environ.get("SUILA_BENCHMARK"), "set SUILA_BENCHMARK to run")
+    def test_pdf_benchmark(self):
+        # Compare the time spent rendering a letter using the previous approach
+        # (parsing the stylesheet for each letter, and serializing the merged PDF
+        # once per document) with the current one.
+        count = 5
+        html_docs = self.message1.html_docs({"pdf": True})
+        start = time.perf_counter()
+        for _ in range(count):
+            old_pdf = self._render_pdf_per_document(html_docs)
+        old_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(count):
+            new_pdf = render_pdf(html_docs)
+        new_elapsed = time.perf_counter() - start
+        logger.info(
+            "PDF rendering of %d-language letter: old %.0f ms/letter, "
+            "new %.0f ms/letter",
+            len(html_docs),
+            1000 * old_elapsed / count,
+            1000 * new_elapsed / count,
+        )
+        # Assert that both approaches produce the same pages
+        self.assertEqual(
+            len(PdfReader(BytesIO(old_pdf)).pages),
+            len(PdfReader(BytesIO(new_pdf)).pages),
+        )
+
+    @staticmethod
+    def _render_pdf_per_document(html_docs: list[str]) -> bytes:
+        font_config = FontConfiguration()
+        writer = PdfWriter()
+        data = BytesIO()
+        css = CSS(
+            filename=os.path.join(
+                settings.BASE_DIR.parent, "suila", "static", "suila", "pdf.css"
+            )
+        )
+        for html in html_docs:
+            pdf_data = HTML(string=html).write_pdf(
+                font_config=font_config, stylesheets=[css]
+            )
+            writer.append(BytesIO(pdf_data))
+            writer.write_stream(data)
+        data.seek(0)
+        return data.read()
+
     @patch.object(requests.sessions.Session, "request")
     def test_send(self, mock_request):
         mock_request.side_effect = self.mock_request("", "")
@@ -541,14 +1043,7 @@ class SuilaMessageTest(EboksTest):
             self.message1.send(client)
         self.assertIsNotNone(self.message1.sent)
 
-        mock_request.assert_called_with(
-            "PUT",
-            f"https://eboxtest.nanoq.gl/int/rest/srv.svc/3/"
-            f"dispatchsystem/3994/dispatches/{self.message1.message_id}",
-            None,
-            self.message1.xml,
-            timeout=60,
-        )
+        self.assertDispatched(mock_request, self.message1)
         self.assertEqual(self.message1.status, "sent")
         self.assertEqual(self.message1.recipient_status, "")
         self.assertIsNotNone(self.message1.pk)
@@ -579,8 +1074,7 @@ class EboksManagementCommandTestMixin:
     def setUpMocks(self):
         self.quarantine_patcher = patch("common.utils.get_people_in_quarantine")
         self.monthly_submit_patcher = patch(
-            "suila.management.commands.send_monthly_eboks_message"
-            ".ThreadPoolExecutor.submit"
+            "suila.integrations.eboks.dispatch_queue.ThreadPoolExecutor.submit"
         )
         self.monthly_eboks_client_patcher = patch(
             "suila.management.commands.send_monthly_eboks_message.EboksClient"
@@ -759,6 +1253,16 @@ class ManagementCommandTest(TransactionTestCase, EboksManagementCommandTestMixin
         self.call_monthly_command(send=True)
         self.client_mock.send_message.assert_called()
 
+    def test_progress_is_reported_in_job_log(self):
+        self.call_monthly_command(send=True, render_workers=1, send_workers=1)
+        job_log = JobLog.objects.get(name=ManagementCommands.SEND_MONTHLY_EBOKS)
+        self.assertRegex(
+            job_log.output,
+            r"^1 person years processed, 1 letters rendered \([0-9.]+ letters/s\), "
+            r"1 letters sent, 0 failed, 0 awaiting retry \([0-9.]+ letters/min\)$",
+        )
+        self.assertIn(job_log.output, self.stdout.getvalue())
+
     def test_save_arg_monthly(self):
         self.call_monthly_command(send=False)
         self.assertNotIn("0101011111.pdf", os.listdir("/tmp"))
@@ -368,6 +368,10 @@ class TestAnnualIncome(BaseTestCase):
         self.assertEqual(Person.objects.first().cpr, "0000001234")
         self.assertEqual(PersonYear.objects.first().load.source, "test")
         self.assertEqual(AnnualIncomeModel.objects.first().load.source, "test")
+        # The loaded income is summarized
+        self.assertEqual(
+            AnnualIncomeModel.objects.first().summarized_a_income, Decimal("1234.56")
+        )
 
     def test_monthly_income_load_no_items(self):
         objects_before = len(AnnualIncomeModel.objects.all())
@@ -495,6 +499,79 @@ class TestAnnualIncome(BaseTestCase):
         income.update_amounts()
         self.assertEqual(income.summarized_u_income, Decimal("2500.00"))
 
+    def test_update_amounts_bulk(self):
+        person = Person.objects.create(cpr="4325264923")
+        incomes = []
+        for year in (2024, 2025, 2026):
+            person_year = PersonYear.objects.create(
+                person=person, year=Year.objects.create(year=year)
+            )
+            MonthlyIncomeReport.objects.create(
+                month=1,
+                year=year,
+                person_month=PersonMonth.objects.create(
+                    person_year=person_year, month=1, import_date=date.today()
+                ),
+                u_income=Decimal(1000),
+            )
+            MonthlyIncomeReport.objects.create(
+                month=2,
+                year=year,
+                person_month=PersonMonth.objects.create(
+                    person_year=person_year, month=2, import_date=date.today()
+                ),
+                u_income=Decimal(-500),
+            )
+            incomes.append(
+                AnnualIncomeModel.objects.create(
+                    person_year=person_year,
+                    salary=100000,
+                    foreign_pension_income=10000,
+                    subsidy_foreign_pension_income=1000,
+                    other_a_income=100,
+                    care_fee_income=10,
+                    occupational_benefit=1,
+                    deposit_interest_income=Decimal("0.5"),
+                    other_b_income=Decimal("0.01"),
+                )
+            )
+        # An income without any amounts or U income
+        incomes.append(
+            AnnualIncomeModel.objects.create(
+                person_year=PersonYear.objects.create(
+                    person=Person.objects.create(cpr="1234567890"),
+                    year=Year.objects.get(year=2025),
+                )
+            )
+        )
+
+        with self.assertNumQueries(1):
+            updated = AnnualIncomeModel.update_amounts_bulk(
+                AnnualIncomeModel.objects.all()
+            )
+        self.assertEqual(updated, 4)
+        # The amounts are identical to the ones computed one by one
+        for income in incomes:
+            income.update_amounts()
+            income_bulk = AnnualIncomeModel.objects.get(pk=income.pk)
+            self.assertEqual(
+                (
+                    income_bulk.summarized_a_income,
+                    income_bulk.summarized_b_income,
+                    income_bulk.summarized_u_income,
+                ),
+                (
+                    income.summarized_a_income,
+                    income.summarized_b_income,
+                    income.summarized_u_income,
+                ),
+            )
+        self.assertEqual(incomes[0].summarized_a_income, Decimal("111101.00"))
+        self.assertEqual(incomes[0].summarized_b_income, Decimal("10.51"))
+        self.assertEqual(incomes[2].summarized_a_income, Decimal("111110.00"))
+        self.assertEqual(incomes[2].summarized_u_income, Decimal("1000.00"))
+        self.assertEqual(incomes[3].summarized_a_income, Decimal("0.00"))
+
     def test_calculate_actual_annual_benefit(self):
         person = Person.objects.create(cpr="4325264923")
         year2024 = Year.objects.create(
@@ -4,7 +4,7 @@
 from datetime import datetime, timedelta
 from decimal import Decimal
 from io import StringIO
-from unittest.mock import ANY, MagicMock, call, patch
+from unittest.mock import ANY, MagicMock, patch
 
 from django.conf import settings
 from django.core.management import call_command
@@ -83,41 +83,34 @@ class TestImportU1ADataCommand(TestCase):
             oprettet_af_cpr=cls.person1.cpr,
         )
 
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items")
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items_unique_cprs")
+    @patch("suila.management.commands.import_u1a_data.get_all_akap_u1a_items")
     def test_akap_fetch_method_usage(
         self,
-        mock_get_akap_u1a_items_unique_cprs: MagicMock,
-        mock_get_akap_u1a_items: MagicMock,
+        mock_get_all_akap_u1a_items: MagicMock,
     ):
-        mock_get_akap_u1a_items_unique_cprs.return_value = [self.person1.cpr]
+        mock_get_all_akap_u1a_items.return_value = []
 
         call_command(self.command)
 
-        mock_get_akap_u1a_items_unique_cprs.assert_called_once_with(
-            settings.AKAP_HOST, settings.AKAP_API_SECRET, self.year.year, fetch_all=True
-        )
-        mock_get_akap_u1a_items.assert_called_once_with(
+        mock_get_all_akap_u1a_items.assert_called_once_with(
             settings.AKAP_HOST,
             settings.AKAP_API_SECRET,
             year=self.year.year,
-            cpr=self.person1.cpr,
-            fetch_all=True,
+            cpr=None,
+            limit=settings.AKAP_PAGE_SIZE,
+            max_workers=settings.AKAP_MAX_WORKERS,
         )
 
     # TODO: Make tests which verify the logic which handles the fetched U1A items
     # and creates MonthlyIncomeReports + updates PersonMonth sums
 
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items")
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items_unique_cprs")
+    @patch("suila.management.commands.import_u1a_data.get_all_akap_u1a_items")
     def test_model_creations(
         self,
-        mock_get_akap_u1a_items_unique_cprs: MagicMock,
-        mock_get_akap_u1a_items: MagicMock,
+        mock_get_all_akap_u1a_items: MagicMock,
     ):
         # Mocking
-        mock_get_akap_u1a_items_unique_cprs.return_value = [self.person1.cpr]
-        mock_get_akap_u1a_items.return_value = [
+        mock_get_all_akap_u1a_items.return_value = [
             AKAPU1AItem(
                 id=1,
                 u1a=self.u1a_1,
@@ -135,16 +128,14 @@ class TestImportU1ADataCommand(TestCase):
         # Invoke
         call_command(self.command)
 
-        # Assert fetch mocking methods was called
-        mock_get_akap_u1a_items_unique_cprs.assert_called_once_with(
-            settings.AKAP_HOST, settings.AKAP_API_SECRET, self.year.year, fetch_all=True
-        )
-        mock_get_akap_u1a_items.assert_called_once_with(
+        # Assert fetch mocking method was called
+        mock_get_all_akap_u1a_items.assert_called_once_with(
             settings.AKAP_HOST,
             settings.AKAP_API_SECRET,
             year=self.year.year,
-            cpr=self.person1.cpr,
-            fetch_all=True,
+            cpr=None,
+            limit=settings.AKAP_PAGE_SIZE,
+            max_workers=settings.AKAP_MAX_WORKERS,
         )
 
         # Assert PersonYear creation
@@ -242,12 +233,10 @@ class TestImportU1ADataCommand(TestCase):
             ],
         )
 
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items")
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items_unique_cprs")
+    @patch("suila.management.commands.import_u1a_data.get_all_akap_u1a_items")
     def test_modal_updates(
         self,
-        mock_get_akap_u1a_items_unique_cprs: MagicMock,
-        mock_get_akap_u1a_items: MagicMock,
+        mock_get_all_akap_u1a_items: MagicMock,
     ):
         # Test specific data
         existing_person_year = PersonYear.objects.create(
@@ -273,8 +262,7 @@ class TestImportU1ADataCommand(TestCase):
         )
 
         # Mocking
-        mock_get_akap_u1a_items_unique_cprs.return_value = [self.person1.cpr]
-        mock_get_akap_u1a_items.return_value = [
+        mock_get_all_akap_u1a_items.return_value = [
             AKAPU1AItem(
                 id=1,
                 u1a=self.u1a_1,
@@ -347,80 +335,50 @@ class TestImportU1ADataCommand(TestCase):
             },
         )
 
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items")
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items_unique_cprs")
+    @patch("suila.management.commands.import_u1a_data.get_all_akap_u1a_items")
     def test_u1a_items_multiple_people(
         self,
-        mock_get_akap_u1a_items_unique_cprs: MagicMock,
-        mock_get_akap_u1a_items: MagicMock,
+        mock_get_all_akap_u1a_items: MagicMock,
     ):
-        mock_get_akap_u1a_items_unique_cprs.return_value = [
-            self.person1.cpr,
-            self.person2.cpr,
+        # All U1A items for the year are fetched at once
+        mock_get_all_akap_u1a_items.return_value = [
+            AKAPU1AItem(
+                id=1,
+                u1a=self.u1a_2,
+                cpr_cvr_tin=self.person1.cpr,
+                navn="Test Person",
+                adresse="Testvej 1337",
+                postnummer="8000",
+                by="Aarhus",
+                land="Danmark",
+                udbytte=Decimal("1337.00"),
+                oprettet=datetime.now(),
+            ),
+            AKAPU1AItem(
+                id=2,
+                u1a=self.u1a_2,
+                cpr_cvr_tin=self.person2.cpr,
+                navn="Test Person2",
+                adresse="Testvej 1338",
+                postnummer="8000",
+                by="Aarhus",
+                land="Danmark",
+                udbytte=Decimal("1000.00"),
+                oprettet=datetime.now(),
+            ),
         ]
 
-        def _mock_get_akap_u1a_items(*args, **kwargs):
-            if kwargs["cpr"] == self.person1.cpr:
-                return [
-                    AKAPU1AItem(
-                        id=1,
-                        u1a=self.u1a_2,
-                        cpr_cvr_tin=self.person1.cpr,
-                        navn="Test Person",
-                        adresse="Testvej 1337",
-                        postnummer="8000",
-                        by="Aarhus",
-                        land="Danmark",
-                        udbytte=Decimal("1337.00"),
-                        oprettet=datetime.now(),
-                    ),
-                ]
-
-            if kwargs["cpr"] == self.person2.cpr:
-                return [
-                    AKAPU1AItem(
-                        id=2,
-                        u1a=self.u1a_2,
-                        cpr_cvr_tin=self.person2.cpr,
-                        navn="Test Person2",
-                        adresse="Testvej 1338",
-                        postnummer="8000",
-                        by="Aarhus",
-                        land="Danmark",
-                        udbytte=Decimal("1000.00"),
-                        oprettet=datetime.now(),
-                    ),
-                ]
-
-            return []
-
-        mock_get_akap_u1a_items.side_effect = _mock_get_akap_u1a_items
-
         # Invoke
         call_command(self.command)
 
-        # Assert fetch mocking methods was called
-        mock_get_akap_u1a_items_unique_cprs.assert_called_once_with(
-            settings.AKAP_HOST, settings.AKAP_API_SECRET, self.year.year, fetch_all=True
-        )
-
-        mock_get_akap_u1a_items.assert_has_calls(
-            [
-                call(
-                    settings.AKAP_HOST,
-                    settings.AKAP_API_SECRET,
-                    year=self.year.year,
-                    cpr=self.person1.cpr,
-                    fetch_all=True,
-                ),
-                call(
-                    settings.AKAP_HOST,
-                    settings.AKAP_API_SECRET,
-                    year=self.year.year,
-                    cpr=self.person2.cpr,
-                    fetch_all=True,
-                ),
-            ]
+        # Assert fetch mocking method was called once, for all persons
+        mock_get_all_akap_u1a_items.assert_called_once_with(
+            settings.AKAP_HOST,
+            settings.AKAP_API_SECRET,
+            year=self.year.year,
+            cpr=None,
+            limit=settings.AKAP_PAGE_SIZE,
+            max_workers=settings.AKAP_MAX_WORKERS,
         )
 
         # Assert MonthlyIncomeReport's
@@ -490,12 +448,10 @@ class TestImportU1ADataCommand(TestCase):
             ],
         )
 
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items")
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items_unique_cprs")
+    @patch("suila.management.commands.import_u1a_data.get_all_akap_u1a_items")
     def test_verbose(
         self,
-        mock_get_akap_u1a_items_unique_cprs: MagicMock,
-        mock_get_akap_u1a_items: MagicMock,
+        mock_get_all_akap_u1a_items: MagicMock,
     ):
         stdout = StringIO()
         stderr = StringIO()
@@ -506,12 +462,10 @@ class TestImportU1ADataCommand(TestCase):
         call_command(self.command, verbosity=3, stdout=stdout, stderr=stderr)
         self.assertIn("Running AKAP U1A data import:", stdout.getvalue())
 
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items")
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items_unique_cprs")
+    @patch("suila.management.commands.import_u1a_data.get_all_akap_u1a_items")
     def test_year_arg(
         self,
-        mock_get_akap_u1a_items_unique_cprs: MagicMock,
-        mock_get_akap_u1a_items: MagicMock,
+        mock_get_all_akap_u1a_items: MagicMock,
     ):
         stdout = StringIO()
         stderr = StringIO()
@@ -519,14 +473,12 @@ class TestImportU1ADataCommand(TestCase):
         call_command(self.command, verbosity=3, stdout=stdout, stderr=stderr, year=1991)
         self.assertIn("year(s): [1991]", stdout.getvalue())
 
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items")
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items_unique_cprs")
+    @patch("suila.management.commands.import_u1a_data.get_all_akap_u1a_items")
     def test_failure(
         self,
-        mock_get_akap_u1a_items_unique_cprs: MagicMock,
-        mock_get_akap_u1a_items: MagicMock,
+        mock_get_all_akap_u1a_items: MagicMock,
     ):
-        mock_get_akap_u1a_items_unique_cprs.side_effect = ValueError("foo")
+        mock_get_all_akap_u1a_items.side_effect = ValueError("foo")
 
         with self.assertRaises(CommandError):
             call_command(self.command)
@@ -573,39 +525,41 @@ class TestImportU1ADataCommand(TestCase):
         self.assertIn("PersonMonths updated: 123", stdout.getvalue())
         self.assertIn("DONE", stdout.getvalue())
 
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items")
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items_unique_cprs")
+    @patch("suila.management.commands.import_u1a_data.get_all_akap_u1a_items")
     def test_cpr_arg(
         self,
-        mock_get_akap_u1a_items_unique_cprs: MagicMock,
-        mock_get_akap_u1a_items: MagicMock,
+        mock_get_all_akap_u1a_items: MagicMock,
     ):
         stdout = StringIO()
 
         call_command(self.command, cpr=self.person1.cpr, stdout=stdout, verbosity=3)
         self.assertNotIn("No CPR(s) specified, fetching all", stdout.getvalue())
+        mock_get_all_akap_u1a_items.assert_called_once_with(
+            settings.AKAP_HOST,
+            settings.AKAP_API_SECRET,
+            year=self.year.year,
+            cpr=self.person1.cpr,
+            limit=settings.AKAP_PAGE_SIZE,
+            max_workers=settings.AKAP_MAX_WORKERS,
+        )
 
         call_command(self.command, cpr=None, stdout=stdout, verbosity=3)
         self.assertIn("No CPR(s) specified, fetching all", stdout.getvalue())
 
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items")
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items_unique_cprs")
+    @patch("suila.management.commands.import_u1a_data.get_all_akap_u1a_items")
     def test_cpr_arg_unknown_person(
         self,
-        mock_get_akap_u1a_items_unique_cprs: MagicMock,
-        mock_get_akap_u1a_items: MagicMock,
+        mock_get_all_akap_u1a_items: MagicMock,
     ):
         stdout = StringIO()
 
         call_command(self.command, cpr="0101011991", stdout=stdout, verbosity=3)
         self.assertIn("WARNING: Could not find Person", stdout.getvalue())
 
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items")
-    @patch("suila.management.commands.import_u1a_data.get_akap_u1a_items_unique_cprs")
+    @patch("suila.management.commands.import_u1a_data.get_all_akap_u1a_items")
     def test_report_not_changed(
         self,
-        mock_get_akap_u1a_items_unique_cprs: MagicMock,
-        mock_get_akap_u1a_items: MagicMock,
+        mock_get_all_akap_u1a_items: MagicMock,
     ):
         # Test specific data
         existing_person_year = PersonYear.objects.create(
@@ -631,8 +585,7 @@ class TestImportU1ADataCommand(TestCase):
         )
 
         # Mocking
-        mock_get_akap_u1a_items_unique_cprs.return_value = [self.person1.cpr]
-        mock_get_akap_u1a_items.return_value = [
+        mock_get_all_akap_u1a_items.return_value = [
             AKAPU1AItem(
                 id=1,
                 u1a=self.u1a_1,
@@ -17,7 +17,7 @@ from django.utils import timezone
 from requests.models import Response
 from tenQ.writer.g68 import G68Transaction, Udbetalingsbeløb
 
-from suila.benefit import get_eboks_date
+from suila.dates import get_eboks_date
 from suila.models import (
     JobLog,
     ManagementCommands,
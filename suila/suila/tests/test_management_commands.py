@@ -8,7 +8,7 @@ from concurrent.futures import Future
 from datetime import datetime, timedelta
 from decimal import Decimal
 from io import StringIO
-from typing import Any, Dict, Set
+from typing import Any, Dict, List, Set
 from unittest.mock import ANY, MagicMock, call, patch
 
 import numpy as np
@@ -199,8 +199,8 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
         self._create_person("0101709988")
 
         # Mocking
-        response = MagicMock(status_code=404)
-        self.client_mock.get_person_info.side_effect = HTTPError(response=response)
+        self.client_mock.get_person_info_bulk.side_effect = None
+        self.client_mock.get_person_info_bulk.return_value = {"0101709988": None}
         self.pitu_client_mock.from_settings.return_value = self.client_mock
 
         stdout = StringIO()
@@ -235,7 +235,7 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
 
         # Mocking
         response = MagicMock(status_code=303)
-        self.client_mock.get_person_info.side_effect = HTTPError(response=response)
+        self.client_mock.get_person_info_bulk.side_effect = HTTPError(response=response)
         self.pitu_client_mock.from_settings.return_value = self.client_mock
 
         stdout = StringIO()
@@ -269,15 +269,9 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
             stderr=stderr,
         )
 
-        self.assertEqual(
-            mock_get_pitu_client.return_value.get_person_info.call_count, 3
-        )
-        mock_get_pitu_client.return_value.get_person_info.assert_has_calls(
-            [
-                call("0101709988"),
-                call("0102808877"),
-                call("0103907766"),
-            ]
+        # All persons are looked up in a single request
+        mock_get_pitu_client.return_value.get_person_info_bulk.assert_called_once_with(
+            ["0101709988", "0102808877", "0103907766"]
         )
 
         # Verify the persons got updated
@@ -396,14 +390,8 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
         )
 
         # Should only fetch person-info for persons missing it, which in this test is 2
-        self.assertEqual(
-            mock_get_pitu_client.return_value.get_person_info.call_count, 2
-        )
-        mock_get_pitu_client.return_value.get_person_info.assert_has_calls(
-            [
-                call(person3.cpr),
-                call(person4.cpr),
-            ]
+        mock_get_pitu_client.return_value.get_person_info_bulk.assert_called_once_with(
+            [person3.cpr, person4.cpr]
         )
 
     @patch(
@@ -426,8 +414,8 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
         # Verify DAFO-data is fetched for a person without any DAFO-data
         person2 = self._create_person("0102808877")
         call_command(ManagementCommands.GET_PERSON_INFO_FROM_DAFO, cpr=person2.cpr)
-        mock_get_pitu_client.return_value.get_person_info.assert_called_with(
-            person2.cpr
+        mock_get_pitu_client.return_value.get_person_info_bulk.assert_called_with(
+            [person2.cpr]
         )
         self.assertEqual(
             model_to_dict(Person.objects.get(pk=person2.id)),
@@ -460,8 +448,8 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
         # the key DAFO-data-fields ("full_address" & "country_code" in this case)
         person3 = self._create_person("0103907766", name="Test 3")
         call_command(ManagementCommands.GET_PERSON_INFO_FROM_DAFO, cpr=person3.cpr)
-        mock_get_pitu_client.return_value.get_person_info.assert_called_with(
-            person3.cpr
+        mock_get_pitu_client.return_value.get_person_info_bulk.assert_called_with(
+            [person3.cpr]
         )
         self.assertEqual(
             model_to_dict(Person.objects.get(pk=person3.id)),
@@ -496,8 +484,8 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
             "0104906655", name="Test 4", full_address="Testvej 1337, 8000 Aarhus C"
         )
         call_command(ManagementCommands.GET_PERSON_INFO_FROM_DAFO, cpr=person4.cpr)
-        mock_get_pitu_client.return_value.get_person_info.assert_called_with(
-            person4.cpr
+        mock_get_pitu_client.return_value.get_person_info_bulk.assert_called_with(
+            [person4.cpr]
         )
         self.assertEqual(
             model_to_dict(Person.objects.get(pk=person4.id)),
@@ -552,14 +540,8 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
             force=True,
         )
 
-        self.assertEqual(
-            mock_get_pitu_client.return_value.get_person_info.call_count, 2
-        )
-        mock_get_pitu_client.return_value.get_person_info.assert_has_calls(
-            [
-                call(person1.cpr),
-                call(person2.cpr),
-            ]
+        mock_get_pitu_client.return_value.get_person_info_bulk.assert_called_once_with(
+            [person1.cpr, person2.cpr]
         )
 
         self.assertEqual(
@@ -633,9 +615,64 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
             cpr=person1.cpr,
             force=True,
         )
-        mock_get_pitu_client.return_value.get_person_info.assert_called_once_with(
-            "0101709988"
+        mock_get_pitu_client.return_value.get_person_info_bulk.assert_called_once_with(
+            ["0101709988"]
+        )
+
+    @patch(
+        "suila.management.commands.get_person_info_from_dafo.Command._get_pitu_client"
+    )
+    def test_persons_are_looked_up_in_batches(self, mock_get_pitu_client: MagicMock):
+        mock_get_pitu_client.return_value = self._get_mock_pitu_client()
+        mock_get_pitu_client.return_value.combined_service_page_size = 2
+        person1 = self._create_person("0101709988")
+        person2 = self._create_person("0102808877")
+        person3 = self._create_person("0103907766")
+
+        call_command(ManagementCommands.GET_PERSON_INFO_FROM_DAFO)
+
+        mock_get_pitu_client.return_value.get_person_info_bulk.assert_has_calls(
+            [call([person1.cpr, person2.cpr]), call([person3.cpr])]
+        )
+        self.assertEqual(
+            list(Person.objects.order_by("pk").values_list("name", flat=True)),
+            ["Test One Magenta", "Test Two Magenta", "Test Three Magenta"],
+        )
+
+    @patch(
+        "suila.management.commands.get_person_info_from_dafo.Command._get_pitu_client"
+    )
+    def test_only_changed_persons_are_saved(self, mock_get_pitu_client: MagicMock):
+        mock_get_pitu_client.return_value = self._get_mock_pitu_client()
+
+        # Person whose data is identical to the data in DAFO
+        person1 = self._create_person(
+            "0101709988",
+            name="Test One Magenta",
+            full_address="Silkeborgvej 260, 8230 Åbyhøj",
+            country_code="DK",
+            cpr_status=1,
+        )
+        # Person whose data differs from the data in DAFO
+        person2 = self._create_person(
+            "0102808877",
+            name="Test 2",
+            full_address="TestVej 2337, 1234 Oslo",
+            country_code="NO",
+            cpr_status=1,
+        )
+
+        call_command(ManagementCommands.GET_PERSON_INFO_FROM_DAFO, force=True)
+
+        # Both persons are looked up, but only the changed person is written
+        mock_get_pitu_client.return_value.get_person_info_bulk.assert_called_once_with(
+            [person1.cpr, person2.cpr]
         )
+        self.assertEqual(person1.history.count(), 1)
+        self.assertEqual(person2.history.count(), 2)
+        person2.refresh_from_db()
+        self.assertEqual(person2.name, "Test Two Magenta")
+        self.assertEqual(person2.country_code, "DK")
 
     def test_no_civilstand(self):
         # Test data
@@ -644,8 +681,8 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
         # Mocking
         person_info = self._mock_get_person_info("0101709988")
         person_info.pop("civilstand")
-        self.client_mock.get_person_info.return_value = person_info
-        self.client_mock.get_person_info.side_effect = None
+        self.client_mock.get_person_info_bulk.return_value = {"0101709988": person_info}
+        self.client_mock.get_person_info_bulk.side_effect = None
         self.pitu_client_mock.from_settings.return_value = self.client_mock
 
         stdout = StringIO()
@@ -665,8 +702,8 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
         # Mocking
         person_info = self._mock_get_person_info("0101709988")
         person_info.pop("fornavn")
-        self.client_mock.get_person_info.return_value = person_info
-        self.client_mock.get_person_info.side_effect = None
+        self.client_mock.get_person_info_bulk.return_value = {"0101709988": person_info}
+        self.client_mock.get_person_info_bulk.side_effect = None
         self.pitu_client_mock.from_settings.return_value = self.client_mock
 
         stdout = StringIO()
@@ -685,8 +722,8 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
         # Mocking
         person_info = self._mock_get_person_info("0101709988")
         person_info.pop("efternavn")
-        self.client_mock.get_person_info.return_value = person_info
-        self.client_mock.get_person_info.side_effect = None
+        self.client_mock.get_person_info_bulk.return_value = {"0101709988": person_info}
+        self.client_mock.get_person_info_bulk.side_effect = None
         self.pitu_client_mock.from_settings.return_value = self.client_mock
 
         stdout = StringIO()
@@ -730,12 +767,12 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
         call_command(
             ManagementCommands.GET_UPDATED_PERSON_INFO_FROM_DAFO,
         )
-        mock_get_pitu_client.return_value.get_person_info.assert_called_with(
-            person1.cpr
+        mock_get_pitu_client.return_value.get_person_info_bulk.assert_called_once_with(
+            [person1.cpr]
         )
         self.assertNotIn(
-            call(person2.cpr),
-            mock_get_pitu_client.return_value.get_person_info.mock_calls,
+            person2.cpr,
+            mock_get_pitu_client.return_value.get_person_info_bulk.call_args.args[0],
         )
 
     # PRIVATE helper methods
@@ -743,11 +780,16 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
         mock_get_person_info = MagicMock(
             side_effect=GetPersonInfoFromDAFO._mock_get_person_info
         )
+        mock_get_person_info_bulk = MagicMock(
+            side_effect=GetPersonInfoFromDAFO._mock_get_person_info_bulk
+        )
         mock_get_subscription_results = MagicMock(
             side_effect=GetPersonInfoFromDAFO._mock_get_subscription_results
         )
         mock_pitu_client = MagicMock(
+            combined_service_page_size=400,
             get_person_info=mock_get_person_info,
+            get_person_info_bulk=mock_get_person_info_bulk,
             get_subscription_results=mock_get_subscription_results,
         )
         return mock_pitu_client
@@ -764,6 +806,10 @@ class GetPersonInfoFromDAFO(TransactionTestCase):
             updated.add("0102808877")
         return updated
 
+    @staticmethod
+    def _mock_get_person_info_bulk(cprs: List[str]) -> Dict[str, Any]:
+        return {cpr: GetPersonInfoFromDAFO._mock_get_person_info(cpr) for cpr in cprs}
+
     @staticmethod
     def _mock_get_person_info(cpr: str) -> Dict[str, Any]:
         match (cpr):
@@ -842,7 +888,25 @@ class GenerateFinalSettlements(BaseTestCase):
             person_year.person.full_address = "Nuussuaq 3, Nuussuaq"
             person_year.save()
 
-        call_command("generate_final_settlements", "2024")
+        call_command("generate_final_settlements", "2024", render_workers=1)
+
+        final_settlements = FinalSettlement.objects.filter(
+            annual_income__person_year__year_id=2024
+        )
+        self.assertTrue(final_settlements.exists())
+        for final_settlement in final_settlements:
+            # The results are computed in bulk, and the PDFs rendered afterwards
+            self.assertEqual(
+                final_settlement._result,
+                final_settlement.benefit_due_for_year
+                - final_settlement.benefit_paid_out_in_year,
+            )
+            self.assertIsNotNone(final_settlement.eboks_message)
+            self.assertEqual(final_settlement.eboks_message.type, "årsopgørelse")
+            self.assertEqual(
+                final_settlement.pdf.name,
+                final_settlement.eboks_message.contents.name,
+            )
 
     def test_generate_final_settlements_without_person_months(self):
         """
@@ -890,3 +954,40 @@ class GenerateFinalSettlements(BaseTestCase):
                 ).count(),
                 1,
             )
+
+    def test_generate_final_settlements_failure(self):
+        SuilaEboksMessage.objects.all().delete()
+        person_years = PersonYear.objects.filter(year__year=2024)
+        for person_year in person_years:
+            AnnualIncome.objects.create(
+                person_year=person_year,
+                account_tax_result=Decimal(130000),
+                salary=random.randint(65000, 500000),
+            )
+            person_year.person.full_address = "Nuussuaq 3, Nuussuaq"
+            person_year.person.save()
+
+        # A failure while preparing the letters leaves no final settlements behind
+        with patch.object(
+            SuilaEboksMessage, "prefetch_context", side_effect=ValueError
+        ):
+            with self.assertRaises(ValueError):
+                call_command(
+                    "generate_final_settlements", "2024", render_workers=1, reraise=True
+                )
+        self.assertFalse(
+            FinalSettlement.objects.filter(
+                annual_income__person_year__year_id=2024
+            ).exists()
+        )
+
+        # Running the command again creates exactly one final settlement for each
+        # person year, also when run once more.
+        call_command("generate_final_settlements", "2024", render_workers=1)
+        call_command("generate_final_settlements", "2024", render_workers=1)
+        for person_year in person_years:
+            final_settlements = FinalSettlement.objects.filter(
+                annual_income__person_year=person_year
+            )
+            self.assertEqual(final_settlements.count(), 1)
+            self.assertIsNotNone(final_settlements.get().eboks_message)
@@ -8,9 +8,12 @@ from operator import attrgetter
 from unittest.mock import PropertyMock, patch
 
 import pytz
+from common.models import User
 from common.tests.test_mixins import UserMixin
-from django.test import TestCase
+from django.contrib.contenttypes.models import ContentType
+from django.test import RequestFactory, TestCase
 from django.utils import timezone
+from simple_history.models import HistoricalRecords
 
 from suila.data import MonthlyIncomeData
 from suila.models import (
@@ -38,6 +41,7 @@ from suila.models import (
     StatusChoices,
     TaxInformationPeriod,
     Year,
+    deferred_income_recalculation,
 )
 
 
@@ -807,6 +811,38 @@ class TestPersonMonth(UserModelTest):
         self.assertEqual(self.month3.amount_sum, Decimal(12000 + 10000))
         self.assertEqual(self.month4.amount_sum, Decimal(13000 + 8000))
 
+    def test_recompute_amount_sums(self):
+        # Arrange: reset the amount sums of person months with and without reports
+        person_months = [self.month1, self.month2, self.month3, self.month4]
+        PersonMonth.objects.filter(
+            pk__in=[pm.pk for pm in person_months + [self.month5]]
+        ).update(amount_sum=Decimal(42))
+        # Act
+        with self.assertNumQueries(1):
+            result = PersonMonth.recompute_amount_sums(
+                pm.pk for pm in person_months + [self.month5]
+            )
+        # Assert: the amount sums are recomputed from the monthly income reports
+        expected = {
+            self.month1.pk: Decimal(10000),
+            self.month2.pk: Decimal(11000 + 12000),
+            self.month3.pk: Decimal(12000 + 10000),
+            self.month4.pk: Decimal(13000 + 8000),
+            self.month5.pk: Decimal(0),
+        }
+        self.assertEqual(result, expected)
+        self.assertEqual(
+            dict(
+                PersonMonth.objects.filter(pk__in=expected.keys()).values_list(
+                    "pk", "amount_sum"
+                )
+            ),
+            expected,
+        )
+        # Assert: no query is made for an empty list of IDs
+        with self.assertNumQueries(0):
+            self.assertEqual(PersonMonth.recompute_amount_sums([]), {})
+
     def test_next(self):
         self.assertEqual(self.month1.next, self.month2)
         self.assertEqual(self.month12.next, self.year2month1)
@@ -1063,6 +1099,57 @@ class TestIncomeReport(ModelTest):
             report.person_month.amount_sum, old_amount_sum - old_amount + new_amount
         )
 
+    def test_post_save_history_user(self):
+        # Arrange: an edit made in a request, e.g. in the admin
+        user = User.objects.create_user(username="editor")
+        HistoricalRecords.context.request = RequestFactory().get("/")
+        HistoricalRecords.context.request.user = user
+        self.addCleanup(delattr, HistoricalRecords.context, "request")
+        # Act
+        self.report1.salary_income = Decimal(500)
+        self.report1.save()
+        # Assert: the person month history records the user
+        self.assertEqual(self.month1.history.latest().history_user, user)
+
+    def test_deferred_income_recalculation(self):
+        history_count = self.month5.history.count()
+        with deferred_income_recalculation() as pks:
+            for salary_income in (Decimal(1000), Decimal(2000), Decimal(3000)):
+                MonthlyIncomeReport.objects.create(
+                    person_month=self.month5, salary_income=salary_income
+                )
+            self.report1.salary_income = Decimal(500)
+            self.report1.save()
+            # Nested contexts collect into the outermost context
+            with deferred_income_recalculation() as nested_pks:
+                self.assertIs(nested_pks, pks)
+            # Assert: the amount sums are not updated while the context is active
+            self.assertEqual(pks, {self.month1.pk, self.month5.pk})
+            self.month1.refresh_from_db()
+            self.month5.refresh_from_db()
+            self.assertEqual(self.month1.amount_sum, Decimal(10000))
+            self.assertEqual(self.month5.amount_sum, Decimal(0))
+        # Assert: the amount sums are updated when the context exits
+        self.month1.refresh_from_db()
+        self.month5.refresh_from_db()
+        self.assertEqual(self.month1.amount_sum, Decimal(500))
+        self.assertEqual(self.month5.amount_sum, Decimal(6000))
+        self.assertEqual(self.month5.history.count(), history_count + 1)
+
+    def test_deferred_income_recalculation_saves_without_extra_queries(self):
+        report = MonthlyIncomeReport(
+            person_month_id=self.month5.pk,
+            month=self.month5.month,
+            year=self.year.year,
+            salary_income=Decimal(1000),
+        )
+        with deferred_income_recalculation():
+            # Only the INSERT of the report and its history are performed
+            with self.assertNumQueries(2):
+                report.save()
+        self.month5.refresh_from_db()
+        self.assertEqual(self.month5.amount_sum, Decimal(1000))
+
 
 class EstimationTest(ModelTest):
     @classmethod
@@ -1181,6 +1268,43 @@ class TestFinalSettlement(ModelTest):
         pdf = fs.pdf
         self.assertTrue(pdf is None)
 
+    def test_build_for_person_years(self):
+        # Arrange: give the person year a benefit transfer and some U income
+        self.month1.benefit_transferred = Decimal("1000.00")
+        self.month1.save(update_fields=("benefit_transferred",))
+        MonthlyIncomeReport.objects.create(
+            person_month=self.month2,
+            u_income=Decimal("2500.50"),
+            month=self.month2.month,
+            year=self.year.year,
+        )
+        ContentType.objects.get_for_model(StandardWorkBenefitCalculationMethod)
+        # Act: compute results using a fixed number of queries (person years,
+        # summarized amounts, annual incomes, calculation method.)
+        with self.assertNumQueries(4):
+            final_settlements = FinalSettlement.build_for_person_years(
+                PersonYear.objects.filter(pk=self.person_year.pk)
+            )
+        # Assert: the results are identical to the ones computed one by one, and
+        # nothing is saved
+        self.assertEqual(len(final_settlements), 1)
+        final_settlement = final_settlements[0]
+        self.assertIsNone(final_settlement.pk)
+        self.assertEqual(final_settlement.annual_income, self.annual_income)
+        self.assertIsNone(final_settlement.eboks_message)
+        self.assertEqual(
+            final_settlement._result,
+            self.annual_income.calculate_actual_annual_benefit()
+            - PersonYear.objects.get(pk=self.person_year.pk).benefit_transferred,
+        )
+
+    def test_pdf_is_shared_with_eboks_message(self):
+        fs = FinalSettlement(annual_income=self.annual_income)
+        fs.save()
+        # The PDF rendered by the e-Boks message is reused rather than stored again
+        self.assertIsNotNone(fs.eboks_message)
+        self.assertEqual(fs.pdf.name, fs.eboks_message.contents.name)
+
     def test_exception_when_no_december(self):
         person = Person.objects.create(name="Hans Jensen", cpr="0987654321")
         year = Year.objects.create(year=2030, calculation_method=self.calc)
@@ -2,13 +2,13 @@
 #
 # SPDX-License-Identifier: MPL-2.0
 from datetime import datetime
-from unittest.mock import MagicMock, call
+from unittest.mock import MagicMock, call, patch
 
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from django.test.utils import override_settings
-from requests import ReadTimeout
+from requests import HTTPError, ReadTimeout
 
-from suila.integrations.pitu.client import PituClient
+from suila.integrations.pitu.client import PituClient, TokenBucket
 
 pitu_test_settings = {
     "certificate": "test_cert",
@@ -58,6 +58,58 @@ class PituTest(TestCase):
         self.assertTrue(self.pitu_client.session.get.called)
         self.assertEqual(json_response["foo"], "bar")
 
+    def test_get_person_info_bulk(self):
+        cprs = [str(x).zfill(10) for x in range(1, 403)]
+        # The first batch contains all but one CPR, the second batch is not found
+        # as a whole, so its CPRs are looked up one by one
+        not_found = HTTPError(response=MagicMock(status_code=404))
+        self.response_mock.json.side_effect = [
+            {cpr: {"cpr": cpr} for cpr in cprs[1:400]},
+            {"cpr": cprs[400]},
+        ]
+        self.response_mock.raise_for_status.side_effect = [
+            None,
+            not_found,
+            None,
+            not_found,
+        ]
+        result = self.pitu_client.get_person_info_bulk(cprs)
+        # One request per `combined_service_page_size` CPRs, and one per CPR in the
+        # batch which was not found
+        self.assertEqual(self.session_mock.get.call_count, 4)
+        self.assertEqual(
+            self.session_mock.get.call_args_list[0].kwargs["params"],
+            {"cpr": ",".join(cprs[:400])},
+        )
+        self.assertEqual(
+            self.session_mock.get.call_args_list[1].kwargs["params"],
+            {"cpr": ",".join(cprs[400:])},
+        )
+        self.assertEqual(
+            [c.args[0] for c in self.session_mock.get.call_args_list[2:]],
+            [f"test_url/personLookup/1/cpr/{cpr}" for cpr in cprs[400:]],
+        )
+        self.assertEqual(len(result), 402)
+        self.assertIsNone(result[cprs[0]])
+        self.assertEqual(result[cprs[1]], {"cpr": cprs[1]})
+        self.assertEqual(result[cprs[400]], {"cpr": cprs[400]})
+        self.assertIsNone(result[cprs[401]])
+
+    def test_get_person_info_bulk_fallback_error(self):
+        self.response_mock.raise_for_status.side_effect = [
+            HTTPError(response=MagicMock(status_code=404)),
+            HTTPError(response=MagicMock(status_code=500)),
+        ]
+        with self.assertRaises(HTTPError):
+            self.pitu_client.get_person_info_bulk(["0101011234"])
+
+    def test_get_person_info_bulk_error(self):
+        self.response_mock.raise_for_status.side_effect = HTTPError(
+            response=MagicMock(status_code=500)
+        )
+        with self.assertRaises(HTTPError):
+            self.pitu_client.get_person_info_bulk(["0101011234"])
+
     def test_get_subscription_results(self):
         cprs = [str(x).zfill(10) for x in range(1, 250)]
         envelope_prototype = {
@@ -249,3 +301,45 @@ class PituTest(TestCase):
             self.pitu_client.get_subscription_results()
         exception = cm.exception
         self.assertEqual(str(exception), "Unexpected None in cprList: {}")
+
+    @override_settings(PITU={**pitu_test_settings, "rate_limit": 5})
+    def test_rate_limit(self):
+        pitu_client = PituClient.from_settings()
+        pitu_client.session = self.session_mock
+        self.assertEqual(pitu_client.rate_limiter.rate, 5)
+        with patch.object(pitu_client.rate_limiter, "acquire") as acquire_mock:
+            pitu_client.get_person_info("0101011234")
+            acquire_mock.assert_called_once_with()
+
+
+class TokenBucketTest(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = 0.0
+        patcher = patch("suila.integrations.pitu.client.time")
+        self.time_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.time_mock.monotonic.side_effect = lambda: self.now
+
+        def sleep(seconds):
+            self.now += seconds
+
+        self.time_mock.sleep.side_effect = sleep
+
+    def test_burst_up_to_capacity(self):
+        bucket = TokenBucket(rate=10, capacity=3)
+        for _ in range(3):
+            bucket.acquire()
+        self.time_mock.sleep.assert_not_called()
+
+    def test_acquire_waits_for_token(self):
+        bucket = TokenBucket(rate=10, capacity=1)
+        bucket.acquire()
+        bucket.acquire()
+        bucket.acquire()
+        # Two tokens were refilled at 10 tokens per second
+        self.assertAlmostEqual(self.now, 0.2)
+
+    def test_invalid_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(rate=0)
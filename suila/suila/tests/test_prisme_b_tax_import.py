@@ -8,13 +8,14 @@ from unittest.mock import MagicMock, patch
 
 from django.core.management import call_command
 from django.core.management.base import CommandError
+from django.db import connection
 from django.test import SimpleTestCase
-from django.test.utils import override_settings
+from django.test.utils import CaptureQueriesContext, override_settings
 from tenQ.client import ClientException
 
 from suila.integrations.prisme.b_tax import BTaxPayment, BTaxPaymentImport
 from suila.models import BTaxPayment as BTaxPaymentModel
-from suila.models import ManagementCommands, PersonMonth
+from suila.models import DataLoad, ManagementCommands, PersonMonth
 from suila.tests.helpers import ImportTestCase
 
 _EXAMPLE_1 = (
@@ -170,10 +171,17 @@ class TestBTaxPaymentImport(ImportTestCase):
             )
 
     def test_import_b_tax_handles_failing_file_load(self):
-        instance = BTaxPaymentImport()
+        # Arrange
+        stdout = MagicMock()
         with self.mock_sftp_server_folder(_EXAMPLE_1):
-            with patch.object(instance, "_parse", return_value=None):
-                self.import_b_tax(MagicMock(), 1)
+            with patch.object(
+                BTaxPaymentImport, "get_file", side_effect=ClientException
+            ):
+                # Act
+                self.import_b_tax(stdout, 1)
+        # Assert
+        stdout.write.assert_any_call(f"Failed to load new file {_EXAMPLE_1[0]}\n")
+        self.assertEqual(BTaxPaymentModel.objects.count(), 0)
 
     def test_import_b_tax_verbosity_2(self):
         # Arrange
@@ -184,6 +192,49 @@ class TestBTaxPaymentImport(ImportTestCase):
         # Assert
         self.assertEqual(stdout.write.call_count, 5)
 
+    def test_get_or_create_person_months_uses_constant_number_of_queries(self):
+        # Arrange
+        instance = BTaxPaymentImport()
+        load = DataLoad.objects.create(source="test")
+
+        def get_rows(first_cpr: int, count: int) -> list[BTaxPayment]:
+            return [
+                BTaxPayment.from_csv_row(
+                    [
+                        "BTAX",
+                        f"{first_cpr + i:010d}",
+                        "",
+                        "2021",
+                        "-3439",
+                        "2000004544",
+                        "3439",
+                        "2021/04/20",
+                        "004",
+                    ]
+                )
+                for i in range(count)
+            ]
+
+        # Act: create person months for 1 and 50 rows, respectively
+        with CaptureQueriesContext(connection) as single_row:
+            result = instance._get_or_create_person_months(
+                get_rows(10190_0000, 1), load
+            )
+        self.assertEqual(len(result), 1)
+        with CaptureQueriesContext(connection) as many_rows:
+            result = instance._get_or_create_person_months(
+                get_rows(10290_0000, 50), load
+            )
+
+        # Assert: the number of queries does not depend on the number of rows
+        self.assertEqual(len(single_row), len(many_rows))
+        # Assert: all rows are mapped to a person month
+        self.assertEqual(len(result), 50)
+        for (cpr, year, month), person_month in result.items():
+            self.assertEqual(person_month.person_year.person.cpr, cpr)
+            self.assertEqual(person_month.person_year.year.year, year)
+            self.assertEqual(person_month.month, month)
+
     @override_settings(PRISME={"b_tax_folder": "foo"})
     def test_get_remote_folder_name(self):
         # Arrange
@@ -191,22 +242,23 @@ class TestBTaxPaymentImport(ImportTestCase):
         # Act and assert
         self.assertEqual(instance.get_remote_folder_name(), "foo")
 
-    def test_parse(self):
+    def test_get_files(self):
         # Arrange
         instance = BTaxPaymentImport()
         with self.mock_sftp_server_folder(_EXAMPLE_1):
             # Act
-            result: list[BTaxPayment] | None = instance._parse("filename1.csv")
-            # Assert
-            self.assertIsInstance(result, list)
-            self.assertIsInstance(result[0], BTaxPayment)
+            [(filename, buf)] = instance.get_files([_EXAMPLE_1[0]])
+            result: list[BTaxPayment] = list(BTaxPayment.iter_csv_buf(buf))
+        # Assert
+        self.assertEqual(filename, _EXAMPLE_1[0])
+        self.assertEqual(result, [BTaxPayment.from_csv_row(_EXAMPLE_1[1].split(";"))])
 
-    def test_parse_handles_client_exception(self):
+    def test_get_files_handles_client_exception(self):
         # Arrange
         instance = BTaxPaymentImport()
         with self.mock_sftp_server_folder(_EXAMPLE_1):
             with patch.object(instance, "get_file", side_effect=ClientException):
                 # Act
-                result: list[BTaxPayment] | None = instance._parse("filename1.csv")
-                # Assert
-                self.assertIsNone(result)
+                result = list(instance.get_files([_EXAMPLE_1[0]]))
+        # Assert
+        self.assertEqual(result, [(_EXAMPLE_1[0], None)])
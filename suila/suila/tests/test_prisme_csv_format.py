@@ -4,6 +4,7 @@
 from dataclasses import dataclass
 from datetime import date
 from io import BytesIO
+from typing import Iterator
 
 from django.test import SimpleTestCase
 
@@ -31,6 +32,14 @@ class TestCSVFormat(SimpleTestCase):
         self.assertEqual(len(rows), 1)
         self.assertIsInstance(rows[0], SampleFormat)
 
+    def test_iter_csv_buf(self):
+        buf: BytesIO = BytesIO("\n".join([_EXAMPLE] * 3).encode(self.encoding))
+        rows = SampleFormat.iter_csv_buf(buf)
+        # Assert that rows are parsed lazily
+        self.assertIsInstance(rows, Iterator)
+        self.assertEqual(next(rows), SampleFormat("foobar", 1234))
+        self.assertEqual(len(list(rows)), 2)
+
     def test_parse_date(self):
         parsed: date = CSVFormat.parse_date("2021/04/20")
         self.assertEqual(parsed, date(2021, 4, 20))
@@ -12,7 +12,6 @@ from unittest.mock import ANY, MagicMock, Mock, patch
 
 from django.conf import settings
 from django.core.management import call_command
-from django.db.models import QuerySet
 from django.test import TestCase
 from django.test.utils import override_settings
 from tenQ.client import ClientException
@@ -116,7 +115,7 @@ class TestBatchExport(TestCase):
         export = self._get_instance()
         queryset = export.get_person_month_queryset()
         # Act
-        batches: list[tuple[PrismeBatch, QuerySet[PersonMonth]]] = list(
+        batches: list[tuple[PrismeBatch, list[PersonMonth]]] = list(
             export.get_batches(queryset)
         )
         # Assert: we yield three batches: two for normal prefixes 01 and 31, and one for
@@ -124,14 +123,14 @@ class TestBatchExport(TestCase):
         self.assertEqual(len(batches), 3)
         # Assert: first batch is for prefix 01 and contains one `PersonMonth` object
         batch_01_prisme_batch: PrismeBatch = batches[0][0]
-        batch_01_person_months: QuerySet[PersonMonth] = batches[0][1]
+        batch_01_person_months: list[PersonMonth] = batches[0][1]
         self.assertEqual(batch_01_prisme_batch.prefix, 1)
         self.assertQuerySetEqual(
             batch_01_person_months, queryset.filter(identifier="0101000028")
         )
         # Assert: second batch is for prefix 31 and contains two `PersonMonth` objects
         batch_31_prisme_batch: PrismeBatch = batches[1][0]
-        batch_31_person_months: QuerySet[PersonMonth] = batches[1][1]
+        batch_31_person_months: list[PersonMonth] = batches[1][1]
         self.assertEqual(batch_31_prisme_batch.prefix, 31)
         self.assertQuerySetEqual(
             batch_31_person_months,
@@ -139,7 +138,7 @@ class TestBatchExport(TestCase):
         )
         # Assert: third batch is for prefix 32 and contains one `PersonMonth` object
         batch_32_prisme_batch: PrismeBatch = batches[2][0]
-        batch_32_person_months: QuerySet[PersonMonth] = batches[2][1]
+        batch_32_person_months: list[PersonMonth] = batches[2][1]
         self.assertEqual(batch_32_prisme_batch.prefix, 32)
         self.assertQuerySetEqual(
             batch_32_person_months, queryset.filter(identifier="3101000001")
@@ -211,6 +210,30 @@ class TestBatchExport(TestCase):
         self.assertRegex(invoice_no, f"{prisme_batch.pk:015d}\\d{{5}}")
         self.assertEqual(invoice_no, prisme_batch_item.invoice_no)
 
+    def test_get_prisme_batch_item_reuses_account_aliases_and_dates(self):
+        """Account aliases, payment dates and posting dates are looked up once per
+        export, rather than once per `PersonMonth`.
+        """
+        # Arrange
+        self._add_person_month(3112700000, Decimal("1000"))
+        self._add_person_month(3112710000, Decimal("1000"))
+        prisme_batch, _ = PrismeBatch.objects.get_or_create(
+            prefix=0, export_date=date(2025, 1, 1)
+        )
+        export = self._get_instance()
+        writer = export.get_g68_g69_transaction_writer()
+        person_months = list(export.get_person_month_queryset())
+        # Act: build the first item, loading the account aliases
+        with self.assertNumQueries(1):
+            export.get_prisme_batch_item(prisme_batch, person_months[0], writer)
+        # Act: build the second item, using the already loaded aliases
+        with self.assertNumQueries(0):
+            prisme_batch_item = export.get_prisme_batch_item(
+                prisme_batch, person_months[1], writer
+            )
+        # Assert
+        self.assertIsNotNone(prisme_batch_item)
+
     def test_get_prisme_batch_item_exception_on_missing_location_code(self):
         """If a `Person` has no `location_code`, the corresponding `PrismeAccountAlias`
         cannot be retrieved, and `get_prisme_batch_item` should raise an exception.
@@ -576,6 +599,74 @@ class TestBatchExport(TestCase):
                         stdout, "FAILED to export 2 batch(es)"
                     )
 
+    def test_export_batches_concurrently(self):
+        # Arrange: add CPRs resulting in three batches (prefixes 01, 31 and 32)
+        self._add_person_month(101000028, Decimal("1000"))
+        self._add_person_month(3101000000, Decimal("1000"))
+        self._add_person_month(3101000001, Decimal("1000"))
+        export = self._get_instance()
+        stdout = Mock()
+        with patch(
+            "suila.integrations.prisme.benefits.put_file_in_prisme_folder"
+        ) as mock_put_file_in_prisme_folder:
+            # Act
+            export.export_batches(stdout, verbosity=1, max_workers=3)
+        # Assert: all batches and batch items are recorded as sent
+        self.assertQuerySetEqual(
+            PrismeBatch.objects.order_by("prefix"),
+            [(1, "sent"), (31, "sent"), (32, "sent")],
+            transform=lambda obj: (obj.prefix, obj.status),
+        )
+        self.assertEqual(PrismeBatchItem.objects.count(), 3)
+        # Assert: each batch file is uploaded (in any order), followed by the control
+        # list.
+        uploads = [
+            (call.args[2], call.args[3])
+            for call in mock_put_file_in_prisme_folder.call_args_list
+        ]
+        self.assertCountEqual(
+            uploads[:-1],
+            [
+                ("g68g69", "SUILA_G68_export_01_2025_01.g68"),
+                ("g68g69", "SUILA_G68_export_31_2025_01.g68"),
+                ("g68g69_mod11_cpr", "SUILA_G68_export_32_2025_01.g68"),
+            ],
+        )
+        self.assertEqual(
+            uploads[-1], ("kontrolliste", "SUILA_kontrolliste_2025_01.csv")
+        )
+        self._assert_stdout_write_contains(stdout, "Exported 3 batch(es)")
+
+    def test_export_batches_concurrently_handles_failure(self):
+        # Arrange: add CPRs resulting in two batches, one of which fails to upload
+        self._add_person_month(3001000000, Decimal("1000"))
+        self._add_person_month(3101000000, Decimal("1000"))
+        export = self._get_instance()
+        stdout = Mock()
+
+        def fail_on_prefix_30(settings, buf, folder, filename):
+            if filename.startswith("SUILA_G68_export_30"):
+                raise ClientException("Uh-oh")
+
+        with patch(
+            "suila.integrations.prisme.benefits.put_file_in_prisme_folder",
+            side_effect=fail_on_prefix_30,
+        ):
+            # Act
+            export.export_batches(stdout, verbosity=1, max_workers=2)
+        # Assert: only the items of the successful batch are recorded
+        self.assertQuerySetEqual(
+            PrismeBatch.objects.order_by("prefix"),
+            [(30, "failed", "Uh-oh"), (31, "sent", "")],
+            transform=lambda obj: (obj.prefix, obj.status, obj.failed_message),
+        )
+        self.assertQuerySetEqual(
+            PrismeBatchItem.objects.all(),
+            ["3101000000"],
+            transform=lambda obj: obj.person_month.person_year.person.cpr,
+        )
+        self._assert_stdout_write_contains(stdout, "FAILED to export 1 batch(es)")
+
     def _assert_stdout_write_contains(self, stdout, text: str):
         self.assertIn(
             text,
@@ -1,8 +1,12 @@
 # SPDX-FileCopyrightText: 2024 Magenta ApS <info@magenta.dk>
 #
 # SPDX-License-Identifier: MPL-2.0
+import logging
+import os
 import re
+import time
 from datetime import date
+from unittest import skipUnless
 
 from django.test import SimpleTestCase
 from tenQ.writer.g68 import (
@@ -20,6 +24,8 @@ from suila.integrations.prisme.g68g69 import (
     G68G69TransactionWriter,
 )
 
+logger = logging.getLogger(__name__)
+
 
 class TestG68G69TransactionWriter(SimpleTestCase):
     registreringssted: int = 0
@@ -119,6 +125,67 @@ class TestG68G69TransactionWriter(SimpleTestCase):
         posteringsdato = self._get_g69_floating_field(pair.g69, 110, 8)
         self.assertEqual(posteringsdato, "20240127")
 
+    def test_serialize_g68(self):
+        g68, posteringshenvisning = self._instance.serialize_g68(
+            TransaktionstypeEnum.AndenDestinationTilladt,
+            UdbetalingsberettigetIdentKodeEnum.CPR,
+            "3112700000",  # CPR
+            1000,  # amount
+            self.payment_date,
+            self.posting_date,
+            "12345678",  # invoice number
+            "Some descriptive text",
+        )
+        # Assert that the "posteringshenvisning" is the one found by parsing the G68
+        self.assertEqual(
+            posteringshenvisning,
+            _ReparsingG68G69TransactionWriter.get_posteringshenvisning(g68),
+        )
+
+    @skipUnless(os.environ.get("SUILA_BENCHMARK"), "set SUILA_BENCHMARK to run")
+    def test_serialize_transaction_pair_benchmark(self):
+        # Compare the throughput of the previous writer (which parsed the entire G68
+        # transaction to find the "posteringshenvisning") with the current one.
+        count = 50_000
+        old_writer = _ReparsingG68G69TransactionWriter(
+            0, self.organisationsenhed, self.maskinnummer
+        )
+        new_writer = G68G69TransactionWriter(
+            0, self.organisationsenhed, self.maskinnummer
+        )
+        old_pairs, old_elapsed = self._serialize_pairs(old_writer, count)
+        new_pairs, new_elapsed = self._serialize_pairs(new_writer, count)
+        logger.info(
+            "G68/G69 serialization of %d pairs: old writer %.0f pairs/s, "
+            "new writer %.0f pairs/s",
+            count,
+            count / old_elapsed,
+            count / new_elapsed,
+        )
+        # Assert that both writers produce identical output
+        self.assertEqual(old_pairs, new_pairs)
+
+    def _serialize_pairs(
+        self, writer: G68G69TransactionWriter, count: int
+    ) -> tuple[list[G68G69TransactionPair], float]:
+        start = time.perf_counter()
+        pairs = [
+            writer.serialize_transaction_pair(
+                TransaktionstypeEnum.AndenDestinationTilladt,
+                UdbetalingsberettigetIdentKodeEnum.CPR,
+                "3112700000",  # CPR
+                self.account,
+                1000 + i,  # amount
+                self.payment_date,
+                self.posting_date,
+                "SUILA-TAPIT-3112700000-JAN25",
+                str(10000000 + i),  # invoice number
+                "Some descriptive text",
+            )
+            for i in range(count)
+        ]
+        return pairs, time.perf_counter() - start
+
     def _get_g69_floating_field(
         self, g69: str, field_id: int, length: int
     ) -> str | None:
@@ -126,3 +193,22 @@ class TestG68G69TransactionWriter(SimpleTestCase):
         match = re.match(rf".*&{field_id}(?P<val>.{{{length}}}).*", g69)
         if match is not None:
             return match.group("val")
+
+
+class _ReparsingG68G69TransactionWriter(G68G69TransactionWriter):
+    """Previous implementation, which parses all fields of the G68 transaction"""
+
+    def serialize_g68(self, *args) -> tuple[str, str]:
+        g68_transaction_serialized = self.serialize_transaction(*args)
+        return (
+            g68_transaction_serialized,
+            self.get_posteringshenvisning(g68_transaction_serialized),
+        )
+
+    @staticmethod
+    def get_posteringshenvisning(g68_transaction_serialized: str) -> str | None:
+        g69_udbetalingshenvisning = None
+        for field in list(G68Transaction.parse(g68_transaction_serialized)):
+            if isinstance(field, Posteringshenvisning):
+                g69_udbetalingshenvisning = field.val
+        return g69_udbetalingshenvisning
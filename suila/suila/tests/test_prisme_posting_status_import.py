@@ -340,3 +340,23 @@ class TestPostingStatusImportMissingInvoiceNumber(PostingStatusImportTestCase):
         self.assertIsNotNone(self._non_matching_item.posting_status_file)
         self.assertEqual(self._non_matching_item.error_code, "")
         self.assertEqual(self._non_matching_item.error_description, "")
+
+    def test_match_rows_uses_constant_number_of_queries(self):
+        # Arrange
+        instance = PostingStatusImport()
+        qs = instance._get_prisme_batch_items()
+        # `_EXAMPLE_1` and `_EXAMPLE_2` do not match any Prisme batch item, while
+        # `_EXAMPLE_3` matches on CPR/date/amount, but not on invoice number.
+        rows = [
+            PostingStatus.from_csv_row(example.split(";"))
+            for example in (_EXAMPLE_1, _EXAMPLE_2, _EXAMPLE_3) * 10
+        ]
+        # Act: assert that the candidate items are fetched using two queries, one for
+        # the invoice numbers and one for the CPR/date/amount lookup.
+        with self.assertNumQueries(2):
+            result = list(instance._match_rows(qs, rows))
+        # Assert
+        self.assertEqual(len(result), 10)
+        for row, item in result:
+            self.assertEqual(row.invoice_no, "02587075")
+            self.assertEqual(item, self._matching_item)
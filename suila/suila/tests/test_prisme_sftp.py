@@ -0,0 +1,181 @@
+# SPDX-FileCopyrightText: 2025 Magenta ApS <info@magenta.dk>
+#
+# SPDX-License-Identifier: MPL-2.0
+from io import BytesIO
+from unittest.mock import ANY, MagicMock, patch
+
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from paramiko import AutoAddPolicy, RejectPolicy, SSHException
+from tenQ.client import ClientException
+
+from suila.integrations.prisme.sftp import (
+    SFTPSessionPool,
+    close_pools,
+    connect,
+    get_file_in_prisme_folder,
+    get_pool,
+    list_prisme_folder,
+    put_file_in_prisme_folder,
+)
+
+
+class TestSFTPSessionPool(SimpleTestCase):
+    config = {
+        "host": "sftp.example.com",
+        "port": 22,
+        "username": "user",
+        "password": "password",
+        "known_hosts": [],
+    }
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch("suila.integrations.prisme.sftp.SSHClient")
+        self.mock_ssh_client_class = patcher.start()
+        self.mock_ssh_client_class.side_effect = lambda: MagicMock()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(close_pools)
+
+    def _get_sftp_client(self, pool: SFTPSessionPool) -> MagicMock:
+        with pool.session() as sftp:
+            return sftp
+
+    def test_session_is_reused(self):
+        # Arrange
+        pool = SFTPSessionPool(self.config, max_size=1, max_age=60)
+        # Act
+        sftp_1 = self._get_sftp_client(pool)
+        sftp_2 = self._get_sftp_client(pool)
+        # Assert: only one SSH connection was opened
+        self.assertIs(sftp_1, sftp_2)
+        self.assertEqual(self.mock_ssh_client_class.call_count, 1)
+
+    def test_session_is_evicted_after_max_age(self):
+        # Arrange
+        pool = SFTPSessionPool(self.config, max_size=1, max_age=0)
+        # Act
+        sftp_1 = self._get_sftp_client(pool)
+        sftp_2 = self._get_sftp_client(pool)
+        # Assert: a new SSH connection was opened, and the first one was closed
+        self.assertIsNot(sftp_1, sftp_2)
+        self.assertEqual(self.mock_ssh_client_class.call_count, 2)
+        sftp_1.close.assert_called_once()
+
+    def test_dead_session_is_evicted(self):
+        # Arrange
+        pool = SFTPSessionPool(self.config, max_size=1, max_age=60)
+        sftp_1 = self._get_sftp_client(pool)
+        # Simulate a broken connection
+        pool._idle[0].ssh_client.get_transport().send_ignore.side_effect = EOFError
+        # Act
+        sftp_2 = self._get_sftp_client(pool)
+        # Assert: a new SSH connection was opened
+        self.assertIsNot(sftp_1, sftp_2)
+        self.assertEqual(self.mock_ssh_client_class.call_count, 2)
+
+    def test_session_is_discarded_on_error(self):
+        # Arrange
+        pool = SFTPSessionPool(self.config, max_size=1, max_age=60)
+        # Act and assert: errors are raised as `ClientException`
+        with self.assertRaises(ClientException):
+            with pool.session():
+                raise SSHException("Uh-oh")
+        # Assert: the failed session is not kept in the pool
+        self.assertEqual(pool._idle, [])
+
+    def test_connect_error_is_raised_as_client_exception(self):
+        # Arrange
+        self.mock_ssh_client_class.side_effect = None
+        self.mock_ssh_client_class.return_value.connect.side_effect = OSError
+        pool = SFTPSessionPool(self.config, max_size=1, max_age=60)
+        # Act and assert
+        with self.assertRaises(ClientException):
+            self._get_sftp_client(pool)
+
+    def test_pool_keeps_at_most_max_size_sessions(self):
+        # Arrange
+        pool = SFTPSessionPool(self.config, max_size=1, max_age=60)
+        # Act: use two sessions at the same time
+        with pool.session():
+            with pool.session():
+                pass
+        # Assert: only one session is kept in the pool
+        self.assertEqual(len(pool._idle), 1)
+
+    def test_connect_rejects_unknown_host_keys(self):
+        # Arrange
+        self.mock_ssh_client_class.side_effect = None
+        ssh_client = self.mock_ssh_client_class.return_value
+        config = {
+            **self.config,
+            "known_hosts": [
+                "sftp.example.com ssh-ed25519 "
+                "AAAAC3NzaC1lZDI1NTE5AAAAIE8nDhVzgYikfki4z5FfCDrAL0c4Ket0pHYal8IjcBb6"
+            ],
+        }
+        # Act
+        connect(config)
+        # Assert: the system and configured host keys are used, and any other host
+        # key is rejected.
+        ssh_client.load_system_host_keys.assert_called_once_with()
+        ssh_client.get_host_keys.return_value.add.assert_called_once_with(
+            "sftp.example.com", "ssh-ed25519", ANY
+        )
+        self.assertIsInstance(
+            ssh_client.set_missing_host_key_policy.call_args.args[0], RejectPolicy
+        )
+        ssh_client.connect.assert_called_once_with(
+            hostname="sftp.example.com",
+            port=22,
+            username="user",
+            password="password",
+            look_for_keys=False,
+            allow_agent=False,
+        )
+
+    def test_connect_without_known_hosts(self):
+        # Arrange
+        self.mock_ssh_client_class.side_effect = None
+        ssh_client = self.mock_ssh_client_class.return_value
+        # Act
+        with self.assertLogs("suila.integrations.prisme.sftp", "WARNING") as logs:
+            connect(self.config)
+        # Assert: the host key is not verified, and a warning is logged
+        self.assertIsInstance(
+            ssh_client.set_missing_host_key_policy.call_args.args[0], AutoAddPolicy
+        )
+        self.assertIn("sftp.example.com is not verified", logs.output[0])
+        ssh_client.connect.assert_called_once()
+
+    def test_connect_invalid_known_hosts(self):
+        pool = SFTPSessionPool(
+            {**self.config, "known_hosts": ["sftp.example.com"]},
+            max_size=1,
+            max_age=60,
+        )
+        with self.assertRaises(ClientException):
+            self._get_sftp_client(pool)
+
+    @override_settings(PRISME_SFTP_MAX_WORKERS=2, PRISME_SFTP_MAX_AGE_SECONDS=30)
+    def test_get_pool(self):
+        pool = get_pool(self.config)
+        self.assertIs(get_pool(self.config), pool)
+        self.assertEqual(pool.max_size, 2)
+        self.assertEqual(pool.max_age, 30)
+
+    def test_file_operations_share_session(self):
+        # Act
+        list_prisme_folder(self.config, "folder")
+        get_file_in_prisme_folder(self.config, "folder", "filename.csv")
+        put_file_in_prisme_folder(self.config, BytesIO(b"data"), "folder", "a.csv")
+        put_file_in_prisme_folder(self.config, "/tmp/b.csv", "folder", "b.csv")
+        # Assert: all operations used the same SSH connection
+        self.assertEqual(self.mock_ssh_client_class.call_count, 1)
+        sftp = get_pool(self.config)._idle[0].sftp_client
+        sftp.listdir.assert_called_once_with("folder")
+        sftp.getfo.assert_called_once()
+        self.assertEqual(sftp.getfo.call_args.args[0], "folder/filename.csv")
+        sftp.putfo.assert_called_once()
+        self.assertEqual(sftp.putfo.call_args.args[1], "folder/a.csv")
+        sftp.put.assert_called_once_with("/tmp/b.csv", "folder/b.csv")
@@ -70,3 +70,42 @@ class TestSFTPImport(ImportTestCase):
                 ANY,  # `remote_folder`
             )
             self.assertEqual(mock_get.call_count, 10)  # 10 retry attempts
+
+    def test_get_files(self):
+        # Arrange
+        filenames: list[str] = [f"filename{i}.csv" for i in range(1, 11)]
+        with patch(
+            "suila.integrations.prisme.sftp_import.get_file_in_prisme_folder",
+            side_effect=lambda settings, folder, filename: BytesIO(
+                filename.encode(self.encoding)
+            ),
+        ):
+            # Act
+            result: list[tuple[str, BytesIO | None]] = list(
+                self.instance.get_files(filenames, max_workers=4)
+            )
+        # Assert: files are returned in the order requested, along with their contents
+        self.assertListEqual(
+            [(filename, buf.getvalue()) for filename, buf in result],  # type: ignore
+            [(filename, filename.encode(self.encoding)) for filename in filenames],
+        )
+
+    def test_get_files_handles_failure(self):
+        # Arrange
+        def get_file(filename: str) -> BytesIO:
+            if filename == "filename2.csv":
+                raise ClientException("Uh-oh")
+            return BytesIO(filename.encode(self.encoding))
+
+        with patch.object(self.instance, "get_file", side_effect=get_file):
+            # Act
+            result: dict[str, BytesIO | None] = dict(
+                self.instance.get_files(
+                    ["filename1.csv", "filename2.csv", "filename3.csv"],
+                    max_workers=2,
+                )
+            )
+        # Assert: the file which could not be retrieved is returned as `None`
+        self.assertIsNotNone(result["filename1.csv"])
+        self.assertIsNone(result["filename2.csv"])
+        self.assertIsNotNone(result["filename3.csv"])
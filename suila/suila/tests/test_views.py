@@ -7,7 +7,7 @@ import re
 from datetime import date, datetime
 from decimal import Decimal
 from typing import Any
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 from urllib.parse import quote_plus
 from uuid import uuid4 as uuid
 
@@ -1755,17 +1755,15 @@ class TestEboksSendView(TestViewMixin, PersonEnv, EboksTest):
         self.person1.refresh_from_db()
         self.assertIsNotNone(self.person1.welcome_letter)
         message = self.person1.welcome_letter
-        contents = message.xml
-        if type(contents) is not bytes:
-            contents = contents.tobytes()
         mock_request.assert_called_with(
             "PUT",
             f"https://eboxtest.nanoq.gl/int/rest/srv.svc/3/"
             f"dispatchsystem/3994/dispatches/{message.message_id}",
             None,
-            contents,
+            ANY,
             timeout=60,
         )
+        self.assertEqual(bytes(mock_request.call_args.args[3]), message.xml)
         self.assertEqual(message.status, "sent")
         self.assertEqual(message.recipient_status, "")
         self.assertIsNotNone(message.pk)